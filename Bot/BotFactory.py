@@ -1,24 +1,26 @@
-from botbuilder.core import ConversationState, UserState, MemoryStorage
+from botbuilder.core import ConversationState
 from .tel_bot import RegistrationAudioBot
 from .message_bot import RegistrationTextBot
 from .services import CustomerService
+from .http_client import http_client
+from .storage import get_state_storage
 
 
 def create_bot_instances():
  # Factory function for creating bot instances with all required dependencies
     try:
-        #  Initialize in-memory state storage for managing conversation and user state
-        memory = MemoryStorage()
-        conversation_state = ConversationState(memory)
-        user_state = UserState(memory)
+        # Initialize the state storage (BOT_STATE_STORAGE) for managing the conversation state
+        storage = get_state_storage()
+        conversation_state = ConversationState(storage)
 
         # Create an instance of the customer service for handling customer-related logic
         # which is required for passing it to the bots
         customer_service = CustomerService()
 
         # Instantiate bots
-        tele_bot = RegistrationAudioBot(conversation_state, user_state, customer_service)
-        web_bot = RegistrationTextBot(conversation_state, user_state, customer_service)
+        # Both bots share the application-wide HTTP connection pool
+        tele_bot = RegistrationAudioBot(conversation_state, customer_service, http_client)
+        web_bot = RegistrationTextBot(conversation_state, customer_service, http_client)
 
 
         # Return a dictionary with all bot instances and related components
@@ -26,8 +28,8 @@ def create_bot_instances():
             'tele_bot': tele_bot,
             'web_bot': web_bot,
             'conversation_state': conversation_state,
-            'user_state': user_state,
-            'customer_service': customer_service
+            'customer_service': customer_service,
+            'http_client': http_client
         }
 
     # Output an error message and re-raise the exception if bot creation fails
@@ -0,0 +1,50 @@
+from typing import Optional
+
+import orjson
+from botbuilder.schema import Activity
+from django.http import HttpResponse
+
+
+class IncomingActivity:
+    # Lightweight view on a decoded Bot Framework activity.
+    # The body is decoded once; the routing fields are read from the plain dict and the
+    # msrest Activity model is only built when the adapter actually needs it.
+
+    __slots__ = ("body", "channel_id", "type", "conversation_id", "_activity")
+
+    def __init__(self, body: dict):
+        self.body = body
+        self.channel_id = (body.get("channelId") or "unknown").lower()
+        self.type = body.get("type") or "unknown"
+        self.conversation_id = (body.get("conversation") or {}).get("id", "")
+        self._activity: Optional[Activity] = None
+
+    @property
+    def activity(self) -> Activity:
+        # Deserializes the msrest model on first access
+        if self._activity is None:
+            self._activity = Activity().deserialize(self.body)
+        return self._activity
+
+    def summary(self) -> str:
+        # One-line description for the request log
+        sender = self.body.get("from") or {}
+        attachments = self.body.get("attachments") or []
+        text = self.body.get("text") or ""
+        return (
+            f"{self.channel_id} | {self.type} | {sender.get('name', 'Unknown')} (ID: {sender.get('id', 'none')})"
+            f" | text: {len(text)} Zeichen | attachments: {len(attachments)}"
+        )
+
+
+def decode_activity(raw_body: bytes) -> IncomingActivity:
+    # Decodes the request body, raises ValueError if it is not a JSON object
+    body = orjson.loads(raw_body)
+    if not isinstance(body, dict):
+        raise ValueError("Activity must be a JSON object")
+    return IncomingActivity(body)
+
+
+def json_response(data, status: int = 200, headers: dict = None) -> HttpResponse:
+    # JSON response serialized with orjson instead of the stdlib encoder used by JsonResponse
+    return HttpResponse(orjson.dumps(data), status=status, headers=headers, content_type="application/json")
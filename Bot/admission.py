@@ -0,0 +1,45 @@
+from typing import Dict
+
+
+class AdmissionController:
+    # Caps the number of in-flight turns (queued or running) per channel.
+    # Turns beyond the limit are rejected so that a burst cannot spawn unbounded
+    # ffmpeg processes, Speech SDK calls and Azure requests.
+
+    def __init__(self, limits: Dict[str, int], retry_after: int = 5):
+        self.limits = dict(limits)
+        self.retry_after = retry_after
+        self._in_flight = {channel: 0 for channel in self.limits}
+        self._admitted = {channel: 0 for channel in self.limits}
+        self._rejected = {channel: 0 for channel in self.limits}
+
+    def try_acquire(self, channel: str) -> bool:
+        # Reserves a slot for the channel, returns False if its budget is exhausted.
+        # Runs on the event loop only, so no locking is needed.
+        limit = self.limits.get(channel)
+        if limit is None:
+            return True
+
+        if self._in_flight[channel] >= limit:
+            self._rejected[channel] += 1
+            return False
+
+        self._in_flight[channel] += 1
+        self._admitted[channel] += 1
+        return True
+
+    def release(self, channel: str):
+        # Frees the slot reserved by try_acquire once the turn has finished
+        if channel in self._in_flight and self._in_flight[channel] > 0:
+            self._in_flight[channel] -= 1
+
+    def stats(self) -> dict:
+        return {
+            channel: {
+                "limit": limit,
+                "in_flight": self._in_flight[channel],
+                "admitted": self._admitted[channel],
+                "rejected": self._rejected[channel],
+            }
+            for channel, limit in self.limits.items()
+        }
@@ -0,0 +1,159 @@
+import asyncio
+import bisect
+import hashlib
+import time
+from typing import Dict, Iterable, List, Optional
+
+import aiohttp
+from django.http import HttpResponse
+
+from .activity_codec import json_response
+from .http_client import SharedHttpClient
+
+# Set on forwarded activities so that the receiving node processes them instead of forwarding again
+FORWARDED_HEADER = "X-Bot-Forwarded-By"
+
+
+class HashRing:
+    # Consistent hash ring with virtual nodes.
+    # A key belongs to the first node point clockwise from its hash. Adding or removing a node
+    # only moves the keys of the ring segments that node owns (about 1/n of all keys).
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 128):
+        self.vnodes = vnodes
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        self._nodes = set()
+        for node in nodes:
+            self.add_node(node)
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+    @property
+    def nodes(self) -> List[str]:
+        return sorted(self._nodes)
+
+    def add_node(self, node: str):
+        if node in self._nodes:
+            return
+        self._nodes.add(node)
+        for replica in range(self.vnodes):
+            point = self._hash(f"{node}#{replica}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove_node(self, node: str):
+        if node not in self._nodes:
+            return
+        self._nodes.discard(node)
+        kept = [(point, owner) for point, owner in zip(self._points, self._owners) if owner != node]
+        self._points = [point for point, _ in kept]
+        self._owners = [owner for _, owner in kept]
+
+    def owner(self, key: str, skip: Iterable[str] = ()) -> Optional[str]:
+        # Returns the node owning the key; nodes in `skip` pass their keys on to the next node
+        if not self._points:
+            return None
+
+        skip = set(skip)
+        start = bisect.bisect(self._points, self._hash(key))
+        for step in range(len(self._points)):
+            node = self._owners[(start + step) % len(self._points)]
+            if node not in skip:
+                return node
+        return None
+
+
+class AffinityRouter:
+    # Routes every activity of a conversation to the node that owns its conversation id,
+    # so the in-process caches (state, CLU, TTS) of that node serve all turns of the conversation.
+    # Nodes are the base URLs of the bot processes (one per uvicorn process / replica).
+    # A node that cannot be reached is skipped for retry_after seconds; its conversations move to
+    # the next node on the ring and come back once it is reachable again.
+    # Once the request has been sent the owner may already run the turn, so a timeout or a dropped
+    # connection after that point is answered with 503 + Retry-After (client_retry_after) and the
+    # connector retries, instead of running the turn a second time here.
+
+    def __init__(self, node_url: str, nodes: Iterable[str], http_client: SharedHttpClient,
+                 vnodes: int = 128, retry_after: float = 30, connect_timeout: float = 2,
+                 client_retry_after: int = 5):
+        self.node_url = node_url
+        self.http_client = http_client
+        self.retry_after = retry_after
+        self.connect_timeout = connect_timeout
+        self.client_retry_after = client_retry_after
+        self.ring = HashRing(nodes, vnodes=vnodes)
+        self._down_until: Dict[str, float] = {}
+
+        # metrics
+        self._forwarded = 0
+        self._forward_failures = 0
+        self._forward_aborted = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.node_url in self.ring.nodes and len(self.ring.nodes) > 1
+
+    def set_nodes(self, nodes: Iterable[str]):
+        # Applies a new membership list; only the conversations of added/removed nodes move
+        nodes = set(nodes)
+        for node in set(self.ring.nodes) - nodes:
+            self.ring.remove_node(node)
+        for node in nodes:
+            self.ring.add_node(node)
+
+    def owner(self, conversation_id: str) -> str:
+        now = time.monotonic()
+        down = {node for node, until in self._down_until.items() if until > now and node != self.node_url}
+        return self.ring.owner(conversation_id or "unknown", skip=down) or self.node_url
+
+    async def forward(self, owner: str, body: bytes, auth_header: str) -> Optional[HttpResponse]:
+        # Hands the activity to its owner and relays the response.
+        # Returns None if the owner cannot be connected to, the caller then processes the activity itself.
+        headers = {"Content-Type": "application/json", FORWARDED_HEADER: self.node_url}
+        if auth_header:
+            headers["Authorization"] = auth_header
+        timeout = aiohttp.ClientTimeout(total=self.http_client.timeout, connect=self.connect_timeout)
+
+        try:
+            async with self.http_client.get_session().post(f"{owner}/api/messages/", data=body,
+                                                           headers=headers, timeout=timeout) as response:
+                payload = await response.read()
+                relayed_headers = {}
+                if "Retry-After" in response.headers:
+                    relayed_headers["Retry-After"] = response.headers["Retry-After"]
+
+                self._forwarded += 1
+                return HttpResponse(payload, status=response.status, headers=relayed_headers,
+                                    content_type=response.headers.get("Content-Type", "application/json"))
+        except (aiohttp.ClientConnectorError, aiohttp.ConnectionTimeoutError) as e:
+            # nothing was sent, the activity can safely be processed here
+            self._forward_failures += 1
+            self._down_until[owner] = time.monotonic() + self.retry_after
+            print(f"⚠️ Weiterleitung an {owner} fehlgeschlagen ({e}) - Knoten für {self.retry_after}s übersprungen")
+            return None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # the owner may have received the activity, a local turn could run it twice
+            self._forward_failures += 1
+            self._forward_aborted += 1
+            print(f"⚠️ Weiterleitung an {owner} abgebrochen ({type(e).__name__}) - Connector soll erneut senden")
+            return json_response(
+                {"error": "Bot ausgelastet, bitte später erneut versuchen"},
+                status=503,
+                headers={"Retry-After": str(self.client_retry_after)}
+            )
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "enabled": self.enabled,
+            "node": self.node_url,
+            "nodes": self.ring.nodes,
+            "down": sorted(node for node, until in self._down_until.items() if until > now),
+            "forwarded_turns": self._forwarded,
+            "forward_failures": self._forward_failures,
+            "forward_aborted": self._forward_aborted,
+        }
@@ -3,7 +3,7 @@ import tempfile
 import os
 import asyncio
 import shutil
-from typing import Optional
+from typing import List, Optional
 
 
 class FFmpegAudioConverter:
@@ -65,7 +65,13 @@ class FFmpegAudioConverter:
                 stderr=asyncio.subprocess.PIPE
             )
 
-            stdout, stderr = await process.communicate()
+            try:
+                stdout, stderr = await process.communicate()
+            except asyncio.CancelledError:
+                # turn deadline expired: do not leave ffmpeg running in the background
+                process.kill()
+                await process.wait()
+                raise
 
             if process.returncode == 0:
                 # read file
@@ -100,6 +106,55 @@ class FFmpegAudioConverter:
             except OSError:
                 pass  # Nicht kritisch wenn Cleanup fehlschlägt
 
+    @staticmethod
+    def concat_wav(segments: List[bytes]) -> Optional[bytes]:
+        # join PCM WAV files with identical format into one WAV file (no re-encoding)
+        fmt_chunk = None
+        data_parts = []
+
+        for segment in segments:
+            if len(segment) < 12 or segment[:4] != b'RIFF' or segment[8:12] != b'WAVE':
+                return None
+
+            segment_fmt = None
+            segment_data = None
+            pos = 12
+            while pos + 8 <= len(segment):
+                chunk_id = segment[pos:pos + 4]
+                chunk_size = int.from_bytes(segment[pos + 4:pos + 8], 'little')
+                chunk_end = pos + 8 + chunk_size
+
+                if chunk_id == b'fmt ':
+                    segment_fmt = segment[pos + 8:chunk_end]
+                elif chunk_id == b'data':
+                    # streamed WAVs may carry a placeholder size, the data then runs to the end
+                    if chunk_size == 0 or chunk_end > len(segment):
+                        chunk_end = len(segment)
+                    segment_data = segment[pos + 8:chunk_end]
+                    break
+
+                pos = chunk_end + (chunk_size & 1)
+
+            if segment_fmt is None or segment_data is None:
+                return None
+            if fmt_chunk is None:
+                fmt_chunk = segment_fmt
+            elif segment_fmt != fmt_chunk:
+                return None
+
+            data_parts.append(segment_data)
+
+        if fmt_chunk is None:
+            return None
+
+        data = b''.join(data_parts)
+        riff_size = 4 + (8 + len(fmt_chunk)) + (8 + len(data))
+        return (
+            b'RIFF' + riff_size.to_bytes(4, 'little') + b'WAVE'
+            + b'fmt ' + len(fmt_chunk).to_bytes(4, 'little') + fmt_chunk
+            + b'data' + len(data).to_bytes(4, 'little') + data
+        )
+
     def get_audio_info(self, audio_bytes: bytes):
 
         # extract audio infromation
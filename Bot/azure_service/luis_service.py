@@ -1,14 +1,126 @@
-import aiohttp
+import asyncio
+import hashlib
 import json
 import os
-from typing import Dict, Any, List
-from FCCSemesterAufgabe.settings import AZURE_KEYVAULT
+import re
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+import aiohttp
+
+from FCCSemesterAufgabe.settings import AZURE_KEYVAULT, CLU_CACHE_SIZE, CLU_CACHE_TTL_SECONDS, CLU_CACHE_PII_TTL_SECONDS, \
+    CLU_BREAKER_WINDOW, CLU_BREAKER_MIN_CALLS, CLU_BREAKER_FAILURE_RATE, CLU_BREAKER_OPEN_SECONDS, \
+    CLU_TIMEOUT_MIN_SECONDS, CLU_TIMEOUT_MAX_SECONDS
+from Bot.cache import TTLCache, SingleFlight
+from Bot.circuit_breaker import CircuitBreaker
+from Bot.http_client import SharedHttpClient, http_client as shared_http_client
+from Bot.deadline import TurnDeadline, DeadlineExceeded
+from Bot.extraction_policy import extraction_policy
+
+
+class CLUEntityCache:
+    # Caches CLU entity lists per normalized utterance ("Ja." / " ja " / "JA" share one entry).
+    # Entries belong to a deployment: when the deployment name changes, the cache is cleared,
+    # because a new model can extract different entities for the same text.
+    # Utterances are only kept as a hash of the normalized text. Results with personal data
+    # (names, email, phone, birth date, street) go to a separate cache with a short TTL, or are
+    # not cached at all with pii_ttl_seconds=0.
+
+    _WHITESPACE = re.compile(r"\s+")
+    _TRAILING_PUNCTUATION = ".!?,;:"
+    PII_CATEGORIES = frozenset(("Name", "email", "PhoneNumber", "DateOfBirth", "StreetHousenumber"))
+
+    def __init__(self, max_entries: int = 2000, ttl_seconds: float = 3600, pii_ttl_seconds: float = 300):
+        self._entries = TTLCache(max_entries=max_entries, ttl=ttl_seconds)
+        self._pii_entries = TTLCache(max_entries=max_entries, ttl=pii_ttl_seconds) if pii_ttl_seconds > 0 else None
+        self.deployment: Optional[str] = None
+        self.invalidations = 0
+
+    @classmethod
+    def normalize(cls, text: str) -> str:
+        return cls._WHITESPACE.sub(" ", text).strip().rstrip(cls._TRAILING_PUNCTUATION).strip().lower()
+
+    @classmethod
+    def digest(cls, text: str) -> bytes:
+        return hashlib.sha256(cls.normalize(text).encode("utf-8")).digest()
+
+    def get(self, deployment: str, text: str) -> Optional[List[dict]]:
+        self._check_deployment(deployment)
+        digest = self.digest(text)
+        entities = self._entries.get(digest)
+        if entities is None and self._pii_entries is not None:
+            entities = self._pii_entries.get(digest)
+        if entities is None:
+            return None
+        return [self._match_case(entity, text) for entity in entities]
+
+    def set(self, deployment: str, text: str, entities: List[dict]):
+        self._check_deployment(deployment)
+        entries = self._pii_entries if self._contains_pii(entities) else self._entries
+        if entries is not None:
+            entries.set(self.digest(text), tuple(dict(entity) for entity in entities))
+
+    def _contains_pii(self, entities: List[dict]) -> bool:
+        return any((entity.get("category", "") or entity.get("name", "")) in self.PII_CATEGORIES
+                   for entity in entities)
+
+    def _check_deployment(self, deployment: str):
+        if deployment != self.deployment:
+            if self.deployment is not None:
+                self._entries.clear()
+                if self._pii_entries is not None:
+                    self._pii_entries.clear()
+                self.invalidations += 1
+                print(f"CLU Cache geleert - neues Deployment: {deployment}")
+            self.deployment = deployment
+
+    @classmethod
+    def key(cls, deployment: str, text: str) -> tuple:
+        return deployment, cls.digest(text)
+
+    @staticmethod
+    def _match_case(entity: dict, text: str) -> dict:
+        # the cached entity text may come from a differently cased utterance; names etc. are
+        # taken over as the user said them this time
+        entity = dict(entity)
+        span = entity.get("text", "")
+        index = text.lower().find(span.lower()) if span else -1
+        if index >= 0:
+            entity["text"] = text[index:index + len(span)]
+        return entity
+
+    def stats(self) -> dict:
+        stats = self._entries.stats()
+        stats.pop("bytes", None)
+        if self._pii_entries is not None:
+            stats["pii"] = self._pii_entries.stats()
+            stats["pii"].pop("bytes", None)
+        stats["deployment"] = self.deployment
+        stats["invalidations"] = self.invalidations
+        return stats
+
+
+# shared by all bots of the process
+clu_entity_cache = CLUEntityCache(max_entries=CLU_CACHE_SIZE, ttl_seconds=CLU_CACHE_TTL_SECONDS,
+                                  pii_ttl_seconds=CLU_CACHE_PII_TTL_SECONDS)
+# concurrent requests for the same normalized text share one CLU call (cache misses only)
+clu_in_flight = SingleFlight()
+# skips CLU while it is failing or slow, the handlers then parse the raw input themselves
+clu_circuit_breaker = CircuitBreaker("CLU", window=CLU_BREAKER_WINDOW, min_calls=CLU_BREAKER_MIN_CALLS,
+                                     failure_threshold=CLU_BREAKER_FAILURE_RATE,
+                                     open_seconds=CLU_BREAKER_OPEN_SECONDS,
+                                     min_timeout=CLU_TIMEOUT_MIN_SECONDS, max_timeout=CLU_TIMEOUT_MAX_SECONDS)
 
 
 class AzureCLUService:
 
-    def __init__(self):
+    def __init__(self, http_client: SharedHttpClient = None, entity_cache: CLUEntityCache = None,
+                 in_flight: SingleFlight = None, circuit_breaker: CircuitBreaker = None):
         # Initializes the Azure CLU (Conversational Language Understanding) Service
+        self.http_client = http_client or shared_http_client
+        self.entity_cache = entity_cache or clu_entity_cache
+        self.in_flight = in_flight or clu_in_flight
+        self.circuit_breaker = circuit_breaker or clu_circuit_breaker
 
         # Retrieve all required secrets from Azure Key Vault
         self.prediction_key = AZURE_KEYVAULT.get_secret_from_keyvault("CLU-KEY")
@@ -23,7 +135,15 @@ class AzureCLUService:
         print(f"CLU Service initialisiert - Projekt: {self.project_name}")
 
     async def get_entities(self, text: str) -> List[dict[str, str]]:
-        # extract all entities out of the text
+        # extract all entities out of the text (CLU always returns every category)
+
+        cached = self.entity_cache.get(self.deployment_name, text)
+        if cached is not None:
+            return cached
+
+        if not self.circuit_breaker.allow():
+            # CLU is failing or too slow right now, no entities -> validator fallback in the handlers
+            return []
 
         try:
             url = f"{self.prediction_endpoint}/language/:analyze-conversations"
@@ -51,21 +171,55 @@ class AzureCLUService:
                 }
             }
 
-            # setup a session
-            async with aiohttp.ClientSession() as session:
-                # send the message
-                async with session.post(f"{url}?api-version=2023-04-01", json=data, headers=headers) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        return self._extract_entities_from_response(result)
-                    else:
-                        print(f"CLU API Error: {response.status}")
-                        return []
-
+            # bounded by the turn deadline, on expiry the request is cancelled (once no other
+            # turn waits for it) and the handlers continue with the raw user input
+            entities = await TurnDeadline.current().run(
+                "clu",
+                self.in_flight.do(CLUEntityCache.key(self.deployment_name, text),
+                                  lambda: self._predict(url, data, headers)))
+            if entities is None:
+                return []
+
+            # only successful predictions are cached
+            self.entity_cache.set(self.deployment_name, text, entities)
+            # a shared call analysed the text of another turn, take over this turn's spelling
+            return [CLUEntityCache._match_case(entity, text) for entity in entities]
+
+        except DeadlineExceeded:
+            return []
         except Exception as e:
             print(f"Error: {e}")
             return []
 
+    async def _predict(self, url: str, data: dict, headers: dict) -> Optional[List[dict[str, str]]]:
+        # one CLU call under the adaptive timeout, the outcome feeds the circuit breaker
+        extraction_policy.record_clu_call()
+        started = time.monotonic()
+        try:
+            status, result = await asyncio.wait_for(self._post(url, data, headers),
+                                                    self.circuit_breaker.timeout())
+        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+            self.circuit_breaker.record_failure()
+            print(f"CLU API Error: {type(e).__name__} nach {time.monotonic() - started:.2f}s")
+            return None
+
+        if status == 200:
+            self.circuit_breaker.record_success(time.monotonic() - started)
+            return self._extract_entities_from_response(result)
+
+        if status == 429 or status >= 500:
+            self.circuit_breaker.record_failure()
+        print(f"CLU API Error: {status}")
+        return None
+
+    async def _post(self, url: str, data: dict, headers: dict) -> Tuple[int, Optional[dict]]:
+        # send the message over the pooled session
+        session = self.http_client.get_session()
+        async with session.post(f"{url}?api-version=2023-04-01", json=data, headers=headers) as response:
+            if response.status == 200:
+                return response.status, await response.json()
+            return response.status, None
+
     def _extract_entities_from_response(self, response: Dict):
         # extract entites out of the input response
         entities = []
@@ -1,14 +1,229 @@
 import azure.cognitiveservices.speech as speechsdk
+import hashlib
 import tempfile
 import os
+import threading
 from typing import Optional, Dict, Any, List
 
-from FCCSemesterAufgabe.settings import isDocker, AZURE_KEYVAULT
+from FCCSemesterAufgabe.settings import isDocker, AZURE_KEYVAULT, TTS_CACHE_DIR, TTS_CACHE_MEMORY_ENTRIES, \
+    TTS_CACHE_DISK_MAX_MB
+from Bot.cache import TTLCache
+from Bot.prompt_audio import PromptAudioBundle
+
+DEFAULT_VOICE = "de-DE-KatjaNeural"
+# fixed, so cached segments of different runs can be concatenated and the cache key is honest
+OUTPUT_FORMAT = "Riff16Khz16BitMonoPcm"
+
+
+class TTSAudioCache:
+    # Content addressed cache of synthesized audio, keyed on sha256(voice, format, text).
+    # The memory tier is a bounded LRU shared by the bots of the process, backed by the
+    # memory mapped bundle of pre-rendered prompts; the disk tier keeps the audio across
+    # restarts and processes. Its files are written atomically and the least
+    # recently used ones are deleted once the directory grows beyond max_disk_bytes.
+    # Only static prompts are cached (cacheable=True): replies containing user data (confirmations,
+    # summary) must not end up in memory or on disk beyond the turn.
+    # Thread safe, the speech service uses it from worker threads.
+
+    def __init__(self, directory: Optional[str], max_entries: int = 256, max_disk_bytes: int = 200 * 1024 * 1024):
+        self._memory = TTLCache(max_entries=max_entries, sizeof=len)
+        self._lock = threading.Lock()
+        self.directory = directory or None
+        self.max_disk_bytes = max_disk_bytes
+        self._disk_bytes = None  # unknown until the directory was scanned
+        self._bundle: Optional[PromptAudioBundle] = None
+
+        # metrics
+        self.bundle_hits = 0
+        self.disk_hits = 0
+        self.disk_misses = 0
+        self.disk_evictions = 0
+        self.disk_errors = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        # whitespace does not change the spoken audio
+        return " ".join(text.split())
+
+    @classmethod
+    def key(cls, voice: str, text: str, output_format: str = OUTPUT_FORMAT) -> str:
+        return hashlib.sha256(f"{voice}\0{output_format}\0{cls.normalize(text)}".encode("utf-8")).hexdigest()
+
+    def load_bundle(self, path: Optional[str]) -> int:
+        # Maps the prompt audio bundle, returns the number of prompts it contains.
+        # A missing bundle is not an error, the prompts are then synthesized on first use.
+        if not path or not os.path.exists(path):
+            print(f"Kein Prompt-Audio-Bundle gefunden ({path}) - Prompts werden bei Bedarf synthetisiert")
+            return 0
+        try:
+            bundle = PromptAudioBundle(path)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Prompt-Audio-Bundle konnte nicht geladen werden: {e}")
+            return 0
+        if bundle.output_format != OUTPUT_FORMAT:
+            print(f"⚠️ Prompt-Audio-Bundle hat das Format {bundle.output_format} statt {OUTPUT_FORMAT} - ignoriert")
+            bundle.close()
+            return 0
+
+        with self._lock:
+            previous, self._bundle = self._bundle, bundle
+        if previous is not None:
+            previous.close()
+        print(f"Prompt-Audio-Bundle {bundle.version} geladen: {len(bundle)} Prompts")
+        return len(bundle)
+
+    def get_memory(self, key: str) -> Optional[bytes]:
+        # memory tier and prompt bundle only, cheap enough for the event loop
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is None and self._bundle is not None:
+                # not copied into the LRU, the mapped pages are shared between processes
+                audio = self._bundle.get(key)
+                if audio is not None:
+                    self.bundle_hits += 1
+            return audio
+
+    def get(self, key: str) -> Optional[bytes]:
+        audio = self.get_memory(key)
+        if audio is not None or not self.directory:
+            return audio
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                audio = f.read()
+            os.utime(path)  # the modification time is the LRU order of the disk tier
+        except FileNotFoundError:
+            with self._lock:
+                self.disk_misses += 1
+            return None
+        except OSError as e:
+            print(f"⚠️ TTS Cache Lesefehler: {e}")
+            with self._lock:
+                self.disk_errors += 1
+            return None
 
+        with self._lock:
+            self.disk_hits += 1
+            self._memory.set(key, audio)
+        return audio
+
+    def set(self, key: str, audio: bytes):
+        with self._lock:
+            self._memory.set(key, audio)
+        if not self.directory:
+            return
+
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(audio)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"⚠️ TTS Cache Schreibfehler: {e}")
+            with self._lock:
+                self.disk_errors += 1
+            return
+
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += len(audio)
+            over_limit = self._disk_bytes is None or self._disk_bytes > self.max_disk_bytes
+        if over_limit:
+            self._evict()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.wav")
+
+    def _evict(self):
+        # Rescans the directory (other processes write to it as well) and deletes the least
+        # recently used files until 90% of the limit is reached
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(".wav"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+
+        total = sum(size for _, size, _ in files)
+        evicted = 0
+        if total > self.max_disk_bytes:
+            for _, size, path in sorted(files):
+                if total <= self.max_disk_bytes * 0.9:
+                    break
+                try:
+                    os.unlink(path)
+                except OSError:
+                    continue
+                total -= size
+                evicted += 1
+
+        with self._lock:
+            self._disk_bytes = total
+            self.disk_evictions += evicted
+
+    def stats(self) -> dict:
+        with self._lock:
+            memory = self._memory.stats()
+            memory.pop("ttl_seconds", None)
+            memory.pop("expirations", None)
+            disk_lookups = self.disk_hits + self.disk_misses
+            return {
+                "memory": memory,
+                "bundle": dict(self._bundle.stats(), hits=self.bundle_hits) if self._bundle is not None else None,
+                "disk": {
+                    "directory": self.directory,
+                    "bytes": self._disk_bytes,
+                    "max_bytes": self.max_disk_bytes,
+                    "hits": self.disk_hits,
+                    "misses": self.disk_misses,
+                    "hit_rate": round(self.disk_hits / disk_lookups, 3) if disk_lookups else 0.0,
+                    "evictions": self.disk_evictions,
+                    "errors": self.disk_errors,
+                } if self.directory else None,
+            }
+
+
+# shared by all bots of the process
+tts_audio_cache = TTSAudioCache(TTS_CACHE_DIR, max_entries=TTS_CACHE_MEMORY_ENTRIES,
+                                max_disk_bytes=int(TTS_CACHE_DISK_MAX_MB * 1024 * 1024))
+
+
+class SpeechCancellation:
+    # Lets the event loop abort a Speech SDK call that blocks a worker thread.
+    # The call attaches its service connection; cancel() closes it, which makes the pending
+    # synthesis / recognition return with a Canceled result instead of running on.
 
-class AzureSpeechService:
     def __init__(self):
+        self._lock = threading.Lock()
+        self._connection = None
+        self.cancelled = False
+
+    def attach(self, connection):
+        with self._lock:
+            self._connection = connection
+            cancelled = self.cancelled
+        if cancelled:
+            connection.close()
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            connection = self._connection
+        if connection is not None:
+            connection.close()
+
+
+class AzureSpeechService:
+    def __init__(self, audio_cache: Optional[TTSAudioCache] = None):
         # Initializes the Azure Speech Service
+        self.audio_cache = audio_cache or tts_audio_cache
 
         # Determine key and region
         if not isDocker:
@@ -28,14 +243,8 @@ class AzureSpeechService:
 
 
     def _create_configs(self):
-        # Creates the base configurations for TTS and STT
-
-        # Text-to-Speech configuration
-        self.tts_config = speechsdk.SpeechConfig(
-            subscription=self.speech_key,
-            region=self.service_region
-        )
-        self.tts_config.speech_synthesis_voice_name = "de-DE-KatjaNeural"
+        # Creates the base configuration for STT (TTS builds its own config per call, see
+        # _create_synthesizer)
 
         # Speech-to-Text configuration
         self.stt_config = speechsdk.SpeechConfig(
@@ -45,66 +254,88 @@ class AzureSpeechService:
         self.stt_config.speech_recognition_language = "de-DE"
 
 
-    def text_to_speech_bytes(self, text: str, voice: str = "de-DE-KatjaNeural"):
-        # Converts text to audio bytes using Azure TTS
+    def cached_audio(self, text: str, voice: str = DEFAULT_VOICE) -> Optional[bytes]:
+        # Audio of the text from the memory tier of the cache, without blocking I/O
+        if not text or not text.strip():
+            return None
+        return self.audio_cache.get_memory(self.audio_cache.key(voice, text))
+
+    def text_to_speech_bytes(self, text: str, voice: str = DEFAULT_VOICE,
+                             cancellation: Optional[SpeechCancellation] = None, cacheable: bool = False):
+        # Converts text to audio bytes using Azure TTS.
+        # cacheable texts (static prompts without user data) are served from / added to the audio cache.
 
         try:
             if not text or not text.strip():
                 print("Empty text for TTS")
                 return None
 
+            cache_key = self.audio_cache.key(voice, text) if cacheable else None
+            if cache_key is not None:
+                audio_bytes = self.audio_cache.get(cache_key)
+                if audio_bytes is not None:
+                    return audio_bytes
+
             print(f"TTS for text: '{text[:50]}{'...' if len(text) > 50 else ''}'")
             print(f"Using voice: {voice}")
 
-            # Set voice
-            self.tts_config.speech_synthesis_voice_name = voice
-
-            # Create temporary file
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-                temp_filename = temp_file.name
-
-            try:
-                # Audio configuration
-                audio_config = speechsdk.audio.AudioOutputConfig(filename=temp_filename)
-
-                # Create synthesizer
-                speech_synthesizer = speechsdk.SpeechSynthesizer(
-                    speech_config=self.tts_config,
-                    audio_config=audio_config
-                )
-
-                # Perform synthesis
-                result = speech_synthesizer.speak_text_async(text).get()
-
-                if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-                    # Read audio data
-                    with open(temp_filename, 'rb') as f:
-                        audio_bytes = f.read()
-
-                    print(f"TTS successful: {len(audio_bytes)} bytes generated")
-                    return audio_bytes
-
-                elif result.reason == speechsdk.ResultReason.Canceled:
-                    cancellation = result.cancellation_details
-                    print(f"TTS canceled: {cancellation.reason}")
-                    if cancellation.error_details:
-                        print(f"Error details: {cancellation.error_details}")
-                    return None
-                else:
-                    print(f"TTS error: {result.reason}")
-                    return None
+            speech_synthesizer = self._create_synthesizer(voice, cancellation)
+            if speech_synthesizer is None:
+                return None
 
-            finally:
-                # Delete temporary file
-                if os.path.exists(temp_filename):
-                    os.unlink(temp_filename)
+            # Perform synthesis, the audio stays in memory
+            result = speech_synthesizer.speak_text_async(text).get()
+
+            if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
+                audio_bytes = result.audio_data
+                print(f"TTS successful: {len(audio_bytes)} bytes generated")
+                if audio_bytes and cache_key is not None:
+                    self.audio_cache.set(cache_key, audio_bytes)
+                return audio_bytes
+
+            elif result.reason == speechsdk.ResultReason.Canceled:
+                cancellation = result.cancellation_details
+                print(f"TTS canceled: {cancellation.reason}")
+                if cancellation.error_details:
+                    print(f"Error details: {cancellation.error_details}")
+                return None
+            else:
+                print(f"TTS error: {result.reason}")
+                return None
 
         except Exception as e:
             print(f"Text-to-Speech Exception: {e}")
             return None
 
 
-    def speech_to_text_from_bytes(self, audio_bytes: bytes, language: str = "de-DE"):
+    def _create_tts_config(self, voice: str):
+        tts_config = speechsdk.SpeechConfig(
+            subscription=self.speech_key,
+            region=self.service_region
+        )
+        tts_config.speech_synthesis_voice_name = voice
+        tts_config.set_speech_synthesis_output_format(
+            getattr(speechsdk.SpeechSynthesisOutputFormat, OUTPUT_FORMAT))
+        return tts_config
+
+
+    def _create_synthesizer(self, voice: str, cancellation: Optional[SpeechCancellation]):
+        # Synthesizer without audio output device or file (audio_config=None): the audio is only
+        # returned in the result. None if the call was cancelled already.
+        # own config per call: the calls run concurrently in worker threads, changing the voice of a
+        # shared config could synthesize (and cache) a text with the voice of another call
+        speech_synthesizer = speechsdk.SpeechSynthesizer(speech_config=self._create_tts_config(voice),
+                                                         audio_config=None)
+
+        if cancellation is not None:
+            cancellation.attach(speechsdk.Connection.from_speech_synthesizer(speech_synthesizer))
+            if cancellation.cancelled:
+                return None
+        return speech_synthesizer
+
+
+    def speech_to_text_from_bytes(self, audio_bytes: bytes, language: str = "de-DE",
+                                  cancellation: Optional[SpeechCancellation] = None):
         # Converts audio bytes to text using Azure STT
         try:
             if not audio_bytes or len(audio_bytes) == 0:
@@ -137,6 +368,17 @@ class AzureSpeechService:
                     audio_config=audio_config
                 )
 
+                if cancellation is not None:
+                    cancellation.attach(speechsdk.Connection.from_recognizer(speech_recognizer))
+                    if cancellation.cancelled:
+                        return {
+                            "success": False,
+                            "text": "",
+                            "error": "STT canceled: turn deadline exceeded",
+                            "reason": "Canceled",
+                            "language": language
+                        }
+
                 # Perform recognition
                 result = speech_recognizer.recognize_once()
 
@@ -200,7 +442,7 @@ class AzureSpeechService:
             }
 
 
-    def text_to_speech_file(self, text: str, output_file: str, voice: str = "de-DE-KatjaNeural"):
+    def text_to_speech_file(self, text: str, output_file: str, voice: str = DEFAULT_VOICE):
         # Converts text to audio and saves directly to file
         try:
             audio_bytes = self.text_to_speech_bytes(text, voice)
@@ -0,0 +1,29 @@
+from botbuilder.core import BotFrameworkAdapterSettings
+from botbuilder.schema import Activity
+from botframework.connector.auth import ClaimsIdentity, JwtTokenValidation, SimpleCredentialProvider
+
+
+class BotAuthenticator:
+    # Validates the Bot Framework JWT of an incoming activity before its turn is scheduled.
+    # BotFrameworkAdapter.process_activity authenticates and runs the turn in one call, the messages
+    # endpoint has to reject unauthorized requests with 401 before it acknowledges the activity and
+    # runs the turn in the background (adapter.process_activity_with_identity). This is the same
+    # check the adapter does internally, built on the public JwtTokenValidation API with the
+    # adapter's settings (written against botbuilder 4.16.2, pinned in requirements.txt).
+
+    def __init__(self, settings: BotFrameworkAdapterSettings):
+        self.settings = settings
+        self.credential_provider = SimpleCredentialProvider(settings.app_id, settings.app_password)
+
+    async def authenticate(self, activity: Activity, auth_header: str) -> ClaimsIdentity:
+        # Returns the claims identity of the request, raises PermissionError if it is not authorized
+        claims = await JwtTokenValidation.authenticate_request(
+            activity,
+            auth_header or "",
+            self.credential_provider,
+            await self.settings.channel_provider.get_channel_service(),
+            self.settings.auth_configuration,
+        )
+        if not claims.is_authenticated:
+            raise PermissionError("Unauthorized Access. Request is not authorized")
+        return claims
@@ -0,0 +1,165 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class TTLCache:
+    # Bounded LRU map with an idle TTL.
+    # Every get/set refreshes an entry; entries not touched for `ttl` seconds expire and the
+    # least recently used entry is evicted once `max_entries` is reached. Because the order of
+    # the map is the access order, expired entries are always at the front and sweep() only
+    # walks over the entries it removes.
+
+    _MISSING = object()
+
+    def __init__(self, max_entries: int = 1000, ttl: Optional[float] = None,
+                 sizeof: Callable[[Any], int] = None, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl if ttl and ttl > 0 else None
+        self._sizeof = sizeof
+        self._clock = clock
+
+        # key -> (value, last access, size)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+
+        # metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, self._MISSING, count=False) is not self._MISSING
+
+    def get(self, key: Hashable, default=None, count: bool = True):
+        entry = self._entries.get(key)
+        if entry is None:
+            if count:
+                self.misses += 1
+            return default
+
+        value, touched_at, size = entry
+        now = self._clock()
+        if self.ttl is not None and now - touched_at > self.ttl:
+            self._remove(key)
+            self.expirations += 1
+            if count:
+                self.misses += 1
+            return default
+
+        self._entries[key] = (value, now, size)
+        self._entries.move_to_end(key)
+        if count:
+            self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value):
+        if key in self._entries:
+            self._remove(key)
+
+        size = self._sizeof(value) if self._sizeof else 0
+        self._entries[key] = (value, self._clock(), size)
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        self._remove(key)
+        return entry[0]
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def sweep(self) -> int:
+        # Removes all expired entries, returns how many were removed
+        if self.ttl is None:
+            return 0
+
+        deadline = self._clock() - self.ttl
+        removed = 0
+        while self._entries:
+            key, (_, touched_at, _) = next(iter(self._entries.items()))
+            if touched_at > deadline:
+                break
+            self._remove(key)
+            removed += 1
+
+        self.expirations += removed
+        return removed
+
+    def _remove(self, key: Hashable):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": self._bytes,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SingleFlight:
+    # Collapses concurrent calls for the same key into one.
+    # The first caller starts the call, callers arriving while it is pending await the same
+    # result. Each caller can be cancelled on its own (e.g. by its turn deadline); the shared
+    # call is only cancelled once nobody waits for it anymore.
+
+    def __init__(self):
+        # key -> [task, number of waiting callers]
+        self._calls: Dict[Hashable, list] = {}
+
+        # metrics
+        self.calls = 0
+        self.collapsed = 0
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable]):
+        flight = self._calls.get(key)
+        if flight is None:
+            flight = [asyncio.ensure_future(call()), 0]
+            self._calls[key] = flight
+            flight[0].add_done_callback(lambda _: self._forget(key, flight))
+            self.calls += 1
+        else:
+            self.collapsed += 1
+
+        flight[1] += 1
+        try:
+            return await asyncio.shield(flight[0])
+        finally:
+            flight[1] -= 1
+            if flight[1] == 0 and not flight[0].done():
+                self._forget(key, flight)
+                flight[0].cancel()
+
+    def _forget(self, key: Hashable, flight: list):
+        if self._calls.get(key) is flight:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        started = self.calls + self.collapsed
+        return {
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "collapsed": self.collapsed,
+            "collapse_rate": round(self.collapsed / started, 3) if started else 0.0,
+        }
@@ -0,0 +1,112 @@
+import math
+import time
+from collections import deque
+from typing import Callable
+
+
+class CircuitBreaker:
+    # Circuit breaker with an adaptive call timeout for a remote dependency.
+    # Closed: calls pass, outcomes and latencies are kept in rolling windows. Once at least
+    # min_calls outcomes are known and the failure rate reaches failure_threshold, the circuit
+    # opens and calls are skipped for open_seconds. Then one probe call is let through
+    # (half-open); its success closes the circuit, its failure opens it again.
+    # The per-call timeout follows the observed p95 latency (times timeout_factor, clamped to
+    # min_timeout..max_timeout), so a slow dependency fails fast instead of using the whole budget.
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, window: int = 50, min_calls: int = 10, failure_threshold: float = 0.5,
+                 open_seconds: float = 30, min_timeout: float = 0.5, max_timeout: float = 5.0,
+                 timeout_factor: float = 1.5, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_factor = timeout_factor
+        self._clock = clock
+
+        self._outcomes = deque(maxlen=window)   # True = success
+        self._latencies = deque(maxlen=window)  # seconds of successful calls
+
+        self.state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_started_at = None
+
+        # metrics
+        self.rejected = 0
+        self.times_opened = 0
+
+    def allow(self) -> bool:
+        # True if a call may be made now
+        now = self._clock()
+        if self.state == self.OPEN:
+            if now - self._opened_at < self.open_seconds:
+                self.rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_started_at = None
+
+        if self.state == self.HALF_OPEN:
+            # a single probe at a time; a probe that never reported back (cancelled) expires
+            if self._probe_started_at is not None and now - self._probe_started_at < self.open_seconds:
+                self.rejected += 1
+                return False
+            self._probe_started_at = now
+
+        return True
+
+    def timeout(self) -> float:
+        if len(self._latencies) < self.min_calls:
+            return self.max_timeout
+        p95 = self._percentile(sorted(self._latencies), 0.95)
+        return min(self.max_timeout, max(self.min_timeout, p95 * self.timeout_factor))
+
+    def record_success(self, latency: float):
+        self._latencies.append(latency)
+        if self.state == self.HALF_OPEN:
+            print(f"✅ Circuit {self.name} geschlossen - Probe erfolgreich")
+            self.state = self.CLOSED
+            self._outcomes.clear()
+        self._outcomes.append(True)
+
+    def record_failure(self):
+        if self.state == self.HALF_OPEN:
+            self._open()
+            return
+
+        self._outcomes.append(False)
+        if self.state == self.CLOSED and len(self._outcomes) >= self.min_calls \
+                and self.failure_rate() >= self.failure_threshold:
+            self._open()
+
+    def failure_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def _open(self):
+        self.state = self.OPEN
+        self._opened_at = self._clock()
+        self._probe_started_at = None
+        self.times_opened += 1
+        print(f"⚡ Circuit {self.name} geöffnet - Aufrufe werden {self.open_seconds}s übersprungen")
+
+    @staticmethod
+    def _percentile(values, fraction: float) -> float:
+        return values[min(len(values) - 1, max(0, math.ceil(fraction * len(values)) - 1))]
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+        return {
+            "state": self.state,
+            "failure_rate": round(self.failure_rate(), 3),
+            "window_calls": len(self._outcomes),
+            "p95_latency_ms": round(self._percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+            "timeout_seconds": round(self.timeout(), 3),
+            "rejected_calls": self.rejected,
+            "times_opened": self.times_opened,
+        }
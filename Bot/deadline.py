@@ -0,0 +1,79 @@
+import asyncio
+import contextvars
+import math
+import time
+from typing import Awaitable, Callable, Optional
+
+_current_deadline: contextvars.ContextVar = contextvars.ContextVar("turn_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    # Raised when a stage of a turn did not finish within the remaining turn budget
+
+    def __init__(self, stage: str):
+        super().__init__(f"Turn deadline exceeded during {stage}")
+        self.stage = stage
+
+
+class TurnDeadline:
+    # Time budget of one bot turn, counted from the arrival of the activity.
+    # Every stage (download, ffmpeg, STT, CLU, TTS) runs through run(), which only grants the
+    # remaining budget and cancels the stage when it is used up. The deadline of the running turn
+    # is kept in a context variable, so services can reach it without passing it through every call.
+
+    def __init__(self, budget_seconds: Optional[float]):
+        self.budget_seconds = budget_seconds
+        self.expires_at = time.monotonic() + budget_seconds if budget_seconds else None
+        self.expired_stage: Optional[str] = None
+
+    @staticmethod
+    def current() -> "TurnDeadline":
+        # Deadline of the running turn, unbounded outside of a turn
+        return _current_deadline.get() or _UNBOUNDED
+
+    def activate(self) -> contextvars.Token:
+        return _current_deadline.set(self)
+
+    @staticmethod
+    def deactivate(token: contextvars.Token):
+        _current_deadline.reset(token)
+
+    def remaining(self) -> float:
+        if self.expires_at is None:
+            return math.inf
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    async def run(self, stage: str, awaitable: Awaitable, reserve: float = 0.0,
+                  on_cancel: Callable[[], None] = None):
+        # Awaits the stage within the remaining budget minus `reserve` (time kept for later stages,
+        # e.g. the text fallback). On expiry the stage is cancelled, on_cancel can abort work that
+        # cancellation does not reach (e.g. an SDK call in a worker thread).
+        timeout = self.remaining() - reserve
+        if timeout == math.inf:
+            return await awaitable
+
+        if timeout <= 0:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            self.expired_stage = self.expired_stage or stage
+            raise DeadlineExceeded(stage)
+
+        started = time.monotonic()
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            if time.monotonic() - started < timeout:
+                # timeout raised by the stage itself, not by the deadline
+                raise
+            self.expired_stage = self.expired_stage or stage
+            print(f"⏱️ Turn deadline exceeded during {stage} ({self.budget_seconds}s budget)")
+            if on_cancel is not None:
+                on_cancel()
+            raise DeadlineExceeded(stage) from None
+
+
+_UNBOUNDED = TurnDeadline(None)
@@ -0,0 +1,161 @@
+import re
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+from .text_messages import FieldConfig
+from .validators import DataValidator
+
+
+def _clean(user_input: str) -> str:
+    # STT adds sentence punctuation ("Männlich.", "12345.")
+    return user_input.strip().rstrip(".!?,;").strip()
+
+
+def _parse_gender(user_input: str) -> Optional[str]:
+    option = _clean(user_input).lower()
+    return option if option in FieldConfig.GENDER_OPTIONS else None
+
+
+# answers to the title question meaning "no title" ("nein", "nee", "ohne Titel")
+_NO_TITLE_ANSWERS = frozenset(
+    [keyword for keyword in FieldConfig.NO_TITLE_KEYWORDS if keyword]
+    + ['nee', 'nö', 'no', 'n', 'ohne', 'kein titel', 'keinen titel', 'ohne titel']
+)
+
+
+def _parse_title(user_input: str) -> Optional[str]:
+    title = _clean(user_input).lower()
+    if title in _NO_TITLE_ANSWERS:
+        # the keyword the title handlers take as "no title"
+        return FieldConfig.NO_TITLE_KEYWORDS[0]
+    for valid_title in FieldConfig.VALID_TITLES:
+        if valid_title.rstrip(".").lower() == title:
+            return valid_title
+    return None
+
+
+# answers, commands, salutations and titles that pass the name validator but are no names
+# ("Nein", "weiter", "kein", "Frau", "Dr")
+_NOT_A_NAME = frozenset(
+    FieldConfig.CONFIRMATION_YES + FieldConfig.CONFIRMATION_NO + FieldConfig.POSITIVE_RESPONSES
+    + FieldConfig.NEGATIVE_RESPONSES + FieldConfig.NO_TITLE_KEYWORDS + FieldConfig.NO_ADDITION_KEYWORDS
+    + FieldConfig.RESTART_KEYWORDS + ['zurück', 'neustart']
+    + ['herr', 'herrn', 'hr', 'frau', 'fr', 'professor', 'professorin', 'doktor']
+    + [title.rstrip(".").lower() for title in FieldConfig.VALID_TITLES]
+)
+
+
+def _parse_name(user_input: str) -> Optional[str]:
+    # a single word is the name itself, sentences ("Ich heiße ...") need CLU
+    name = _clean(user_input)
+    if name.lower() in _NOT_A_NAME:
+        return None
+    return name if DataValidator.validate_name_part(name) else None
+
+
+def _parse_birthdate(user_input: str) -> Optional[str]:
+    date_text = _clean(user_input)
+    return date_text if DataValidator.validate_birthdate(date_text) else None
+
+
+def _parse_email(user_input: str) -> Optional[str]:
+    email = _clean(user_input)
+    return email if " " not in email and DataValidator.validate_email(email) else None
+
+
+def _parse_phone(user_input: str) -> Optional[str]:
+    phone = _clean(user_input)
+    return phone if DataValidator.validate_phone(phone) else None
+
+
+def _parse_house_number(user_input: str) -> Optional[str]:
+    # normalized like the stored int ("007" -> "7"), so the confirmation shows the saved value
+    number = _clean(user_input)
+    return str(int(number)) if number.isdigit() and int(number) > 0 else None
+
+
+def _parse_postal_code(user_input: str) -> Optional[str]:
+    # spoken postal codes are often transcribed in groups ("10 115")
+    return DataValidator.validate_postal_code(_clean(user_input).replace(" ", ""))
+
+
+class ExtractionPolicy:
+    # Decides per field whether an utterance can be parsed locally or needs CLU.
+    # The local parsers only accept input whose meaning is unambiguous (a listed option, a value
+    # that passes the validator as a whole); everything else (sentences, spelled out values)
+    # still goes to CLU. Counts per dialog state how many CLU calls were avoided.
+
+    # CLU entity category -> local parser returning the entity text or None
+    LOCAL_PARSERS: Dict[str, Callable[[str], Optional[str]]] = {
+        'Gender': _parse_gender,
+        'titel': _parse_title,
+        'Name': _parse_name,
+        'DateOfBirth': _parse_birthdate,
+        'email': _parse_email,
+        'PhoneNumber': _parse_phone,
+        'houseNumber': _parse_house_number,
+        'ZipCode': _parse_postal_code,
+    }
+
+    # only unmistakable yes/no tokens; broader answers ("weiter", "gerne", "abbrechen") go to CLU,
+    # a local "yes" at the final summary stores the registration
+    CONFIRMATION_KEYWORDS = {
+        'yes': frozenset(FieldConfig.CONFIRMATION_YES),
+        'no': frozenset(FieldConfig.CONFIRMATION_NO),
+    }
+
+    _WORD_SEPARATORS = re.compile(r"[\s,.!?;]+")
+
+    def __init__(self):
+        # dialog state -> {"local": n, "clu": n}
+        self._counts = defaultdict(lambda: {"local": 0, "clu": 0})
+        # dialog state of the turn running in the current task, CLU requests are counted for it
+        self._dialog_state: ContextVar[Optional[str]] = ContextVar("extraction_dialog_state", default=None)
+
+    def parse_entity(self, entity_type: str, user_input: str) -> Optional[str]:
+        parser = self.LOCAL_PARSERS.get(entity_type)
+        if parser is None or not user_input:
+            return None
+        return parser(user_input)
+
+    def parse_confirmation(self, user_input: str) -> Optional[str]:
+        # 'yes' / 'no' if every word of the answer points the same way, None if mixed or unknown
+        text = _clean(user_input or "").lower()
+        for answer, keywords in self.CONFIRMATION_KEYWORDS.items():
+            if text in keywords:
+                return answer
+
+        words = [word for word in self._WORD_SEPARATORS.split(text) if word]
+        if not words:
+            return None
+        for answer, keywords in self.CONFIRMATION_KEYWORDS.items():
+            if all(word in keywords for word in words):
+                return answer
+        return None
+
+    def set_dialog_state(self, dialog_state: str):
+        # dialog state the following extractions of this turn belong to
+        self._dialog_state.set(dialog_state)
+
+    def record_local(self):
+        self._counts[self._dialog_state.get() or "unknown"]["local"] += 1
+
+    def record_clu_call(self):
+        # called by the CLU service for every request that goes to the network
+        # (cache hits, calls shared with another turn and calls skipped by the breaker are not counted)
+        self._counts[self._dialog_state.get() or "unknown"]["clu"] += 1
+
+    def stats(self) -> dict:
+        local = sum(counts["local"] for counts in self._counts.values())
+        clu = sum(counts["clu"] for counts in self._counts.values())
+        return {
+            "clu_calls_avoided": local,
+            "clu_calls": clu,
+            "avoided_rate": round(local / (local + clu), 3) if local + clu else 0.0,
+            "per_state": {state: dict(counts) for state, counts in sorted(self._counts.items())},
+        }
+
+
+# shared by both bots
+extraction_policy = ExtractionPolicy()
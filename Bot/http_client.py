@@ -0,0 +1,81 @@
+import asyncio
+from typing import Optional
+
+import aiohttp
+
+from FCCSemesterAufgabe.settings import HTTP_POOL_LIMIT, HTTP_POOL_LIMIT_PER_HOST, HTTP_DNS_CACHE_TTL, \
+    HTTP_KEEPALIVE_TIMEOUT, HTTP_TIMEOUT_SECONDS
+
+
+class SharedHttpClient:
+    # Application-wide pooled aiohttp session.
+    # Created in the ASGI lifespan startup and closed on shutdown (see FCCSemesterAufgabe/asgi.py),
+    # so CLU calls, audio downloads and Direct Line token requests reuse open TCP/TLS connections.
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 20, dns_cache_ttl: int = 300,
+                 keepalive_timeout: float = 30, timeout: float = 15):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            use_dns_cache=True,
+            ttl_dns_cache=self.dns_cache_ttl,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    async def startup(self):
+        self.get_session()
+        print(f"HTTP client pool started (limit={self.limit}, per host={self.limit_per_host})")
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+    def get_session(self) -> aiohttp.ClientSession:
+        # Returns the pooled session of the running event loop.
+        # Without a lifespan (e.g. runserver, where every async view gets its own loop) a session
+        # is created on demand for the current loop instead.
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            self._discard_session()
+            self._session = self._create_session()
+            self._loop = loop
+        return self._session
+
+    def _discard_session(self):
+        # Closes the session of a previous event loop before it is replaced. If that loop still
+        # runs (another thread) the session is closed there, otherwise its connections are released
+        # directly (the connector closes its transports synchronously).
+        session, loop = self._session, self._loop
+        if session is None or session.closed:
+            return
+        if loop is not None and loop.is_running():
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+            return
+        try:
+            # the transports are closed right away, the returned waiter only has to be awaited
+            asyncio.ensure_future(session.connector.close())
+        except RuntimeError:
+            # transports of an already closed loop cannot be closed anymore, the pool is dropped anyway
+            pass
+
+
+http_client = SharedHttpClient(
+    limit=HTTP_POOL_LIMIT,
+    limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+    dns_cache_ttl=HTTP_DNS_CACHE_TTL,
+    keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+    timeout=HTTP_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,47 @@
+import time
+from typing import Awaitable, Callable, List
+
+
+class Lifecycle:
+    # Shutdown coordination of the bot endpoint.
+    # On ASGI shutdown the process starts draining: /api/messages/ rejects new activities with 503
+    # (the Bot Connector retries them, e.g. on another replica) while the registered drain hooks
+    # wait for the turns that are already running.
+
+    def __init__(self):
+        self.draining = False
+        self.draining_since = None
+        self._drain_hooks: List[Callable[[float], Awaitable[bool]]] = []
+
+    def on_drain(self, hook: Callable[[float], Awaitable[bool]]):
+        # hook(timeout) waits for its work to finish and returns False if the timeout expired
+        self._drain_hooks.append(hook)
+
+    def start_draining(self):
+        if not self.draining:
+            self.draining = True
+            self.draining_since = time.monotonic()
+
+    def remaining(self, budget: float) -> float:
+        # Seconds left of a budget that started with the first start_draining() (i.e. SIGTERM)
+        self.start_draining()
+        return max(0.0, budget - (time.monotonic() - self.draining_since))
+
+    async def drain(self, timeout: float) -> bool:
+        # Stops accepting activities and waits at most `timeout` seconds for all drain hooks
+        self.start_draining()
+        deadline = time.monotonic() + timeout
+        drained = True
+
+        for hook in self._drain_hooks:
+            remaining = max(0.0, deadline - time.monotonic())
+            try:
+                drained = await hook(remaining) and drained
+            except Exception as e:
+                print(f"❌ Drain hook failed: {e}")
+                drained = False
+
+        return drained
+
+
+lifecycle = Lifecycle()
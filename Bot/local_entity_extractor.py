@@ -0,0 +1,342 @@
+import re
+from datetime import date
+from typing import List, Optional
+
+from FCCSemesterAufgabe.settings import ENTITY_EXTRACTION_MODE
+from .azure_service.luis_service import AzureCLUService
+from .text_messages import FieldConfig
+from .validators import DataValidator
+
+_MONTHS = {
+    "januar": 1, "jänner": 1, "februar": 2, "märz": 3, "maerz": 3, "april": 4, "mai": 5, "juni": 6,
+    "juli": 7, "august": 8, "september": 9, "oktober": 10, "november": 11, "dezember": 12,
+}
+
+# street name endings; the ones that also end ordinary words or city names ("Nürnberg", "Bahnhof")
+# only count when a house number follows
+_STREET_SUFFIXES = ("straße", "strasse", "str.", "weg", "allee", "platz", "gasse", "chaussee", "promenade")
+_WEAK_STREET_SUFFIXES = ("ring", "damm", "ufer", "pfad", "steig", "markt", "graben", "wall", "berg", "hof", "kamp")
+
+# largest German, Austrian and Swiss cities; anything else is only recognized after a postal code
+_CITIES = (
+    "Berlin", "Hamburg", "München", "Köln", "Frankfurt am Main", "Frankfurt", "Stuttgart", "Düsseldorf",
+    "Leipzig", "Dortmund", "Essen", "Bremen", "Dresden", "Hannover", "Nürnberg", "Duisburg", "Bochum",
+    "Wuppertal", "Bielefeld", "Bonn", "Münster", "Mannheim", "Karlsruhe", "Augsburg", "Wiesbaden",
+    "Mönchengladbach", "Gelsenkirchen", "Aachen", "Braunschweig", "Kiel", "Chemnitz", "Halle",
+    "Magdeburg", "Freiburg", "Krefeld", "Mainz", "Lübeck", "Erfurt", "Oberhausen", "Rostock", "Kassel",
+    "Hagen", "Potsdam", "Saarbrücken", "Hamm", "Ludwigshafen", "Oldenburg", "Mülheim an der Ruhr",
+    "Osnabrück", "Leverkusen", "Heidelberg", "Darmstadt", "Solingen", "Regensburg", "Herne", "Paderborn",
+    "Neuss", "Ingolstadt", "Offenbach", "Fürth", "Ulm", "Heilbronn", "Pforzheim", "Würzburg", "Wolfsburg",
+    "Göttingen", "Bottrop", "Reutlingen", "Erlangen", "Bremerhaven", "Koblenz", "Bergisch Gladbach",
+    "Remscheid", "Trier", "Recklinghausen", "Jena", "Moers", "Salzgitter", "Siegen", "Gütersloh",
+    "Hildesheim", "Hanau", "Kaiserslautern", "Cottbus", "Schwerin", "Wien", "Graz", "Linz", "Salzburg",
+    "Innsbruck", "Zürich", "Genf", "Basel", "Bern", "Lausanne",
+)
+
+_COUNTRIES = (
+    "Deutschland", "Österreich", "Schweiz", "Liechtenstein", "Luxemburg", "Belgien", "Niederlande",
+    "Frankreich", "Italien", "Spanien", "Portugal", "Polen", "Tschechien", "Dänemark", "Schweden",
+    "Norwegen", "Finnland", "Ungarn", "Rumänien", "Bulgarien", "Griechenland", "Kroatien", "Slowenien",
+    "Slowakei", "Irland", "Großbritannien", "Vereinigtes Königreich", "England", "Türkei", "Ukraine",
+    "Russland", "Vereinigte Staaten", "USA", "Kanada",
+)
+
+# spoken forms -> option keys of FieldConfig.GENDER_OPTIONS
+_GENDER_WORDS = {
+    "männlich": "männlich", "mann": "männlich", "weiblich": "weiblich", "frau": "weiblich",
+    "divers": "divers", "keine angabe": "keine angabe",
+}
+
+# spoken titles, longest first -> entry of FieldConfig.VALID_TITLES
+_SPOKEN_TITLES = (
+    ("professor doktor doktor", "Prof. Dr. Dr."), ("professor doktor", "Prof. Dr."),
+    ("doktor der philosophie", "Dr. phil."), ("doktor der medizin", "Dr. med."),
+    ("doktor der rechtswissenschaften", "Dr. jur."),
+    ("doktor ingenieur", "Dr.-Ing."), ("diplom ingenieur", "Dipl.-Ing."), ("diplom-ingenieur", "Dipl.-Ing."),
+    ("diplomingenieur", "Dipl.-Ing."), ("doktortitel", "Dr."),
+    ("professor", "Prof."), ("doktor", "Dr."), ("magister", "Mag."),
+)
+
+# salutations and titles in front of a name ("Frau Schmidt", "Dr. Hans Müller") are not part of it
+_SALUTATION_WORDS = ("Herr", "Herrn", "Frau", "Professor", "Professorin", "Doktor", "Diplomingenieur", "Magister")
+_TITLE_ABBREVIATIONS = sorted({part for title in FieldConfig.VALID_TITLES for part in title.split()}, key=len, reverse=True)
+_SALUTATION = (r"(?:(?:" + "|".join(_SALUTATION_WORDS) + r")\s+|(?:"
+               + "|".join(re.escape(part) for part in _TITLE_ABBREVIATIONS) + r")\s*)*")
+_NAME_WORD = (r"(?!(?:" + "|".join(_SALUTATION_WORDS) + r"|Dr|Prof|Dipl|Mag|Lic|Ph|Vorname|Nachname)\b)"
+              r"[A-ZÄÖÜ][a-zäöüß]+(?:-[A-ZÄÖÜ][a-zäöüß]+)?")
+
+
+class LocalEntityExtractor:
+    # In-process replacement for AzureCLUService.get_entities for the German registration fields.
+    # Compiled patterns cover the sentence shapes of the dialog ("ich wohne in der Hauptstraße 12b",
+    # "geboren am 1. Februar 1990", "meine Nummer ist 0151 1234567"), gazetteers cover titles,
+    # cities and countries. Returns the same entity dicts as CLU (category, text and key for list
+    # entities); values are normalized to the format the handlers validate (e.g. TT.MM.JJJJ).
+
+    EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+    SPOKEN_EMAIL_AT = re.compile(r"\s+(?:at|ät|et)\s+", re.IGNORECASE)
+    SPOKEN_EMAIL_DOT = re.compile(r"\s+(?:punkt|dot)\s+", re.IGNORECASE)
+    PHONE = re.compile(r"(?<![\w.])(?:\+|00)?\d[\d /()-]{4,}\d(?![\w.])")
+    NUMERIC_DATE = re.compile(r"\b(\d{1,2})\s?[./-]\s?(\d{1,2})\s?[./-]\s?(\d{4})\b")
+    WRITTEN_DATE = re.compile(r"\b(\d{1,2})\.?\s+(" + "|".join(_MONTHS) + r")\s+(\d{4})\b", re.IGNORECASE)
+    STREET = re.compile(
+        r"((?:(?:Alte|Alter|Neue|Neuer|Lange|Große|Kleine|Obere|Untere)\s+)?[A-ZÄÖÜ][\wäöüß-]*?"
+        r"(?i:" + "|".join(re.escape(suffix) for suffix in _STREET_SUFFIXES + _WEAK_STREET_SUFFIXES) + r"))"
+        r"(?![\wäöüß])(?:\s+(\d{1,4}\s?[a-zA-Z]?)\b)?"
+    )
+    # "Am Markt 3", "An der Alster 12"
+    PREPOSITIONAL_STREET = re.compile(
+        r"\b((?:Am|An der|An den|Auf dem|Auf der|Im|In der|Zum|Zur|Unter den)\s+[A-ZÄÖÜ][\wäöüß-]+)\s+(\d{1,4}\s?[a-zA-Z]?)\b"
+    )
+    HOUSE_NUMBER = re.compile(r"\b(?:hausnummer|nummer|nr\.?)\s+(?:ist\s+|lautet\s+)?(\d{1,4}\s?[a-zA-Z]?)\b",
+                              re.IGNORECASE)
+    # the whole answer is a house number: "23", "45a", "7 b"
+    BARE_HOUSE_NUMBER = re.compile(r"(\d{1,4}\s?[a-zA-Z]?)")
+    POSTAL_CITY = re.compile(r"\b(\d{5})\b(?:\s+(" + _NAME_WORD + r"(?:\s(?:am|an der|im|in der)\s" + _NAME_WORD + r")?))?")
+    NAME = re.compile(
+        r"\b(?i:ich heiße|ich heisse|(?:mein|der)\s+(?:vor|nach|familien)?name\s+(?:ist|lautet)|ich bin"
+        r"|man nennt mich|(?:vor|nach|familien)?name)\s+"
+        + _SALUTATION + r"(" + _NAME_WORD + r"(?:\s" + _NAME_WORD + r"){0,2})"
+    )
+    # answer that starts with the full name ("Max Mustermann, geboren ...") or with a salutation
+    # and the last name ("Herr Müller", "Frau Dr. Neumann")
+    LEADING_NAME = re.compile(
+        r"^(?:" + _SALUTATION + r"(" + _NAME_WORD + r"(?:\s" + _NAME_WORD + r"){1,2})"
+        + r"|(?:Herrn?|Frau)\s+" + _SALUTATION + r"(" + _NAME_WORD + r"))"
+        + r"(?=\s*(?:,|$)|\s+(?i:geboren|geb\.))"
+    )
+    # the whole answer is a single name: "Jonas", "Hans-Peter"
+    SINGLE_NAME = re.compile(_NAME_WORD)
+    # "Frau Schmidt" addresses a person, it does not answer the gender question
+    SALUTATION_BEFORE_NAME = re.compile(r"\b(?:Herrn?|Frau)\s+" + _SALUTATION + _NAME_WORD)
+    NO_TITLE = re.compile(r"\b(?:kein(?:en)?|ohne)\s+titel\b", re.IGNORECASE)
+    WORDS = re.compile(r"[\wäöüß]+", re.IGNORECASE)
+
+    CITY = re.compile(r"\b(" + "|".join(sorted((re.escape(city) for city in _CITIES), key=len, reverse=True)) + r")\b")
+    COUNTRY = re.compile(r"\b(" + "|".join(sorted((re.escape(country) for country in _COUNTRIES), key=len, reverse=True)) + r")\b",
+                         re.IGNORECASE)
+
+    _YES = (frozenset(FieldConfig.CONFIRMATION_YES) | frozenset(FieldConfig.POSITIVE_RESPONSES)
+            | frozenset(("stimmt", "genau", "passt", "jo", "jawohl")))
+    _NO = frozenset(FieldConfig.CONFIRMATION_NO) | frozenset(FieldConfig.NEGATIVE_RESPONSES)
+
+    async def get_entities(self, text: str) -> List[dict]:
+        return self.extract(text)
+
+    def extract(self, text: str) -> List[dict]:
+        text = (text or "").strip()
+        if not text:
+            return []
+
+        entities = []
+        taken = []  # spans already used, a postal code inside a phone number is no postal code
+
+        def add(category: str, value: str, span=None, key: str = None):
+            entity = {"category": category, "text": value}
+            if key is not None:
+                entity["key"] = key
+            entities.append(entity)
+            if span is not None:
+                taken.append(span)
+
+        def free(span) -> bool:
+            return all(span[1] <= start or span[0] >= end for start, end in taken)
+
+        email = self._find_email(text)
+        if email:
+            add("email", email[0], email[1])
+
+        birthdate = self._find_date(text)
+        if birthdate:
+            add("DateOfBirth", birthdate[0], birthdate[1])
+
+        for match in self.PHONE.finditer(text):
+            candidate = match.group(0).strip()
+            if free(match.span()) and sum(c.isdigit() for c in candidate) >= 7 and DataValidator.validate_phone(candidate):
+                add("PhoneNumber", candidate, match.span())
+                break
+
+        street = self._find_street(text)
+        if street and free(street.span()):
+            street_name = street.group(1).strip()
+            number = (street.group(2) or "").replace(" ", "")
+            add("StreetHousenumber", f"{street_name} {number}".strip(), street.span())
+            if number:
+                add("houseNumber", number)
+        else:
+            house_number = self.HOUSE_NUMBER.search(text) or self.BARE_HOUSE_NUMBER.fullmatch(text.rstrip("."))
+            if house_number:
+                add("houseNumber", house_number.group(1).replace(" ", ""), house_number.span())
+
+        for match in self.POSTAL_CITY.finditer(text):
+            if not free(match.span(1)) or not DataValidator.validate_postal_code(match.group(1)):
+                continue
+            add("ZipCode", match.group(1), match.span(1))
+            if match.group(2) and not self.COUNTRY.fullmatch(match.group(2)):
+                add("City", match.group(2), match.span(2))
+            break
+
+        if not any(entity["category"] == "City" for entity in entities):
+            city = self.CITY.search(text)
+            if city and free(city.span()):
+                add("City", city.group(1), city.span())
+
+        country = self.COUNTRY.search(text)
+        if country and free(country.span()):
+            add("countryName", self._canonical(country.group(1), _COUNTRIES), country.span())
+
+        title = self._find_title(text)
+        if title:
+            add("titel", title)
+
+        gender = self._find_gender(text)
+        if gender:
+            add("Gender", gender)
+
+        for name in self._find_names(text):
+            if free(name.span(name.lastindex)):
+                for word in name.group(name.lastindex).split():
+                    add("Name", word)
+
+        confirmation = self._find_confirmation(text)
+        if confirmation:
+            add("ConfirmationAnswer", confirmation[0], key=confirmation[1])
+
+        if not entities and self.SINGLE_NAME.fullmatch(text.rstrip(".")):
+            add("Name", text.rstrip("."))
+
+        return entities
+
+    def _find_email(self, text: str):
+        match = self.EMAIL.search(text)
+        if match and DataValidator.validate_email(match.group(0).rstrip(".")):
+            return match.group(0).rstrip("."), match.span()
+
+        # dictated addresses: "max punkt mustermann at beispiel punkt de"
+        spoken = self.SPOKEN_EMAIL_DOT.sub(".", self.SPOKEN_EMAIL_AT.sub("@", text))
+        match = self.EMAIL.search(spoken)
+        if match and DataValidator.validate_email(match.group(0).rstrip(".")):
+            return match.group(0).rstrip(".").lower(), None
+        return None
+
+    def _find_street(self, text: str):
+        for match in self.STREET.finditer(text):
+            if match.group(2) or match.group(1).lower().endswith(_STREET_SUFFIXES):
+                return match
+        return self.PREPOSITIONAL_STREET.search(text)
+
+    def _find_date(self, text: str):
+        for pattern, month_of in ((self.NUMERIC_DATE, int), (self.WRITTEN_DATE, lambda m: _MONTHS[m.lower()])):
+            for match in pattern.finditer(text):
+                try:
+                    value = date(int(match.group(3)), month_of(match.group(2)), int(match.group(1)))
+                except (ValueError, KeyError):
+                    continue
+                return value.strftime("%d.%m.%Y"), match.span()
+        return None
+
+    def _find_title(self, text: str) -> Optional[str]:
+        if self.NO_TITLE.search(text):
+            return "kein"
+        lowered = text.lower()
+        for title in sorted(FieldConfig.VALID_TITLES, key=len, reverse=True):
+            if re.search(r"(?<![\w.])" + re.escape(title.lower()) + r"(?![\w])", lowered):
+                return title
+        for spoken, title in _SPOKEN_TITLES:
+            if re.search(r"\b" + spoken + r"\b", lowered):
+                return title
+        return None
+
+    def _find_gender(self, text: str) -> Optional[str]:
+        lowered = self.SALUTATION_BEFORE_NAME.sub(" ", text).lower()
+        if "keine angabe" in lowered:
+            return "keine angabe"
+        found = {_GENDER_WORDS[word] for word in self.WORDS.findall(lowered) if word in _GENDER_WORDS}
+        return found.pop() if len(found) == 1 else None
+
+    def _find_names(self, text: str):
+        # every introduced name ("Vorname Paul, Nachname Richter"), else the name the answer starts with
+        names = list(self.NAME.finditer(text))
+        if names:
+            return names
+        leading = self.LEADING_NAME.search(text)
+        return [leading] if leading else []
+
+    def _find_confirmation(self, text: str):
+        lowered = text.lower()
+        for phrase in self._NO:
+            if " " in phrase and phrase in lowered:
+                return phrase, "no"
+
+        words = self.WORDS.findall(lowered)
+        if len(words) > 1:
+            # single letters ("j", "n") only count as the whole answer, not inside "j.schaefer@gmx.net"
+            words = [word for word in words if len(word) > 1]
+        yes = [word for word in words if word in self._YES]
+        no = [word for word in words if word in self._NO]
+        if yes and "nicht" in words:
+            # "nicht richtig", "das stimmt nicht, ok?"
+            no, yes = no + yes, []
+        if yes and not no:
+            return yes[0], "yes"
+        if no and not yes:
+            return no[0], "no"
+        return None
+
+    @staticmethod
+    def _canonical(value: str, names) -> str:
+        for name in names:
+            if name.lower() == value.lower():
+                return name
+        return value
+
+
+class LocalFirstEntityExtractor:
+    # Runs the local extractor and only calls CLU if it misses something: one of the requested
+    # categories (what the current dialog step needs) or, without categories, any entity at all.
+    # CLU entities are only taken over for the categories the local result lacks.
+
+    def __init__(self, local: LocalEntityExtractor, clu_service: AzureCLUService):
+        self.local = local
+        self.clu_service = clu_service
+
+        # metrics
+        self.local_answers = 0
+        self.clu_fallbacks = 0
+
+    async def get_entities(self, text: str, categories: Optional[List[str]] = None) -> List[dict]:
+        entities = self.local.extract(text)
+        found = {entity["category"] for entity in entities}
+        missing = [category for category in categories if category not in found] if categories else []
+        if entities and not missing:
+            self.local_answers += 1
+            return entities
+
+        self.clu_fallbacks += 1
+        clu_entities = await self.clu_service.get_entities(text=text)
+        if not entities:
+            return clu_entities
+        # "Ja, Max" when the name is asked: the local confirmation stays, the name comes from CLU
+        return entities + [entity for entity in clu_entities
+                           if (entity.get("category", "") or entity.get("name", "")) in missing]
+
+    def stats(self) -> dict:
+        total = self.local_answers + self.clu_fallbacks
+        return {
+            "local_answers": self.local_answers,
+            "clu_fallbacks": self.clu_fallbacks,
+            "local_rate": round(self.local_answers / total, 3) if total else 0.0,
+        }
+
+
+def create_entity_extractor(http_client=None, mode: str = None):
+    # Entity extraction used by the bots, chosen by ENTITY_EXTRACTION_MODE:
+    # "clu" (Azure CLU only), "local" (in-process only) or "local_first" (CLU if local finds nothing)
+    mode = (mode or ENTITY_EXTRACTION_MODE).lower()
+    if mode == "clu":
+        return AzureCLUService(http_client)
+    if mode == "local":
+        return LocalEntityExtractor()
+    if mode == "local_first":
+        return LocalFirstEntityExtractor(LocalEntityExtractor(), AzureCLUService(http_client))
+    raise ValueError(f"Unbekannter ENTITY_EXTRACTION_MODE: {mode} (erlaubt: clu, local, local_first)")
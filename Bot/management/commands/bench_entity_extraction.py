@@ -0,0 +1,105 @@
+import asyncio
+import json
+import re
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from Bot.local_entity_extractor import LocalEntityExtractor
+
+DEFAULT_CORPUS = Path(__file__).resolve().parent.parent / "entity_corpus.jsonl"
+
+
+class Command(BaseCommand):
+    help = ("Measures latency and accuracy of the local entity extractor on a labelled corpus "
+            "and, with --clu, its agreement with Azure CLU")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--corpus", default=str(DEFAULT_CORPUS),
+                            help="JSONL file with {\"text\": ..., \"entities\": [{\"category\", \"text\"}]} per line")
+        parser.add_argument("--repeat", type=int, default=200, help="local extraction runs per utterance")
+        parser.add_argument("--clu", action="store_true", help="also query CLU (needs the CLU secrets)")
+        parser.add_argument("--show-errors", action="store_true")
+
+    def handle(self, *args, **options):
+        with open(options["corpus"], encoding="utf-8") as f:
+            corpus = [json.loads(line) for line in f if line.strip()]
+
+        local = LocalEntityExtractor()
+        self._local = local
+
+        latencies = []
+        local_results = []
+        for item in corpus:
+            start = time.perf_counter()
+            for _ in range(options["repeat"]):
+                entities = local.extract(item["text"])
+            latencies.append((time.perf_counter() - start) / options["repeat"])
+            local_results.append(entities)
+
+        self.stdout.write(f"{len(corpus)} utterances")
+        self._report_latency("local", latencies)
+        self._report_accuracy("local vs labels", corpus, local_results, options["show_errors"])
+
+        if options["clu"]:
+            clu_latencies, clu_results = asyncio.run(self._run_clu(corpus))
+            self._report_latency("clu", clu_latencies)
+            self._report_accuracy("clu vs labels", corpus, clu_results, options["show_errors"])
+            agreement = [{"text": item["text"], "entities": result} for item, result in zip(corpus, clu_results)]
+            self._report_accuracy("local vs clu", agreement, local_results, options["show_errors"])
+
+    async def _run_clu(self, corpus):
+        from Bot.azure_service.luis_service import AzureCLUService, CLUEntityCache
+        from Bot.http_client import SharedHttpClient
+
+        client = SharedHttpClient()
+        # a private cache, otherwise repeated texts would measure the cache instead of CLU
+        service = AzureCLUService(client, entity_cache=CLUEntityCache(max_entries=1))
+        latencies, results = [], []
+        try:
+            for item in corpus:
+                start = time.perf_counter()
+                results.append(await service.get_entities(item["text"]))
+                latencies.append(time.perf_counter() - start)
+        finally:
+            await client.close()
+        return latencies, results
+
+    def _report_latency(self, name: str, latencies):
+        ordered = sorted(latencies)
+        p50 = ordered[len(ordered) // 2]
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        self.stdout.write(f"{name:6} latency  p50 {p50 * 1000:8.3f} ms  p95 {p95 * 1000:8.3f} ms  "
+                          f"max {ordered[-1] * 1000:8.3f} ms")
+
+    def _report_accuracy(self, name: str, expected_items, actual_results, show_errors: bool):
+        # entities are compared as (category, normalized value) sets per utterance
+        true_positives = false_positives = false_negatives = exact = 0
+        for item, actual in zip(expected_items, actual_results):
+            expected_set = {self._canonical(entity) for entity in item["entities"]}
+            actual_set = {self._canonical(entity) for entity in actual}
+            true_positives += len(expected_set & actual_set)
+            false_positives += len(actual_set - expected_set)
+            false_negatives += len(expected_set - actual_set)
+            exact += expected_set == actual_set
+            if show_errors and expected_set != actual_set:
+                self.stdout.write(f"   {item['text']!r}: missing {sorted(expected_set - actual_set)} "
+                                  f"extra {sorted(actual_set - expected_set)}")
+
+        precision = true_positives / (true_positives + false_positives) if true_positives + false_positives else 0.0
+        recall = true_positives / (true_positives + false_negatives) if true_positives + false_negatives else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        self.stdout.write(f"{name:16} precision {precision:5.3f}  recall {recall:5.3f}  f1 {f1:5.3f}  "
+                          f"exact utterances {exact}/{len(expected_items)}")
+
+    def _canonical(self, entity: dict) -> tuple:
+        category = entity.get("category", "") or entity.get("name", "")
+        if category == "ConfirmationAnswer" and entity.get("key"):
+            return category, entity["key"].lower()
+        value = entity.get("text", "")
+        if category == "DateOfBirth":
+            parsed = self._local._find_date(value)
+            if parsed:
+                value = parsed[0]
+        return category, re.sub(r"[\s.]", "", value.lower())
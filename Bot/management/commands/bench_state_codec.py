@@ -0,0 +1,62 @@
+import copy
+import time
+from datetime import datetime, timedelta
+
+import orjson
+from django.core.management.base import BaseCommand
+
+from Bot.storage.serialization import dumps_state, loads_state
+
+
+class Command(BaseCommand):
+    help = "Compares size and (de)serialization time of the bot state encoding with plain dicts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--conversations", type=int, default=100_000)
+
+    def handle(self, *args, **options):
+        count = options["conversations"]
+        states = [self._sample_state(i) for i in range(count)]
+
+        results = [
+            ("dict deepcopy (MemoryStorage)", lambda s: copy.deepcopy(s), lambda s: copy.deepcopy(s), None),
+            ("json (orjson)", orjson.dumps, orjson.loads, len),
+            ("msgpack profile v1", dumps_state, loads_state, len),
+        ]
+
+        self.stdout.write(f"{count} conversations")
+        for name, encode, decode, size in results:
+            start = time.perf_counter()
+            encoded = [encode(state) for state in states]
+            encode_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for item in encoded:
+                decode(item)
+            decode_time = time.perf_counter() - start
+
+            total_bytes = sum(size(item) for item in encoded) if size else None
+            size_text = f"{total_bytes / 1024 / 1024:8.2f} MiB" if total_bytes is not None else "       -    "
+            self.stdout.write(f"{name:32} {size_text}  encode {encode_time:6.2f}s  decode {decode_time:6.2f}s")
+
+    def _sample_state(self, i: int) -> dict:
+        # mix of finished, half-finished and fresh registrations
+        consent = (datetime(2025, 1, 1) + timedelta(seconds=i * 37)).isoformat()
+        if i % 3 == 0:
+            return {"DialogState": "greeting", "UserProfile": {"first_interaction": True}}
+        if i % 3 == 1:
+            return {"DialogState": "completed",
+                    "UserProfile": {"registration_completed": True, "completion_timestamp": consent}}
+        return {
+            "DialogState": "confirm_country",
+            "UserProfile": {
+                "first_interaction": True, "consent_given": True, "consent_timestamp": consent,
+                "gender": "female", "gender_display": "Weiblich", "title": "", "title_display": "Kein Titel",
+                "first_name": f"Erika{i}", "last_name": "Mustermann", "birth_date": "1990-05-17",
+                "birth_date_display": "17.05.1990", "email": f"erika{i}@example.com",
+                "telephone": "+4915112345678", "telephone_display": "0151 12345678",
+                "street_name": "Hauptstraße", "house_number": 12, "house_number_addition": "",
+                "house_addition_display": "Kein Zusatz", "postal_code": "10115", "city": "Berlin",
+                "country_name": "Deutschland", "correction_mode": False,
+            },
+        }
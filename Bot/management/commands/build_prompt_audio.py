@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Bot.prompt_audio import PromptAudioBundle, write_bundle
+from Bot.text_speech_bot import SpeechBotMessages, markdown_to_speech
+from FCCSemesterAufgabe.settings import PROMPT_AUDIO_BUNDLE
+
+
+class Command(BaseCommand):
+    help = ("Synthesizes all static prompts of the audio bot for the given voices into one bundle "
+            "that the bot memory maps at start (needs the Speech secrets)")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default=PROMPT_AUDIO_BUNDLE)
+        parser.add_argument("--voice", action="append", dest="voices",
+                            help="voice to render, repeatable (default: the voice of the bot)")
+        parser.add_argument("--dry-run", action="store_true", help="only list the prompts")
+
+    def handle(self, *args, **options):
+        prompts = list(dict.fromkeys(markdown_to_speech(prompt) for prompt in SpeechBotMessages.static_prompts()))
+        if options["dry_run"]:
+            for prompt in prompts:
+                self.stdout.write(prompt)
+            self.stdout.write(f"{len(prompts)} prompts")
+            return
+
+        from Bot.azure_service.speech_service import AzureSpeechService, DEFAULT_VOICE, OUTPUT_FORMAT
+
+        voices = options["voices"] or [DEFAULT_VOICE]
+        speech_service = AzureSpeechService()
+
+        audio_by_key = {}
+        start = time.perf_counter()
+        for voice in voices:
+            for prompt in prompts:
+                audio = speech_service.text_to_speech_bytes(prompt, voice, cacheable=True)
+                if not audio:
+                    raise CommandError(f"TTS failed for {voice}: {prompt!r}")
+                audio_by_key[speech_service.audio_cache.key(voice, prompt)] = audio
+
+        version = write_bundle(options["output"], audio_by_key, OUTPUT_FORMAT, voices)
+        bundle = PromptAudioBundle(options["output"])
+        try:
+            size = bundle.stats()["bytes"]
+        finally:
+            bundle.close()
+        self.stdout.write(f"{len(audio_by_key)} prompts ({len(prompts)} x {len(voices)} voices) in "
+                          f"{time.perf_counter() - start:.1f}s -> {options['output']} "
+                          f"version {version}, {size / 1024 / 1024:.2f} MiB")
@@ -0,0 +1,82 @@
+import multiprocessing
+import random
+
+from django.core.management.base import BaseCommand
+
+from Bot.affinity import HashRing
+from Bot.cache import TTLCache
+
+
+def _worker(inbox: multiprocessing.Queue, results: multiprocessing.Queue, cache_size: int):
+    # One bot process with its own in-process cache (stands in for state/CLU/TTS caches)
+    cache = TTLCache(max_entries=cache_size)
+    while True:
+        conversation_id = inbox.get()
+        if conversation_id is None:
+            break
+        if cache.get(conversation_id) is None:
+            cache.set(conversation_id, True)
+    results.put((cache.hits, cache.misses))
+
+
+class Command(BaseCommand):
+    help = "Simulates bot worker processes and compares cache hit rates with and without conversation affinity"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--conversations", type=int, default=2000)
+        parser.add_argument("--turns", type=int, default=12, help="turns per conversation")
+        parser.add_argument("--cache-size", type=int, default=1000, help="cache entries per worker")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        nodes = [f"http://worker-{i}:8000" for i in range(options["workers"])]
+
+        # interleaved turns of all conversations, as they arrive at the load balancer
+        trace = [f"conversation-{c}" for c in range(options["conversations"]) for _ in range(options["turns"])]
+        rng.shuffle(trace)
+
+        counter = iter(range(len(trace)))
+        round_robin = lambda _: nodes[next(counter) % len(nodes)]
+        ring = HashRing(nodes)
+
+        for name, route in (("round robin", round_robin), ("consistent hash", ring.owner)):
+            hits, misses = self._run(trace, nodes, route, options["cache_size"])
+            self.stdout.write(f"{name:16} hit rate {hits / (hits + misses):6.1%}  ({hits} hits, {misses} misses)")
+
+        # rebalancing: share of conversations that change their worker when one leaves / joins
+        conversations = sorted(set(trace))
+        before = {conversation: ring.owner(conversation) for conversation in conversations}
+        ring.remove_node(nodes[-1])
+        moved_leave = sum(before[c] != ring.owner(c) for c in conversations)
+        ring.add_node(nodes[-1])
+        ring.add_node(f"http://worker-{len(nodes)}:8000")
+        moved_join = sum(before[c] != ring.owner(c) for c in conversations)
+
+        self.stdout.write(f"worker leaves: {moved_leave / len(conversations):6.1%} of conversations move "
+                          f"(ideal {1 / len(nodes):6.1%})")
+        self.stdout.write(f"worker joins:  {moved_join / len(conversations):6.1%} of conversations move "
+                          f"(ideal {1 / (len(nodes) + 1):6.1%})")
+
+    def _run(self, trace, nodes, route, cache_size):
+        results = multiprocessing.Queue()
+        inboxes = {node: multiprocessing.Queue() for node in nodes}
+        workers = [multiprocessing.Process(target=_worker, args=(inboxes[node], results, cache_size))
+                   for node in nodes]
+        for worker in workers:
+            worker.start()
+
+        for conversation_id in trace:
+            inboxes[route(conversation_id)].put(conversation_id)
+        for inbox in inboxes.values():
+            inbox.put(None)
+
+        hits = misses = 0
+        for _ in workers:
+            worker_hits, worker_misses = results.get()
+            hits += worker_hits
+            misses += worker_misses
+        for worker in workers:
+            worker.join()
+        return hits, misses
@@ -3,35 +3,42 @@ import re
 from datetime import datetime
 from injector import inject
 
-from botbuilder.core import ActivityHandler, MessageFactory, TurnContext, ConversationState, UserState
+from botbuilder.core import ActivityHandler, MessageFactory, TurnContext, ConversationState
 from botbuilder.schema import ChannelAccount
 
-from Bot.azure_service.luis_service import AzureCLUService
+from Bot.local_entity_extractor import create_entity_extractor
 from FCCSemesterAufgabe.settings import isDocker
 from .dialogstate import DialogState
 from .validators import DataValidator
 from .services import CustomerService
 from .text_messages import BotMessages, FieldConfig
+from .outbox import TurnOutbox
+from .extraction_policy import extraction_policy
+from .turn_entities import TurnEntities
+from .slot_filling import SLOT_FILLING_PROPERTY, fill_slots, clear_prefilled, next_open_step
+from .http_client import SharedHttpClient, http_client as shared_http_client
 
 
 class RegistrationTextBot(ActivityHandler):
     # Initializes the RegistrationTextBot
 
     @inject
-    def __init__(self, conversation_state: ConversationState, user_state: UserState, customer_service: CustomerService):
+    def __init__(self, conversation_state: ConversationState, customer_service: CustomerService,
+                 http_client: SharedHttpClient = None):
         self.customer_service = customer_service
+        self.http_client = http_client or shared_http_client
         self.conversation_state = conversation_state
-        self.user_state = user_state
 
         if isDocker:
             self.clu_service = None
         else:
-            self.clu_service = AzureCLUService()
+            self.clu_service = create_entity_extractor(self.http_client)
             print("Azure CLU Service initialized")
 
         # Accessors for storing and retrieving user profile and dialogue state data
         self.user_profile_accessor = self.conversation_state.create_property("UserProfile")
         self.dialog_state_accessor = self.conversation_state.create_property("DialogState")
+        self.slot_filling_accessor = self.conversation_state.create_property(SLOT_FILLING_PROPERTY)
 
         # Dictionary mapping dialogue states to their respective handler methods
         self.dialog_handlers = {
@@ -71,6 +78,23 @@ class RegistrationTextBot(ActivityHandler):
             ("confirm_country", self._show_final_summary, self._ask_for_country),
         ]
 
+    async def on_turn(self, turn_context: TurnContext):
+        # Replies are collected during the turn and sent as one message at the end
+        try:
+            await super().on_turn(turn_context)
+        finally:
+            await self._flush_outbox(turn_context)
+
+    async def _send_text(self, turn_context: TurnContext, text: str):
+        # Queues a reply for the current turn (see _flush_outbox)
+        TurnOutbox.for_turn(turn_context).add(text)
+
+    async def _flush_outbox(self, turn_context: TurnContext):
+        # Sends all queued replies of the turn as a single message activity
+        messages = TurnOutbox.for_turn(turn_context).drain()
+        if messages:
+            await turn_context.send_activity(MessageFactory.text(TurnOutbox.join(messages)))
+
     async def on_message_activity(self, turn_context: TurnContext):
         # Called when a message activity is received from the user
 
@@ -91,7 +115,6 @@ class RegistrationTextBot(ActivityHandler):
 
             # Save state and return early
             await self.conversation_state.save_changes(turn_context)
-            await self.user_state.save_changes(turn_context)
             return
 
         # Special handling for the COMPLETED state, where the registration is finished
@@ -113,11 +136,10 @@ class RegistrationTextBot(ActivityHandler):
 
         # save the state after each iteration
         await self.conversation_state.save_changes(turn_context)
-        await self.user_state.save_changes(turn_context)
 
     async def _start_correction_process(self, turn_context: TurnContext, user_profile):
         # Starts the correction process by displaying a list of fields the user can choose to modify
-        await turn_context.send_activity(MessageFactory.text(BotMessages.CORRECTION_OPTIONS))
+        await self._send_text(turn_context, BotMessages.CORRECTION_OPTIONS)
         await self.dialog_state_accessor.set(turn_context, "correction_selection")
 
     async def _handle_correction_selection(self, turn_context: TurnContext, user_profile, user_input):
@@ -165,7 +187,7 @@ class RegistrationTextBot(ActivityHandler):
 
             # Send correction start message
             correction_message = BotMessages.correction_start(field_display)
-            await turn_context.send_activity(MessageFactory.text(correction_message))
+            await self._send_text(turn_context, correction_message)
 
             # Set the dialogue state to the target field
             await self.dialog_state_accessor.set(turn_context, target_state)
@@ -177,28 +199,37 @@ class RegistrationTextBot(ActivityHandler):
 
         else:
             # Not understood
-            await turn_context.send_activity(MessageFactory.text(BotMessages.CORRECTION_NOT_UNDERSTOOD))
+            await self._send_text(turn_context, BotMessages.CORRECTION_NOT_UNDERSTOOD)
 
     async def _handle_restart_request(self, turn_context: TurnContext):
         # Handles requests to restart the entire registration process
-        await turn_context.send_activity(MessageFactory.text(BotMessages.RESTART_MESSAGE))
+        await self._send_text(turn_context, BotMessages.RESTART_MESSAGE)
 
         # Reset user profile and dialogue state to start fresh
+        await self.slot_filling_accessor.delete(turn_context)
         await self.user_profile_accessor.set(turn_context, {})
         await self.dialog_state_accessor.set(turn_context, DialogState.GREETING)
 
         # Start new registration
         await self._handle_greeting(turn_context, {})
 
-    async def _extract_specific_entity(self, user_input: str, entity_type: str):
-        #  Sends input to CLU and searches for a specific entity type
+    async def _extract_specific_entity(self, turn_context: TurnContext, user_input: str, entity_type: str):
+        #  Parses unambiguous input locally, otherwise sends it to CLU and searches for a specific entity type
+        dialog_state = await self.dialog_state_accessor.get(turn_context, lambda: DialogState.GREETING)
+        extraction_policy.set_dialog_state(dialog_state)
+        local_entity = extraction_policy.parse_entity(entity_type, user_input)
+        if local_entity is not None:
+            extraction_policy.record_local()
+            TurnEntities.for_turn(turn_context).answered_locally(user_input)
+            print(f"{entity_type} lokal erkannt: '{local_entity}' (ohne CLU)")
+            return local_entity
 
         if not self.clu_service:
             return None
 
         try:
             # send input to the clu
-            entities = await self.clu_service.get_entities(text=user_input)
+            entities = await TurnEntities.for_turn(turn_context).get(self.clu_service, user_input, entity_type)
             print(f"CLU Entities für {entity_type}: {entities}")
 
             # iterate over the results
@@ -224,7 +255,7 @@ class RegistrationTextBot(ActivityHandler):
         if user_profile.get('correction_mode'):
             # Correction completed - confirm and return to summary
             correction_message = BotMessages.correction_success(field_display, new_value)
-            await turn_context.send_activity(MessageFactory.text(correction_message))
+            await self._send_text(turn_context, correction_message)
 
             # Exit correction mode
             user_profile['correction_mode'] = False
@@ -243,22 +274,23 @@ class RegistrationTextBot(ActivityHandler):
         if any(keyword in user_input_lower for keyword in FieldConfig.RESTART_KEYWORDS):
             # Check if the previous registration was cancelled
             if user_profile.get('registration_cancelled'):
-                await turn_context.send_activity(MessageFactory.text(BotMessages.RESTART_NEW_REGISTRATION))
+                await self._send_text(turn_context, BotMessages.RESTART_NEW_REGISTRATION)
 
                 # Reset and restart registration
+                await self.slot_filling_accessor.delete(turn_context)
                 await self.user_profile_accessor.set(turn_context, {})
                 await self.dialog_state_accessor.set(turn_context, DialogState.GREETING)
                 await self._handle_greeting(turn_context, {})
 
             elif user_profile.get('consent_given') and not user_profile.get('registration_cancelled'):
                 # Registration was successful
-                await turn_context.send_activity(MessageFactory.text(BotMessages.ALREADY_REGISTERED))
+                await self._send_text(turn_context, BotMessages.ALREADY_REGISTERED)
         else:
             # Other inquiries after registration is completed
             if user_profile.get('registration_cancelled'):
-                await turn_context.send_activity(MessageFactory.text(BotMessages.REGISTRATION_CANCELLED_HELP))
+                await self._send_text(turn_context, BotMessages.REGISTRATION_CANCELLED_HELP)
             else:
-                await turn_context.send_activity(MessageFactory.text(BotMessages.ALREADY_COMPLETED_HELP))
+                await self._send_text(turn_context, BotMessages.ALREADY_COMPLETED_HELP)
 
     async def _handle_unknown_state(self, turn_context: TurnContext, user_profile, user_input):
         """Handles situations where the bot is in an unknown or unexpected dialogue state"""
@@ -266,15 +298,16 @@ class RegistrationTextBot(ActivityHandler):
 
         if any(keyword in user_input_lower for keyword in FieldConfig.RESTART_KEYWORDS):
             # User wants a restart
-            await turn_context.send_activity(MessageFactory.text(BotMessages.UNKNOWN_STATE_RESTART))
+            await self._send_text(turn_context, BotMessages.UNKNOWN_STATE_RESTART)
 
             # Reset state and set to registration beginning
+            await self.slot_filling_accessor.delete(turn_context)
             await self.user_profile_accessor.set(turn_context, {})
             await self.dialog_state_accessor.set(turn_context, DialogState.GREETING)
             await self._handle_greeting(turn_context, {})
         else:
             # Unknown state + no restart keywords
-            await turn_context.send_activity(MessageFactory.text(BotMessages.UNKNOWN_STATE_CONFUSION))
+            await self._send_text(turn_context, BotMessages.UNKNOWN_STATE_CONFUSION)
             await self.dialog_state_accessor.set(turn_context, DialogState.COMPLETED)
 
     async def on_members_added_activity(self, members_added: [ChannelAccount], turn_context: TurnContext):
@@ -290,11 +323,10 @@ class RegistrationTextBot(ActivityHandler):
 
         # Save state after each round
         await self.conversation_state.save_changes(turn_context)
-        await self.user_state.save_changes(turn_context)
 
     async def _handle_greeting(self, turn_context: TurnContext, user_profile, *args):
         # Starts the registration dialogue with a welcome message and explanation of the process
-        await turn_context.send_activity(MessageFactory.text(BotMessages.WELCOME_MESSAGE))
+        await self._send_text(turn_context, BotMessages.WELCOME_MESSAGE)
         # Transition to the next state
         await self.dialog_state_accessor.set(turn_context, DialogState.ASK_CONSENT)
 
@@ -304,7 +336,7 @@ class RegistrationTextBot(ActivityHandler):
 
         if any(response in user_input_lower for response in FieldConfig.POSITIVE_RESPONSES):
             # User agrees - start registration
-            await turn_context.send_activity(MessageFactory.text(BotMessages.CONSENT_GRANTED))
+            await self._send_text(turn_context, BotMessages.CONSENT_GRANTED)
             user_profile['consent_given'] = True
             user_profile['consent_timestamp'] = datetime.now().isoformat()
             await self.user_profile_accessor.set(turn_context, user_profile)
@@ -312,8 +344,9 @@ class RegistrationTextBot(ActivityHandler):
 
         elif any(response in user_input_lower for response in FieldConfig.NEGATIVE_RESPONSES):
             # User doesn't agree - end the registration
-            await turn_context.send_activity(MessageFactory.text(BotMessages.CONSENT_DENIED))
+            await self._send_text(turn_context, BotMessages.CONSENT_DENIED)
             await self.dialog_state_accessor.set(turn_context, DialogState.COMPLETED)
+            await self.slot_filling_accessor.delete(turn_context)
             await self.user_profile_accessor.set(turn_context, {
                 'consent_given': False,
                 'consent_timestamp': datetime.now().isoformat(),
@@ -321,11 +354,11 @@ class RegistrationTextBot(ActivityHandler):
             })
         else:
             # Unclear answer - ask again
-            await turn_context.send_activity(MessageFactory.text(BotMessages.CONSENT_UNCLEAR))
+            await self._send_text(turn_context, BotMessages.CONSENT_UNCLEAR)
 
     async def _ask_for_gender(self, turn_context: TurnContext):
         # Asks the user for their gender, providing options
-        await turn_context.send_activity(MessageFactory.text(BotMessages.FIELD_PROMPTS["gender"]))
+        await self._send_text(turn_context, BotMessages.FIELD_PROMPTS["gender"])
         # Transition to the next state
         await self.dialog_state_accessor.set(turn_context, DialogState.ASK_GENDER)
 
@@ -345,11 +378,11 @@ class RegistrationTextBot(ActivityHandler):
 
             await self._confirm_field(turn_context, "Geschlecht", gender_display, DialogState.CONFIRM_PREFIX + "gender")
         else:
-            await turn_context.send_activity(MessageFactory.text(BotMessages.VALIDATION_ERRORS['gender']))
+            await self._send_text(turn_context, BotMessages.VALIDATION_ERRORS['gender'])
 
     async def _ask_for_title(self, turn_context: TurnContext):
         # Asks the user for their academic title
-        await turn_context.send_activity(MessageFactory.text(BotMessages.FIELD_PROMPTS['title']))
+        await self._send_text(turn_context, BotMessages.FIELD_PROMPTS['title'])
         await self.dialog_state_accessor.set(turn_context, DialogState.ASK_TITLE)
 
     async def _handle_title_input(self, turn_context: TurnContext, user_profile, user_input):
@@ -377,16 +410,16 @@ class RegistrationTextBot(ActivityHandler):
 
             await self._confirm_field(turn_context, "Titel", user_input, DialogState.CONFIRM_PREFIX + "title")
         else:
-            await turn_context.send_activity(MessageFactory.text(BotMessages.VALIDATION_ERRORS['title']))
+            await self._send_text(turn_context, BotMessages.VALIDATION_ERRORS['title'])
 
     async def _ask_for_first_name(self, turn_context: TurnContext):
         # Asks the user for their first name
-        await turn_context.send_activity(MessageFactory.text(BotMessages.FIELD_PROMPTS['first_name']))
+        await self._send_text(turn_context, BotMessages.FIELD_PROMPTS['first_name'])
         await self.dialog_state_accessor.set(turn_context, DialogState.ASK_FIRST_NAME)
 
     async def _handle_first_name_input(self, turn_context: TurnContext, user_profile, user_input):
         # validate user name
-        name_entity = await self._extract_specific_entity(user_input, 'Name')
+        name_entity = await self._extract_specific_entity(turn_context, user_input, 'Name')
         if name_entity and DataValidator.validate_name_part(name_entity):
             user_profile['first_name'] = name_entity.strip()
             await self.user_profile_accessor.set(turn_context, user_profile)
@@ -411,16 +444,16 @@ class RegistrationTextBot(ActivityHandler):
             return
 
         # Error case
-        await turn_context.send_activity(MessageFactory.text(BotMessages.VALIDATION_ERRORS['first_name']))
+        await self._send_text(turn_context, BotMessages.VALIDATION_ERRORS['first_name'])
 
     async def _ask_for_last_name(self, turn_context: TurnContext):
         # Asks the user for their last name
-        await turn_context.send_activity(MessageFactory.text(BotMessages.FIELD_PROMPTS['last_name']))
+        await self._send_text(turn_context, BotMessages.FIELD_PROMPTS['last_name'])
         await self.dialog_state_accessor.set(turn_context, DialogState.ASK_LAST_NAME)
 
     async def _handle_last_name_input(self, turn_context: TurnContext, user_profile, user_input):
         #  Processes the user's input for the last name
-        name_entity = await self._extract_specific_entity(user_input, 'Name')
+        name_entity = await self._extract_specific_entity(turn_context, user_input, 'Name')
         if name_entity and DataValidator.validate_name_part(name_entity):
             user_profile['last_name'] = name_entity.strip()
             await self.user_profile_accessor.set(turn_context, user_profile)
@@ -445,17 +478,17 @@ class RegistrationTextBot(ActivityHandler):
             return
 
         # Error case
-        await turn_context.send_activity(MessageFactory.text(BotMessages.VALIDATION_ERRORS['last_name']))
+        await self._send_text(turn_context, BotMessages.VALIDATION_ERRORS['last_name'])
 
     async def _ask_for_birthdate(self, turn_context: TurnContext):
         # Asks the user for their birthdate in  TT.MM.JJJJ format
-        await turn_context.send_activity(MessageFactory.text(BotMessages.FIELD_PROMPTS['birthdate']))
+        await self._send_text(turn_context, BotMessages.FIELD_PROMPTS['birthdate'])
         await self.dialog_state_accessor.set(turn_context, DialogState.ASK_BIRTHDATE)
 
     async def _handle_birthdate_input(self, turn_context: TurnContext, user_profile, user_input):
         # Processes the user's input for birthdate
         # and validate them
-        date_entity = await self._extract_specific_entity(user_input, 'DateOfBirth')
+        date_entity = await self._extract_specific_entity(turn_context, user_input, 'DateOfBirth')
         if date_entity:
             birthdate = DataValidator.validate_birthdate(date_entity)
             if birthdate:
@@ -487,21 +520,21 @@ class RegistrationTextBot(ActivityHandler):
             return
 
         # Error case
-        await turn_context.send_activity(MessageFactory.text(BotMessages.VALIDATION_ERRORS['birthdate']))
+        await self._send_text(turn_context, BotMessages.VALIDATION_ERRORS['birthdate'])
 
     async def _ask_for_email(self, turn_context: TurnContext):
         # Asks the user for their email address
-        await turn_context.send_activity(MessageFactory.text(BotMessages.FIELD_PROMPTS['email']))
+        await self._send_text(turn_context, BotMessages.FIELD_PROMPTS['email'])
         await self.dialog_state_accessor.set(turn_context, DialogState.ASK_EMAIL)
 
     async def _handle_email_input(self, turn_context: TurnContext, user_profile, user_input):
         # Processes the user's input for the email address
         # check if the email is already in use
-        email_entity = await self._extract_specific_entity(user_input, 'email')
+        email_entity = await self._extract_specific_entity(turn_context, user_input, 'email')
         if email_entity and DataValidator.validate_email(email_entity):
             if not user_profile.get('correction_mode'):
                 if await self.customer_service.email_exists_in_db(email_entity.strip().lower()):
-                    await turn_context.send_activity(MessageFactory.text(BotMessages.VALIDATION_ERRORS['email_exists']))
+                    await self._send_text(turn_context, BotMessages.VALIDATION_ERRORS['email_exists'])
                     return
 
             user_profile['email'] = email_entity.strip().lower()
@@ -518,7 +551,7 @@ class RegistrationTextBot(ActivityHandler):
         if DataValidator.validate_email(user_input):
             if not user_profile.get('correction_mode'):
                 if await self.customer_service.email_exists_in_db(user_input.strip().lower()):
-                    await turn_context.send_activity(MessageFactory.text(BotMessages.VALIDATION_ERRORS['email_exists']))
+                    await self._send_text(turn_context, BotMessages.VALIDATION_ERRORS['email_exists'])
                     return
 
             user_profile['email'] = user_input.strip().lower()
@@ -532,16 +565,16 @@ class RegistrationTextBot(ActivityHandler):
             return
 
         # Error case
-        await turn_context.send_activity(MessageFactory.text(BotMessages.VALIDATION_ERRORS['email']))
+        await self._send_text(turn_context, BotMessages.VALIDATION_ERRORS['email'])
 
     async def _ask_for_phone(self, turn_context: TurnContext):
         # ask for the phone number
-        await turn_context.send_activity(MessageFactory.text(BotMessages.FIELD_PROMPTS['phone']))
+        await self._send_text(turn_context, BotMessages.FIELD_PROMPTS['phone'])
         await self.dialog_state_accessor.set(turn_context, DialogState.ASK_PHONE)
 
     async def _handle_phone_input(self, turn_context: TurnContext, user_profile, user_input):
         # Processes the user's input for the phone number
-        phone_entity = await self._extract_specific_entity(user_input, 'PhoneNumber')
+        phone_entity = await self._extract_specific_entity(turn_context, user_input, 'PhoneNumber')
         if phone_entity:
             phone_number_obj = DataValidator.validate_phone(phone_entity)
             if phone_number_obj:
@@ -572,17 +605,17 @@ class RegistrationTextBot(ActivityHandler):
             return
 
         # Error case
-        await turn_context.send_activity(MessageFactory.text(BotMessages.VALIDATION_ERRORS['phone']))
+        await self._send_text(turn_context, BotMessages.VALIDATION_ERRORS['phone'])
 
     async def _ask_for_street(self, turn_context: TurnContext):
         # Asks the user for their street name
-        await turn_context.send_activity(MessageFactory.text(BotMessages.FIELD_PROMPTS['street']))
+        await self._send_text(turn_context, BotMessages.FIELD_PROMPTS['street'])
         await self.dialog_state_accessor.set(turn_context, DialogState.ASK_STREET)
 
     # MODIFIED METHOD: Street input with CLU first
     async def _handle_street_input(self, turn_context: TurnContext, user_profile, user_input):
         # First: Try CLU for StreetHousenumber entity
-        street_entity = await self._extract_specific_entity(user_input, 'StreetHousenumber')
+        street_entity = await self._extract_specific_entity(turn_context, user_input, 'StreetHousenumber')
         if street_entity:
             # Remove numbers and common additions to get street name
             street_name = re.sub(r'\s*\d+[a-zA-Z]*\s*$', '', street_entity).strip()
@@ -622,16 +655,16 @@ class RegistrationTextBot(ActivityHandler):
             return
 
         # Error case
-        await turn_context.send_activity(MessageFactory.text(BotMessages.VALIDATION_ERRORS['street']))
+        await self._send_text(turn_context, BotMessages.VALIDATION_ERRORS['street'])
 
     async def _ask_for_house_number(self, turn_context: TurnContext):
         # Asks the user for their house number
-        await turn_context.send_activity(MessageFactory.text(BotMessages.FIELD_PROMPTS['house_number']))
+        await self._send_text(turn_context, BotMessages.FIELD_PROMPTS['house_number'])
         await self.dialog_state_accessor.set(turn_context, DialogState.ASK_HOUSE_NUMBER)
 
     async def _handle_house_number_input(self, turn_context: TurnContext, user_profile, user_input):
         # First: Try CLU for StreetHousenumber entity (might contain house number)
-        street_entity = await self._extract_specific_entity(user_input, 'houseNumber')
+        street_entity = await self._extract_specific_entity(turn_context, user_input, 'houseNumber')
         if street_entity:
             # Try to extract house number from StreetHousenumber entity
             # Look for numbers in the entity text
@@ -672,11 +705,11 @@ class RegistrationTextBot(ActivityHandler):
                 raise ValueError()
         except ValueError:
             # Error case
-            await turn_context.send_activity(MessageFactory.text(BotMessages.VALIDATION_ERRORS['house_number']))
+            await self._send_text(turn_context, BotMessages.VALIDATION_ERRORS['house_number'])
 
     async def _ask_for_house_addition(self, turn_context: TurnContext):
         # Processes the user's input for the house number
-        await turn_context.send_activity(MessageFactory.text(BotMessages.FIELD_PROMPTS['house_addition']))
+        await self._send_text(turn_context, BotMessages.FIELD_PROMPTS['house_addition'])
         await self.dialog_state_accessor.set(turn_context, DialogState.ASK_HOUSE_ADDITION)
 
     async def _handle_house_addition_input(self, turn_context: TurnContext, user_profile, user_input):
@@ -707,12 +740,12 @@ class RegistrationTextBot(ActivityHandler):
 
     async def _ask_for_postal(self, turn_context: TurnContext):
         # Asks the user for their postal code
-        await turn_context.send_activity(MessageFactory.text(BotMessages.FIELD_PROMPTS['postal']))
+        await self._send_text(turn_context, BotMessages.FIELD_PROMPTS['postal'])
         await self.dialog_state_accessor.set(turn_context, DialogState.ASK_POSTAL)
 
     async def _handle_postal_input(self, turn_context: TurnContext, user_profile, user_input):
         # Asks the user for their city
-        zip_entity = await self._extract_specific_entity(user_input, 'ZipCode')
+        zip_entity = await self._extract_specific_entity(turn_context, user_input, 'ZipCode')
         if zip_entity:
             validated_postal = DataValidator.validate_postal_code(zip_entity)
             if validated_postal:
@@ -742,16 +775,16 @@ class RegistrationTextBot(ActivityHandler):
             return
 
         # Error case
-        await turn_context.send_activity(MessageFactory.text(BotMessages.VALIDATION_ERRORS['postal']))
+        await self._send_text(turn_context, BotMessages.VALIDATION_ERRORS['postal'])
 
     async def _ask_for_city(self, turn_context: TurnContext):
         # asks the user of their city
-        await turn_context.send_activity(MessageFactory.text(BotMessages.FIELD_PROMPTS['city']))
+        await self._send_text(turn_context, BotMessages.FIELD_PROMPTS['city'])
         await self.dialog_state_accessor.set(turn_context, DialogState.ASK_CITY)
 
     async def _handle_city_input(self, turn_context: TurnContext, user_profile, user_input):
         # First: Try CLU for City entity
-        city_entity = await self._extract_specific_entity(user_input, 'City')
+        city_entity = await self._extract_specific_entity(turn_context, user_input, 'City')
         if city_entity and len(city_entity.strip()) >= 2 and re.match(r'^[a-zA-ZäöüÄÖÜß\s\-\.]+', city_entity.strip()):
             user_profile['city'] = city_entity.strip()
             await self.user_profile_accessor.set(turn_context, user_profile)
@@ -776,16 +809,16 @@ class RegistrationTextBot(ActivityHandler):
             return
 
         # Error case
-        await turn_context.send_activity(MessageFactory.text(BotMessages.VALIDATION_ERRORS['city']))
+        await self._send_text(turn_context, BotMessages.VALIDATION_ERRORS['city'])
 
     async def _ask_for_country(self, turn_context: TurnContext):
         # Asks the user for their country
-        await turn_context.send_activity(MessageFactory.text(BotMessages.FIELD_PROMPTS['country']))
+        await self._send_text(turn_context, BotMessages.FIELD_PROMPTS['country'])
         await self.dialog_state_accessor.set(turn_context, DialogState.ASK_COUNTRY)
 
     async def _handle_country_input(self, turn_context: TurnContext, user_profile, user_input):
         # First: Try CLU for countryName entity
-        country_entity = await self._extract_specific_entity(user_input, 'countryName')
+        country_entity = await self._extract_specific_entity(turn_context, user_input, 'countryName')
         if country_entity and len(country_entity.strip()) >= 2 and re.match(
                 r'^[a-zA-ZäöüÄÖÜß\s\-\.]+', country_entity.strip()):
             user_profile['country_name'] = country_entity.strip()
@@ -811,12 +844,24 @@ class RegistrationTextBot(ActivityHandler):
             return
 
         # Error case
-        await turn_context.send_activity(MessageFactory.text(BotMessages.VALIDATION_ERRORS['country']))
+        await self._send_text(turn_context, BotMessages.VALIDATION_ERRORS['country'])
 
     async def _confirm_field(self, turn_context: TurnContext, field_name: str, value: str, confirmation_state: str):
         # Sends a confirmation message for a field
-        confirmation_message = BotMessages.confirmation_prompt(field_name, value)
-        await turn_context.send_activity(MessageFactory.text(confirmation_message))
+        # other fields contained in the same answer are filled as well and confirmed together
+        user_profile = await self.user_profile_accessor.get(turn_context, lambda: {})
+        slot_state = await self.slot_filling_accessor.get(turn_context, lambda: {})
+        entities = await TurnEntities.for_turn(turn_context).all_entities(self.clu_service)
+        prefilled = await fill_slots(entities, user_profile, slot_state,
+                                     confirmation_state[len(DialogState.CONFIRM_PREFIX):],
+                                     self.customer_service.email_exists_in_db)
+        if prefilled:
+            await self.user_profile_accessor.set(turn_context, user_profile)
+            await self.slot_filling_accessor.set(turn_context, slot_state)
+            confirmation_message = BotMessages.confirmation_prompt_multiple([(field_name, value)] + prefilled)
+        else:
+            confirmation_message = BotMessages.confirmation_prompt(field_name, value)
+        await self._send_text(turn_context, confirmation_message)
         await self.dialog_state_accessor.set(turn_context, confirmation_state)
 
     async def _handle_confirmation(self, turn_context: TurnContext, user_profile, user_input, dialog_state):
@@ -827,9 +872,13 @@ class RegistrationTextBot(ActivityHandler):
 
         if confirmed:
             found_next_step = False
-            for conf_state, next_ask_func, _ in self.dialog_flow:
+            for index, (conf_state, _, _) in enumerate(self.dialog_flow):
                 if dialog_state == conf_state:
-                    await next_ask_func(turn_context)
+                    # steps of fields the confirmed answer already filled are skipped
+                    slot_state = await self.slot_filling_accessor.get(turn_context, lambda: {})
+                    next_step = next_open_step(self.dialog_flow, slot_state, index)
+                    await self.slot_filling_accessor.set(turn_context, slot_state)
+                    await self.dialog_flow[next_step][1](turn_context)
                     found_next_step = True
                     break
             if not found_next_step and dialog_state == DialogState.CONFIRM_PREFIX + "country":
@@ -838,22 +887,25 @@ class RegistrationTextBot(ActivityHandler):
             found_correction_step = False
             for conf_state, _, correction_ask_func in self.dialog_flow:
                 if dialog_state == conf_state:
-                    await turn_context.send_activity(MessageFactory.text(BotMessages.CONFIRMATION_REJECTED))
+                    slot_state = await self.slot_filling_accessor.get(turn_context, lambda: {})
+                    clear_prefilled(user_profile, slot_state)
+                    await self.user_profile_accessor.set(turn_context, user_profile)
+                    await self.slot_filling_accessor.set(turn_context, slot_state)
+                    await self._send_text(turn_context, BotMessages.CONFIRMATION_REJECTED)
                     await correction_ask_func(turn_context)
                     found_correction_step = True
                     break
             if not found_correction_step:
-                await turn_context.send_activity(
-                    MessageFactory.text("Entschuldigung, ich kann diesen Schritt nicht korrigieren."))
+                await self._send_text(turn_context, "Entschuldigung, ich kann diesen Schritt nicht korrigieren.")
                 await self.dialog_state_accessor.set(turn_context, DialogState.ERROR)
         else:
-            await turn_context.send_activity(MessageFactory.text(BotMessages.CONFIRMATION_UNCLEAR))
+            await self._send_text(turn_context, BotMessages.CONFIRMATION_UNCLEAR)
 
     async def _show_final_summary(self, turn_context: TurnContext):
          # Shows a summary of collected data and asks for final confirmation
         user_profile = await self.user_profile_accessor.get(turn_context, lambda: {})
         summary_message = BotMessages.final_summary(user_profile)
-        await turn_context.send_activity(MessageFactory.text(summary_message))
+        await self._send_text(turn_context, summary_message)
         await self.dialog_state_accessor.set(turn_context, DialogState.FINAL_CONFIRMATION)
 
     async def _handle_final_confirmation(self, turn_context: TurnContext, user_profile, user_input):
@@ -862,19 +914,20 @@ class RegistrationTextBot(ActivityHandler):
 
         if any(response in user_input_lower for response in FieldConfig.POSITIVE_RESPONSES):
             # Save data
-            await turn_context.send_activity(MessageFactory.text(BotMessages.SAVE_IN_PROGRESS))
+            await self._send_text(turn_context, BotMessages.SAVE_IN_PROGRESS)
 
             success = await self._save_customer_data(user_profile)
 
             if success:
-                await turn_context.send_activity(MessageFactory.text(BotMessages.REGISTRATION_SUCCESS))
+                await self._send_text(turn_context, BotMessages.REGISTRATION_SUCCESS)
                 await self.dialog_state_accessor.set(turn_context, DialogState.COMPLETED)
+                await self.slot_filling_accessor.delete(turn_context)
                 await self.user_profile_accessor.set(turn_context, {
                     'registration_completed': True,
                     'completion_timestamp': datetime.now().isoformat()
                 })
             else:
-                await turn_context.send_activity(MessageFactory.text(BotMessages.SAVE_ERROR))
+                await self._send_text(turn_context, BotMessages.SAVE_ERROR)
                 await self.dialog_state_accessor.set(turn_context, DialogState.ERROR)
 
         elif any(response in user_input_lower for response in FieldConfig.NEGATIVE_RESPONSES):
@@ -887,11 +940,11 @@ class RegistrationTextBot(ActivityHandler):
 
         else:
             # Unclear answer
-            await turn_context.send_activity(MessageFactory.text(BotMessages.FINAL_CONFIRMATION_UNCLEAR))
+            await self._send_text(turn_context, BotMessages.FINAL_CONFIRMATION_UNCLEAR)
 
     async def _start_correction_process(self, turn_context: TurnContext, user_profile):
          # Starts the correction process by displaying a list of fields the user can choose to modify
-        await turn_context.send_activity(MessageFactory.text(BotMessages.CORRECTION_OPTIONS))
+        await self._send_text(turn_context, BotMessages.CORRECTION_OPTIONS)
         await self.dialog_state_accessor.set(turn_context, "correction_selection")
 
     async def _save_customer_data(self, user_profile: dict):
@@ -913,7 +966,7 @@ class RegistrationTextBot(ActivityHandler):
 
         if any(keyword in user_input_lower for keyword in retry_keywords):
             # Try again - return to final confirmation
-            await turn_context.send_activity(MessageFactory.text(" **Versuche es nochmal...**"))
+            await self._send_text(turn_context, " **Versuche es nochmal...**")
             await self._show_final_summary(turn_context)
 
         elif any(keyword in user_input_lower for keyword in FieldConfig.RESTART_KEYWORDS):
@@ -922,4 +975,4 @@ class RegistrationTextBot(ActivityHandler):
 
         else:
             # Offer help
-            await turn_context.send_activity(MessageFactory.text(BotMessages.ERROR_HELP))
+            await self._send_text(turn_context, BotMessages.ERROR_HELP)
@@ -83,3 +83,11 @@ class CustomerContact(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
     email = models.EmailField()
     telephone = PhoneNumberField(region="DE")
+
+# Serialized conversation/user state of the bots (BOT_STATE_STORAGE=database)
+# e_tag is replaced on every write and used for optimistic concurrency between workers
+class BotStateItem(models.Model):
+    key = models.CharField(max_length=255, primary_key=True)
+    data = models.BinaryField()
+    e_tag = models.CharField(max_length=32)
+    updated_at = models.DateTimeField(auto_now=True)
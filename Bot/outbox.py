@@ -0,0 +1,37 @@
+from typing import List
+
+from botbuilder.core import TurnContext
+
+
+class TurnOutbox:
+    # Collects the replies a bot produces during one turn.
+    # The bots flush it once at the end of on_turn, so a turn that answers with several
+    # messages (e.g. correction confirmation + summary) needs a single connector call.
+
+    TURN_STATE_KEY = "TurnOutbox"
+    SEPARATOR = "\n\n"
+
+    def __init__(self):
+        self.messages: List[str] = []
+
+    @classmethod
+    def for_turn(cls, turn_context: TurnContext) -> "TurnOutbox":
+        # Returns the outbox of the current turn, creating it on first use
+        outbox = turn_context.turn_state.get(cls.TURN_STATE_KEY)
+        if outbox is None:
+            outbox = cls()
+            turn_context.turn_state[cls.TURN_STATE_KEY] = outbox
+        return outbox
+
+    def add(self, text: str):
+        if text:
+            self.messages.append(text)
+
+    def drain(self) -> List[str]:
+        # Returns all queued messages in order and empties the outbox
+        messages, self.messages = self.messages, []
+        return messages
+
+    @classmethod
+    def join(cls, messages: List[str]) -> str:
+        return cls.SEPARATOR.join(message.strip() for message in messages)
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+# Bundle of pre-rendered prompt audio, written by `manage.py build_prompt_audio`.
+# Layout: magic, length of the JSON index (uint32 little endian), the index, then the audio of
+# all prompts back to back. The index maps the TTS cache key of every prompt to its
+# (offset, length) in the file and records the version (hash of the content), output format
+# and voices. The bundle is memory mapped read-only, so the bot processes of a host share its
+# pages and an audio lookup is a dict lookup plus a slice.
+
+MAGIC = b"FGCCPRM1"
+_HEADER = struct.Struct("<8sI")
+
+
+def write_bundle(path: str, audio_by_key: Dict[str, bytes], output_format: str, voices: list) -> str:
+    # Writes the bundle atomically (running processes keep their mapping of the old file) and
+    # returns its version
+    content_hash = hashlib.sha256()
+    for key in sorted(audio_by_key):
+        content_hash.update(key.encode("ascii"))
+        content_hash.update(hashlib.sha256(audio_by_key[key]).digest())
+    version = content_hash.hexdigest()[:16]
+
+    entries = {}
+    offset = 0
+    for key in sorted(audio_by_key):
+        entries[key] = [offset, len(audio_by_key[key])]
+        offset += len(audio_by_key[key])
+
+    index = json.dumps({
+        "version": version,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "output_format": output_format,
+        "voices": voices,
+        "entries": entries,
+    }).encode("utf-8")
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(index)))
+        f.write(index)
+        for key in sorted(audio_by_key):
+            f.write(audio_by_key[key])
+    os.replace(temp_path, path)
+    return version
+
+
+class PromptAudioBundle:
+    # Read-only view of a bundle file
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, index_length = _HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a prompt audio bundle (or of an unsupported version)")
+            index = json.loads(self._map[_HEADER.size:_HEADER.size + index_length])
+        except Exception:
+            self._map.close()
+            raise
+
+        self.version = index["version"]
+        self.output_format = index["output_format"]
+        self.voices = index["voices"]
+        data_start = _HEADER.size + index_length
+        self._entries = {key: (data_start + offset, length) for key, (offset, length) in index["entries"].items()}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        offset, length = entry
+        return self._map[offset:offset + length]
+
+    def close(self):
+        self._map.close()
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "version": self.version,
+            "output_format": self.output_format,
+            "voices": self.voices,
+            "prompts": len(self._entries),
+            "bytes": len(self._map),
+        }
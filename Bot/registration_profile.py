@@ -0,0 +1,102 @@
+from datetime import date, datetime, timedelta
+from typing import Any, List
+
+# Wire layout of the "UserProfile" dict the bots keep in the conversation state.
+# The profile is encoded positionally (order below = wire order), so no key names are stored.
+# Keys not listed here (added by the bots in the future) are kept in an `extra` dict.
+# A value explicitly set to None in the dict is not preserved (the bots never store None).
+_FIELD_NAMES = (
+    "first_interaction", "consent_given", "consent_timestamp",
+    "gender", "gender_display", "title", "title_display",
+    "first_name", "last_name", "birth_date", "birth_date_display",
+    "email", "telephone", "telephone_display",
+    "street_name", "house_number", "house_number_addition", "house_addition_display",
+    "postal_code", "city", "country_name",
+    "correction_mode", "correction_return_to",
+    "registration_completed", "registration_cancelled", "completion_timestamp",
+)
+_FIELD_SET = frozenset(_FIELD_NAMES)
+
+# Bump when the wire layout changes (fields may only be appended to _FIELD_NAMES)
+PROFILE_SCHEMA_VERSION = 1
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def profile_dict_to_wire(data: dict) -> List[Any]:
+    # Positional list for msgpack: [extra, field 1, field 2, ...] without trailing unset fields.
+    # Dates and timestamps become integers.
+    values = [data.get(name) for name in _FIELD_NAMES]
+    for index, encode in _WIRE_ENCODERS.items():
+        if values[index] is not None:
+            values[index] = encode(values[index])
+    while values and values[-1] is None:
+        values.pop()
+
+    extra = None
+    if len(data) > len(_FIELD_NAMES) or not _FIELD_SET.issuperset(data):
+        extra = {key: value for key, value in data.items() if key not in _FIELD_SET} or None
+    return [extra] + values
+
+
+def profile_wire_to_dict(values: List[Any]) -> dict:
+    # Shorter lists (older schema, trimmed unset fields) leave the remaining fields unset
+    extra, *field_values = values
+    data = {
+        name: _decode_wire_value(index, value)
+        for index, (name, value) in enumerate(zip(_FIELD_NAMES, field_values))
+        if value is not None
+    }
+    if extra:
+        data.update(extra)
+    return data
+
+
+def _decode_wire_value(index: int, value):
+    if value is None:
+        return None
+    decode = _WIRE_DECODERS.get(index)
+    return decode(value) if decode else value
+
+
+def _encode_timestamp(value):
+    # ISO timestamp -> microseconds since epoch; anything not exactly reversible stays a string
+    try:
+        encoded = (datetime.fromisoformat(value) - _EPOCH) // _MICROSECOND
+    except (TypeError, ValueError):
+        return value
+    return encoded if _decode_timestamp(encoded) == value else value
+
+
+def _decode_timestamp(value):
+    if isinstance(value, int):
+        return (_EPOCH + value * _MICROSECOND).isoformat()
+    return value
+
+
+def _encode_date(value):
+    # YYYY-MM-DD -> day ordinal
+    try:
+        encoded = date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return value
+    return encoded.toordinal() if encoded.isoformat() == value else value
+
+
+def _decode_date(value):
+    if isinstance(value, int):
+        return date.fromordinal(value).isoformat()
+    return value
+
+
+_WIRE_ENCODERS = {
+    _FIELD_NAMES.index("consent_timestamp"): _encode_timestamp,
+    _FIELD_NAMES.index("completion_timestamp"): _encode_timestamp,
+    _FIELD_NAMES.index("birth_date"): _encode_date,
+}
+_WIRE_DECODERS = {
+    _FIELD_NAMES.index("consent_timestamp"): _decode_timestamp,
+    _FIELD_NAMES.index("completion_timestamp"): _decode_timestamp,
+    _FIELD_NAMES.index("birth_date"): _decode_date,
+}
@@ -0,0 +1,173 @@
+import re
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .dialogstate import DialogState
+from .text_messages import FieldConfig
+from .validators import DataValidator
+
+# Conversation state property with the slot filling bookkeeping of the running registration,
+# kept apart from the profile that ends up in the database. Its keys list the fields filled from
+# the answer of the current confirmation step and the prefilled fields the user already confirmed
+# (their ask/confirm steps are skipped). The bots delete it when a registration ends or restarts.
+SLOT_FILLING_PROPERTY = 'SlotFilling'
+PREFILLED_FIELDS_KEY = 'prefilled_fields'
+CONFIRMED_PREFILLED_KEY = 'prefilled_confirmed'
+
+
+def _entity_texts(entities: List[dict], category: str) -> List[str]:
+    return [entity.get('text', '').strip() for entity in entities
+            if (entity.get('category', '') or entity.get('name', '')) == category and entity.get('text', '').strip()]
+
+
+def _gender(value: str) -> Optional[Dict]:
+    option = FieldConfig.GENDER_OPTIONS.get(value.lower())
+    if option:
+        return {'gender': option[0], 'gender_display': option[1]}
+    return None
+
+
+def _title(value: str) -> Optional[Dict]:
+    if value in FieldConfig.VALID_TITLES:
+        return {'title': value, 'title_display': value}
+    return None
+
+
+def _name(key: str) -> Callable[[str], Optional[Dict]]:
+    def parse(value: str) -> Optional[Dict]:
+        return {key: value} if DataValidator.validate_name_part(value) else None
+    return parse
+
+
+def _birthdate(value: str) -> Optional[Dict]:
+    birthdate = DataValidator.validate_birthdate(value)
+    if birthdate:
+        return {'birth_date': birthdate.strftime('%Y-%m-%d'), 'birth_date_display': value}
+    return None
+
+
+def _email(value: str) -> Optional[Dict]:
+    return {'email': value.lower()} if DataValidator.validate_email(value) else None
+
+
+def _phone(value: str) -> Optional[Dict]:
+    phone_number = DataValidator.validate_phone(value)
+    if phone_number:
+        return {'telephone': phone_number.as_e164, 'telephone_display': value}
+    return None
+
+
+def _street(value: str) -> Optional[Dict]:
+    street_name = re.sub(r'\s*\d+\s?[a-zA-Z]?\s*$', '', value).strip()
+    if len(street_name) >= 3 and DataValidator.validate_street_name(street_name):
+        return {'street_name': street_name}
+    return None
+
+
+def _house_number(value: str) -> Optional[Dict]:
+    match = re.fullmatch(r'(\d+)\s?([a-zA-Z]?)', value)
+    if not match or int(match.group(1)) <= 0:
+        return None
+    slots = {'house_number': int(match.group(1))}
+    if match.group(2):
+        # "12b" also answers the house number addition
+        slots.update({'house_number_addition': match.group(2), 'house_addition_display': match.group(2)})
+    return slots
+
+
+def _postal(value: str) -> Optional[Dict]:
+    postal_code = DataValidator.validate_postal_code(value.replace(" ", ""))
+    return {'postal_code': postal_code} if postal_code else None
+
+
+def _city(value: str) -> Optional[Dict]:
+    return {'city': value} if DataValidator.validate_city_name(value) else None
+
+
+def _country(value: str) -> Optional[Dict]:
+    return {'country_name': value} if DataValidator.validate_country_name(value) else None
+
+
+# field -> (CLU entity category, parser returning the profile values or None)
+SLOT_PARSERS = {
+    'gender': ('Gender', _gender),
+    'title': ('titel', _title),
+    'birthdate': ('DateOfBirth', _birthdate),
+    'email': ('email', _email),
+    'phone': ('PhoneNumber', _phone),
+    'street': ('StreetHousenumber', _street),
+    'house_number': ('houseNumber', _house_number),
+    'postal': ('ZipCode', _postal),
+    'city': ('City', _city),
+    'country': ('countryName', _country),
+}
+
+
+def is_filled(user_profile: dict, field: str) -> bool:
+    return FieldConfig.FIELD_PROFILE_KEYS[field][0] in user_profile
+
+
+async def fill_slots(entities: List[dict], user_profile: dict, slot_state: dict, current_field: str,
+                     email_exists: Callable[[str], Awaitable[bool]] = None) -> List[Tuple[str, str]]:
+    # Fills the fields other than current_field that the same answer contains
+    # ("Max Mustermann, geboren 1.2.1990" answers first name, last name and birth date).
+    # Fields that are already set are left alone. Returns (display name, value) of every
+    # filled field and records them in slot_state under PREFILLED_FIELDS_KEY, so a rejected
+    # confirmation can take them back.
+    if not entities or user_profile.get('correction_mode') or current_field not in FieldConfig.FIELD_PROFILE_KEYS:
+        return []
+
+    candidates = {}
+    for field, (category, parse) in SLOT_PARSERS.items():
+        texts = _entity_texts(entities, category)
+        if texts:
+            candidates[field] = (texts[0], parse)
+
+    # names are only assigned if the answer has first and last name
+    names = _entity_texts(entities, 'Name')
+    if len(names) >= 2:
+        candidates['first_name'] = (names[0], _name('first_name'))
+        candidates['last_name'] = (names[-1], _name('last_name'))
+
+    filled = []
+    covered = {current_field}
+    for field in FieldConfig.FIELD_PROFILE_KEYS:
+        if field in covered or field not in candidates or is_filled(user_profile, field):
+            continue
+
+        value, parse = candidates[field]
+        slots = parse(value)
+        if not slots:
+            continue
+        if field == 'email' and email_exists and await email_exists(slots['email']):
+            # asked again in its own step, which explains why the address is rejected
+            continue
+
+        for slot_field, keys in FieldConfig.FIELD_PROFILE_KEYS.items():
+            if keys[0] in slots and slot_field not in covered and not is_filled(user_profile, slot_field):
+                covered.add(slot_field)
+                filled.append((slot_field, slots[keys[-1]]))
+        user_profile.update({key: slot for key, slot in slots.items() if key not in user_profile})
+
+    if filled:
+        slot_state[PREFILLED_FIELDS_KEY] = [field for field, _ in filled]
+    return [(FieldConfig.FIELD_DISPLAY_NAMES[field], str(value)) for field, value in filled]
+
+
+def clear_prefilled(user_profile: dict, slot_state: dict):
+    # Removes the fields filled together with a rejected confirmation
+    for field in slot_state.pop(PREFILLED_FIELDS_KEY, []):
+        for key in FieldConfig.FIELD_PROFILE_KEYS.get(field, ()):
+            user_profile.pop(key, None)
+
+
+def next_open_step(dialog_flow: List[tuple], slot_state: dict, index: int) -> int:
+    # Called when the confirmation of dialog_flow[index] was accepted. Returns the index of the
+    # step whose "next" function asks the first field that was not prefilled and confirmed.
+    # dialog_flow entries are (confirm state, ask next field, ask this field again).
+    confirmed = slot_state.get(CONFIRMED_PREFILLED_KEY, []) + slot_state.pop(PREFILLED_FIELDS_KEY, [])
+    if confirmed:
+        slot_state[CONFIRMED_PREFILLED_KEY] = confirmed
+
+    while index + 1 < len(dialog_flow) and dialog_flow[index + 1][0][len(DialogState.CONFIRM_PREFIX):] in confirmed:
+        index += 1
+    return index
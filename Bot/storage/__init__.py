@@ -0,0 +1,57 @@
+from typing import Optional
+
+from botbuilder.core import Storage
+
+from FCCSemesterAufgabe.settings import BOT_STATE_STORAGE, REDIS_URL, BOT_STATE_KEY_PREFIX, BOT_STATE_TTL_SECONDS, \
+    BOT_STATE_WRITE_BEHIND, BOT_STATE_CACHE_SIZE, BOT_STATE_FLUSH_INTERVAL, BOT_STATE_MAX_CONVERSATIONS, \
+    BOT_STATE_SWEEP_INTERVAL
+from .bounded_memory import BoundedMemoryStorage
+from .write_behind import WriteBehindStorage
+
+_state_storage: Optional[Storage] = None
+
+
+def create_state_storage(backend: str) -> Storage:
+    # Builds the storage backend configured by BOT_STATE_STORAGE
+    if backend == "memory":
+        return BoundedMemoryStorage(max_entries=BOT_STATE_MAX_CONVERSATIONS, ttl_seconds=BOT_STATE_TTL_SECONDS,
+                                    sweep_interval=BOT_STATE_SWEEP_INTERVAL)
+
+    if backend == "redis":
+        from .redis_storage import RedisStorage
+        return RedisStorage(REDIS_URL, key_prefix=BOT_STATE_KEY_PREFIX, ttl_seconds=BOT_STATE_TTL_SECONDS)
+
+    if backend == "database":
+        from .database_storage import DatabaseStorage
+        return DatabaseStorage()
+
+    raise ValueError(f"Unbekanntes BOT_STATE_STORAGE Backend: {backend}")
+
+
+def get_state_storage() -> Storage:
+    # Process-wide storage instance used by the ConversationState of the bots.
+    # External backends can get the write-behind cache in front (BOT_STATE_WRITE_BEHIND),
+    # the in-process store has nothing to save.
+    global _state_storage
+    if _state_storage is None:
+        storage = create_state_storage(BOT_STATE_STORAGE)
+        if BOT_STATE_WRITE_BEHIND and BOT_STATE_STORAGE != "memory":
+            storage = WriteBehindStorage(storage, max_entries=BOT_STATE_CACHE_SIZE,
+                                         flush_interval=BOT_STATE_FLUSH_INTERVAL)
+        _state_storage = storage
+    return _state_storage
+
+
+def state_storage_stats() -> dict:
+    # Metrics of the state storage for the bot metrics endpoint
+    if _state_storage is None:
+        return {}
+    if hasattr(_state_storage, "stats"):
+        return _state_storage.stats()
+    return {"backend": type(_state_storage).__name__}
+
+
+async def close_state_storage():
+    # Flushes pending writes and releases connections of the storage backend (called on ASGI shutdown)
+    if _state_storage is not None and hasattr(_state_storage, "close"):
+        await _state_storage.close()
@@ -0,0 +1,95 @@
+import asyncio
+import itertools
+from typing import Dict, List, Optional
+
+from botbuilder.core import Storage
+
+from Bot.cache import TTLCache
+from .serialization import dumps_state, loads_state
+
+
+class BoundedMemoryStorage(Storage):
+    # Drop-in replacement for MemoryStorage with bounded memory.
+    # Conversations that are idle for longer than ttl_seconds expire, and beyond max_entries the
+    # least recently used one is evicted. Items are kept serialized, which gives an exact
+    # "bytes held" gauge and copy-on-read semantics. A background task sweeps expired entries
+    # every sweep_interval seconds so abandoned conversations are released even if never read again.
+
+    def __init__(self, max_entries: int = 50000, ttl_seconds: float = 86400, sweep_interval: float = 60):
+        # key -> (e_tag, serialized state)
+        self._items = TTLCache(max_entries=max_entries, ttl=ttl_seconds,
+                               sizeof=lambda item: len(item[1]))
+        self.sweep_interval = sweep_interval
+        self._e_tags = itertools.count(1)
+        self._sweep_task: Optional[asyncio.Task] = None
+
+    async def read(self, keys: List[str]):
+        self._ensure_sweeper()
+        data = {}
+        for key in keys or []:
+            item = self._items.get(key)
+            if item is None:
+                continue
+            e_tag, payload = item
+            state = loads_state(payload)
+            state["e_tag"] = e_tag
+            data[key] = state
+        return data
+
+    async def write(self, changes: Dict[str, object]):
+        if changes is None:
+            raise Exception("Changes are required when writing")
+
+        self._ensure_sweeper()
+        for key, change in changes.items():
+            state = dict(change)
+            expected_etag = state.pop("e_tag", None)
+
+            current = self._items.get(key, count=False)
+            if current is not None and expected_etag not in (None, "*") and expected_etag != current[0]:
+                raise KeyError(
+                    "Etag conflict.\nOriginal: %s\r\nCurrent: %s" % (expected_etag, current[0])
+                )
+
+            e_tag = str(next(self._e_tags))
+            self._items.set(key, (e_tag, dumps_state(state)))
+
+            # the cached turn state now carries the stored version, so a second save
+            # within the same turn does not conflict with itself
+            change["e_tag"] = e_tag
+
+    async def delete(self, keys: List[str]):
+        for key in keys:
+            self._items.pop(key)
+
+    def _ensure_sweeper(self):
+        # started lazily because the storage is created before the event loop runs
+        if self._sweep_task is None or self._sweep_task.done():
+            self._sweep_task = asyncio.create_task(self._sweep_periodically())
+
+    async def _sweep_periodically(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            removed = self._items.sweep()
+            if removed:
+                print(f"🧹 State sweep: {removed} abandoned conversation(s) released, {len(self._items)} live")
+
+    async def close(self):
+        if len(self._items):
+            print(f"⚠️ {len(self._items)} conversation state item(s) only held in memory are lost on restart "
+                  f"(use BOT_STATE_STORAGE=redis or database to keep them)")
+        if self._sweep_task is not None:
+            self._sweep_task.cancel()
+            self._sweep_task = None
+
+    def stats(self) -> dict:
+        stats = self._items.stats()
+        return {
+            "backend": type(self).__name__,
+            "live_conversations": stats["entries"],
+            "bytes_held": stats["bytes"],
+            "max_entries": stats["max_entries"],
+            "idle_ttl_seconds": stats["ttl_seconds"],
+            "evictions": stats["evictions"],
+            "expirations": stats["expirations"],
+        }
@@ -0,0 +1,85 @@
+import uuid
+from typing import Dict, List
+
+from asgiref.sync import sync_to_async
+from botbuilder.core import Storage
+from django.db import IntegrityError, transaction
+from django.utils.timezone import now
+
+from Bot.models import BotStateItem
+from .serialization import dumps_state, loads_state
+
+
+class DatabaseStorage(Storage):
+    # botbuilder Storage on the Django ORM, shared by all workers and persistent across restarts.
+    # A turn costs one SELECT for all keys it reads and one conditional UPDATE per key it writes.
+    # The eTag is a random token that is replaced on every write; an UPDATE that matches no row
+    # because the eTag changed in the meantime raises KeyError like MemoryStorage does.
+
+    async def read(self, keys: List[str]):
+        if not keys:
+            return {}
+
+        def _read():
+            return list(BotStateItem.objects.filter(key__in=keys).values_list("key", "data", "e_tag"))
+
+        rows = await sync_to_async(_read, thread_sensitive=False)()
+
+        data = {}
+        for key, payload, e_tag in rows:
+            item = loads_state(bytes(payload))
+            item["e_tag"] = e_tag
+            data[key] = item
+        return data
+
+    async def write(self, changes: Dict[str, object]):
+        if changes is None:
+            raise Exception("Changes are required when writing")
+        if not changes:
+            return
+
+        def _write():
+            new_etags = {}
+            with transaction.atomic():
+                for key, change in changes.items():
+                    state = dict(change)
+                    expected_etag = state.pop("e_tag", None)
+                    new_etags[key] = self._write_item(key, dumps_state(state), expected_etag)
+            return new_etags
+
+        new_etags = await sync_to_async(_write, thread_sensitive=False)()
+
+        # the cached turn state now carries the stored version, so a second save
+        # within the same turn does not conflict with itself
+        for key, e_tag in new_etags.items():
+            changes[key]["e_tag"] = e_tag
+
+    def _write_item(self, key: str, payload: bytes, expected_etag) -> str:
+        new_etag = uuid.uuid4().hex
+        items = BotStateItem.objects.filter(key=key)
+
+        if expected_etag and expected_etag != "*":
+            # optimistic concurrency: only overwrite the version this turn has read
+            if items.filter(e_tag=expected_etag).update(data=payload, e_tag=new_etag, updated_at=now()):
+                return new_etag
+            if items.exists():
+                raise KeyError(f"Etag conflict for {key}. Original: {expected_etag}")
+        elif items.update(data=payload, e_tag=new_etag, updated_at=now()):
+            return new_etag
+
+        try:
+            with transaction.atomic():
+                BotStateItem.objects.create(key=key, data=payload, e_tag=new_etag)
+        except IntegrityError:
+            # another worker created the item first
+            raise KeyError(f"Etag conflict for {key}. Item was created concurrently")
+        return new_etag
+
+    async def delete(self, keys: List[str]):
+        if not keys:
+            return
+
+        def _delete():
+            BotStateItem.objects.filter(key__in=list(keys)).delete()
+
+        await sync_to_async(_delete, thread_sensitive=False)()
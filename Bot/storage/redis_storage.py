@@ -0,0 +1,87 @@
+from typing import Dict, List
+
+import redis.asyncio as redis
+from botbuilder.core import Storage
+
+from .serialization import dumps_state, loads_state
+
+
+# Conditional write: only succeeds if the stored eTag still matches the one the turn has read.
+# KEYS[1] = item key, ARGV[1] = expected eTag ("" = new item, "*" = overwrite),
+# ARGV[2] = serialized state, ARGV[3] = TTL in seconds (0 = no expiry)
+# Returns the new eTag or false on a conflict.
+CONDITIONAL_WRITE_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], 'etag')
+local expected = ARGV[1]
+if expected ~= '' and expected ~= '*' and current and current ~= expected then
+    return false
+end
+local etag = redis.call('HINCRBY', KEYS[1], 'etag', 1)
+redis.call('HSET', KEYS[1], 'data', ARGV[2])
+local ttl = tonumber(ARGV[3])
+if ttl > 0 then
+    redis.call('EXPIRE', KEYS[1], ttl)
+end
+return etag
+"""
+
+
+class RedisStorage(Storage):
+    # botbuilder Storage on a Redis-protocol server, shared by all uvicorn workers and replicas.
+    # Every item is a hash with the serialized state ("data") and a version counter ("etag").
+    # Writes are compare-and-set on the eTag, a conflict raises KeyError like MemoryStorage does.
+
+    def __init__(self, url: str, key_prefix: str = "botstate:", ttl_seconds: int = 0):
+        self.client = redis.Redis.from_url(url)
+        self.key_prefix = key_prefix
+        self.ttl_seconds = ttl_seconds
+        self._conditional_write = self.client.register_script(CONDITIONAL_WRITE_SCRIPT)
+
+    def _key(self, key: str) -> str:
+        return f"{self.key_prefix}{key}"
+
+    async def read(self, keys: List[str]):
+        data = {}
+        if not keys:
+            return data
+
+        # one round trip for all requested keys
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.hmget(self._key(key), "data", "etag")
+            results = await pipe.execute()
+
+        for key, (payload, etag) in zip(keys, results):
+            if payload is None:
+                continue
+            item = loads_state(payload)
+            item["e_tag"] = etag.decode()
+            data[key] = item
+
+        return data
+
+    async def write(self, changes: Dict[str, object]):
+        if changes is None:
+            raise Exception("Changes are required when writing")
+
+        for key, change in changes.items():
+            state = dict(change)
+            expected_etag = state.pop("e_tag", None) or ""
+
+            new_etag = await self._conditional_write(
+                keys=[self._key(key)],
+                args=[expected_etag, dumps_state(state), self.ttl_seconds],
+            )
+            if new_etag is None:
+                raise KeyError(f"Etag conflict for {key}. Original: {expected_etag}")
+
+            # the cached turn state now carries the stored version, so a second save
+            # within the same turn does not conflict with itself
+            change["e_tag"] = str(new_etag)
+
+    async def delete(self, keys: List[str]):
+        if keys:
+            await self.client.delete(*(self._key(key) for key in keys))
+
+    async def close(self):
+        await self.client.aclose()
@@ -0,0 +1,40 @@
+import msgpack
+import orjson
+
+from Bot.registration_profile import PROFILE_SCHEMA_VERSION, profile_dict_to_wire, profile_wire_to_dict
+
+# Properties of the conversation state with a dedicated slot in the encoding
+_PROFILE_KEY = "UserProfile"
+_DIALOG_STATE_KEY = "DialogState"
+
+
+def dumps_state(state: dict) -> bytes:
+    # Serializes a bot state dict (without its e_tag) for the storages.
+    # Layout: [schema version, dialog state, profile wire list, other properties], msgpack encoded;
+    # absent properties are stored as None.
+    profile = state.get(_PROFILE_KEY)
+    others = {key: value for key, value in state.items() if key not in (_PROFILE_KEY, _DIALOG_STATE_KEY)}
+
+    return msgpack.packb([
+        PROFILE_SCHEMA_VERSION,
+        state.get(_DIALOG_STATE_KEY),
+        profile_dict_to_wire(profile) if profile is not None else None,
+        others or None,
+    ], use_bin_type=True)
+
+
+def loads_state(payload: bytes) -> dict:
+    if payload[:1] == b"{":
+        # state written before the binary encoding was introduced
+        return orjson.loads(payload)
+
+    version, dialog_state, profile, others = msgpack.unpackb(payload, raw=False)
+    if version > PROFILE_SCHEMA_VERSION:
+        raise ValueError(f"Unbekannte State-Schema-Version: {version}")
+
+    state = dict(others) if others else {}
+    if dialog_state is not None:
+        state[_DIALOG_STATE_KEY] = dialog_state
+    if profile is not None:
+        state[_PROFILE_KEY] = profile_wire_to_dict(profile)
+    return state
@@ -0,0 +1,266 @@
+import asyncio
+import copy
+import traceback
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+
+from botbuilder.core import Storage
+
+from .serialization import dumps_state, loads_state
+
+
+def apply_change(base: dict, ours: dict, theirs: dict) -> dict:
+    # Applies the difference between base and ours onto theirs (a newer version of base).
+    # Dict properties (UserProfile) are merged per key, values changed on both sides keep ours.
+    merged = copy.deepcopy(theirs)
+    for name in base.keys() | ours.keys():
+        if name not in ours:
+            merged.pop(name, None)
+        elif base.get(name) == ours[name]:
+            continue
+        elif all(isinstance(value, dict) for value in (base.get(name), ours[name], theirs.get(name))):
+            merged[name] = apply_change(base[name], ours[name], theirs[name])
+        else:
+            merged[name] = copy.deepcopy(ours[name])
+    return merged
+
+
+class WriteBehindStorage(Storage):
+    # In-process LRU in front of the configured state storage.
+    # Reads are served from the cache, writes only mark a key dirty if its content actually
+    # changed. Dirty keys are flushed to the backend after flush_interval seconds, so several
+    # saves of the same conversation within that window end up as one backend write.
+    # Flushes are compare-and-set on the eTag of the version the cache last read or wrote, so a
+    # newer state written by another worker is never overwritten. On a conflict the newer version
+    # is read and the changes of this worker's turns are applied onto it (apply_change), like a
+    # turn would redo its work after botbuilder's save_changes raised; if the key keeps
+    # conflicting it stays dirty for the next flush. Cached entries are not revalidated on read,
+    # so this is only efficient when a conversation stays on one worker (affinity routing).
+
+    def __init__(self, backend: Storage, max_entries: int = 10000, flush_interval: float = 1.0,
+                 max_rebase_attempts: int = 3):
+        self.backend = backend
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.max_rebase_attempts = max_rebase_attempts
+
+        # key -> state without e_tag / serialized state as last seen by the backend
+        self._cache: "OrderedDict[str, dict]" = OrderedDict()
+        self._persisted: Dict[str, bytes] = {}
+        # key -> eTag of the backend version the cached state is based on (None = not stored yet)
+        self._etags: Dict[str, Optional[str]] = {}
+        self._dirty: Set[str] = set()
+
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._closed = False
+
+        # metrics
+        self._hits = 0
+        self._misses = 0
+        self._writes_received = 0
+        self._writes_skipped = 0
+        self._backend_writes = 0
+        self._flush_errors = 0
+        self._conflicts = 0
+        self._rebased = 0
+
+    async def read(self, keys: List[str]):
+        data = {}
+        if not keys:
+            return data
+
+        missing = []
+        for key in keys:
+            state = self._cache.get(key)
+            if state is None:
+                missing.append(key)
+                continue
+            self._cache.move_to_end(key)
+            self._hits += 1
+            data[key] = copy.deepcopy(state)
+
+        if missing:
+            self._misses += len(missing)
+            loaded = await self.backend.read(missing)
+            for key, item in loaded.items():
+                state = dict(item)
+                e_tag = state.pop("e_tag", None)
+                # a write during the await wins over the loaded value
+                if key not in self._cache:
+                    self._etags[key] = e_tag
+                    self._store(key, state, dumps_state(state))
+                data[key] = copy.deepcopy(self._cache.get(key, state))
+
+        return data
+
+    async def write(self, changes: Dict[str, object]):
+        if changes is None:
+            raise Exception("Changes are required when writing")
+
+        for key, change in changes.items():
+            self._writes_received += 1
+            state = dict(change)
+            state.pop("e_tag", None)
+            payload = dumps_state(state)
+
+            if self._persisted.get(key) == payload and key not in self._dirty:
+                # same content as in the backend, e.g. a save without changes
+                self._writes_skipped += 1
+                self._cache[key] = copy.deepcopy(state)
+                self._cache.move_to_end(key)
+                continue
+
+            self._store(key, copy.deepcopy(state), None)
+            self._dirty.add(key)
+
+        self._schedule_flush()
+
+    async def delete(self, keys: List[str]):
+        for key in keys:
+            self._forget(key)
+        await self.backend.delete(list(keys))
+
+    def _forget(self, key: str):
+        self._cache.pop(key, None)
+        self._persisted.pop(key, None)
+        self._etags.pop(key, None)
+        self._dirty.discard(key)
+
+    def _store(self, key: str, state: dict, persisted: Optional[bytes]):
+        self._cache[key] = state
+        self._cache.move_to_end(key)
+        if persisted is not None:
+            self._persisted[key] = persisted
+        self._evict()
+
+    def _evict(self):
+        # drops least recently used entries; dirty ones stay until they have been flushed
+        overflow = len(self._cache) - self.max_entries
+        if overflow <= 0:
+            return
+
+        for key in list(self._cache.keys()):
+            if overflow <= 0:
+                break
+            if key in self._dirty:
+                continue
+            self._forget(key)
+            overflow -= 1
+
+        if overflow > 0:
+            # only dirty entries left, write them out now so they can be evicted next time
+            self._schedule_flush(delay=0)
+
+    def _schedule_flush(self, delay: float = None):
+        if self._closed or not self._dirty or (self._flush_task is not None and not self._flush_task.done()):
+            return
+        self._flush_task = asyncio.create_task(
+            self._flush_later(self.flush_interval if delay is None else delay))
+
+    async def _flush_later(self, delay: float):
+        await asyncio.sleep(delay)
+        try:
+            await self.flush()
+        except Exception as e:
+            self._flush_errors += 1
+            print(f"❌ State write-behind flush failed: {e}")
+            traceback.print_exception(e)
+        finally:
+            self._flush_task = None
+            # keys written during the flush or left over after an error
+            self._schedule_flush()
+
+    async def flush(self):
+        # Writes all dirty keys to the backend, each conditional on its last known eTag
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+
+            keys = list(self._dirty)
+            self._dirty.clear()
+            for index, key in enumerate(keys):
+                state = self._cache.get(key)
+                if state is None:
+                    continue
+                change = dict(copy.deepcopy(state), e_tag=self._etags.get(key))
+                payload = dumps_state(state)
+
+                try:
+                    # one key per write, so a conflict only affects its own conversation
+                    await self.backend.write({key: change})
+                except KeyError as e:
+                    # another worker stored a newer version
+                    self._conflicts += 1
+                    print(f"⚠️ State write-behind conflict, applying the cached changes to the newer version: {e}")
+                    try:
+                        rebased = await self._rebase(key, state)
+                    except Exception:
+                        self._dirty.update(key for key in keys[index:] if key in self._cache)
+                        raise
+                    if rebased is None:
+                        # still conflicting, the next flush tries again
+                        self._dirty.add(key)
+                        continue
+                    state, change = rebased
+                    payload = dumps_state(state)
+                except Exception:
+                    # keep the unwritten keys dirty unless they have been deleted in the meantime
+                    self._dirty.update(key for key in keys[index:] if key in self._cache)
+                    raise
+
+                self._backend_writes += 1
+                if key in self._cache:
+                    # the backends put the new eTag into the written change
+                    self._etags[key] = change.get("e_tag")
+                    self._persisted[key] = payload
+
+    async def _rebase(self, key: str, state: dict):
+        # Reads the newer version of key, applies the changes of the cached state (relative to the
+        # version it was based on) onto it and writes the result conditionally.
+        # Returns (written state, written change) or None if the key still conflicts.
+        base = loads_state(self._persisted[key]) if key in self._persisted else {}
+        for _ in range(self.max_rebase_attempts):
+            current = dict((await self.backend.read([key])).get(key) or {})
+            e_tag = current.pop("e_tag", None)
+            merged = apply_change(base, state, current)
+            change = dict(copy.deepcopy(merged), e_tag=e_tag)
+            try:
+                await self.backend.write({key: change})
+            except KeyError:
+                continue
+
+            self._rebased += 1
+            cached = self._cache.get(key)
+            if cached is state:
+                self._cache[key] = merged
+            elif cached is not None:
+                # a turn wrote again during the flush, its changes go onto the merged version too
+                self._cache[key] = apply_change(state, cached, merged)
+            return merged, change
+        return None
+
+    async def close(self):
+        # Flushes pending writes and closes the backend (ASGI shutdown)
+        self._closed = True
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+        if hasattr(self.backend, "close"):
+            await self.backend.close()
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self._cache),
+            "max_entries": self.max_entries,
+            "dirty": len(self._dirty),
+            "hits": self._hits,
+            "misses": self._misses,
+            "writes_received": self._writes_received,
+            "writes_skipped": self._writes_skipped,
+            "backend_writes": self._backend_writes,
+            "flush_errors": self._flush_errors,
+            "conflicts": self._conflicts,
+            "rebased": self._rebased,
+        }
@@ -1,23 +1,29 @@
-import aiohttp
 import base64
 import re
 from datetime import datetime
 from typing import Optional, Dict, Any, List
+from asgiref.sync import sync_to_async
 from injector import inject
 
-from botbuilder.core import ActivityHandler, MessageFactory, TurnContext, ConversationState, UserState
+from botbuilder.core import ActivityHandler, MessageFactory, TurnContext, ConversationState
 from botbuilder.schema import ChannelAccount, Attachment
 
 from .audio_converter import FFmpegAudioConverter
+from .outbox import TurnOutbox
+from .deadline import TurnDeadline, DeadlineExceeded
+from .extraction_policy import extraction_policy
+from .turn_entities import TurnEntities
+from .slot_filling import SLOT_FILLING_PROPERTY, fill_slots, clear_prefilled, next_open_step
+from .http_client import SharedHttpClient, http_client as shared_http_client
 from .dialogstate import DialogState
 from .validators import DataValidator
 from .services import CustomerService
-from .text_speech_bot import SpeechBotMessages
+from .text_speech_bot import SpeechBotMessages, markdown_to_speech, is_static_prompt
 from .text_messages import FieldConfig
-from .azure_service.speech_service import AzureSpeechService
-from .azure_service.luis_service import AzureCLUService
+from .azure_service.speech_service import AzureSpeechService, SpeechCancellation
+from .local_entity_extractor import create_entity_extractor
 from .azure_service.storage_service import BlobService
-from FCCSemesterAufgabe.settings import isDocker
+from FCCSemesterAufgabe.settings import isDocker, BOT_TEXT_FALLBACK_RESERVE_SECONDS, PROMPT_AUDIO_BUNDLE
 
 
 class RegistrationAudioBot(ActivityHandler):
@@ -27,16 +33,18 @@ class RegistrationAudioBot(ActivityHandler):
     """
 
     @inject
-    def __init__(self, conversation_state: ConversationState, user_state: UserState, customer_service: CustomerService):
+    def __init__(self, conversation_state: ConversationState, customer_service: CustomerService,
+                 http_client: SharedHttpClient = None):
         # Core services
         self.customer_service = customer_service
+        self.http_client = http_client or shared_http_client
         self.conversation_state = conversation_state
-        self.user_state = user_state
         self.audio_converter = FFmpegAudioConverter()
 
         # State accessors
         self.user_profile_accessor = self.conversation_state.create_property("UserProfile")
         self.dialog_state_accessor = self.conversation_state.create_property("DialogState")
+        self.slot_filling_accessor = self.conversation_state.create_property(SLOT_FILLING_PROPERTY)
 
         # Initialize Azure services
         if isDocker:
@@ -49,18 +57,16 @@ class RegistrationAudioBot(ActivityHandler):
             try:
                 self.audio_blob_uploader = BlobService()
                 self.speech_service = AzureSpeechService()
-                test_audio = self.speech_service.text_to_speech_bytes("Test")
-                if test_audio and len(test_audio) > 0:
-                    print(f"✅ Speech Service initialized: {len(test_audio)} bytes")
-                else:
-                    raise Exception("Speech Service TTS test failed")
+                # vorgerenderte Prompts (manage.py build_prompt_audio) statt eines TTS-Testaufrufs
+                prompts = self.speech_service.audio_cache.load_bundle(PROMPT_AUDIO_BUNDLE)
+                print(f"✅ Speech Service initialized: {prompts} vorgerenderte Prompts")
             except Exception as e:
                 print(f"❌ Speech Service initialization failed: {e}")
                 self.speech_service = None
 
             # Initialize CLU Service
             try:
-                self.clu_service = AzureCLUService()
+                self.clu_service = create_entity_extractor(self.http_client)
                 print("✅ CLU Service initialized")
             except Exception as e:
                 print(f"❌ CLU Service initialization failed: {e}")
@@ -162,6 +168,14 @@ class RegistrationAudioBot(ActivityHandler):
             # Save state
             await self._save_state(turn_context)
 
+        except DeadlineExceeded as e:
+            # the reply of this turn is sent as text, the remaining budget is too small for TTS
+            print(f"⏱️ {e} - Antwort als Text")
+            await self._send_audio_response(turn_context,
+                                            "Die Verarbeitung hat leider zu lange gedauert. Bitte senden Sie Ihre Sprachnachricht erneut.")
+            # bereits in diesem Turn übernommene Angaben nicht verwerfen
+            await self._save_state(turn_context)
+
         except Exception as e:
             print(f"❌ Error in on_message_activity: {e}")
             await self._send_audio_response(turn_context,
@@ -188,6 +202,7 @@ class RegistrationAudioBot(ActivityHandler):
         print(" /start command received")
 
         # Reset everything and start fresh
+        await self.slot_filling_accessor.delete(turn_context)
         await self.user_profile_accessor.set(turn_context, {})
         await self.dialog_state_accessor.set(turn_context, DialogState.GREETING)
 
@@ -226,15 +241,19 @@ class RegistrationAudioBot(ActivityHandler):
 
     async def _process_audio_input(self, turn_context: TurnContext, attachment: Attachment) -> Optional[str]:
         """Process audio attachment with STT and CLU"""
+        # every stage only gets what is left of the turn budget, minus the time kept for the reply
+        deadline = TurnDeadline.current()
+        reserve = BOT_TEXT_FALLBACK_RESERVE_SECONDS
         try:
             # Download audio
-            audio_bytes = await self._download_audio(attachment)
+            audio_bytes = await deadline.run("download", self._download_audio(attachment), reserve=reserve)
             if not audio_bytes:
                 await self._send_audio_response(turn_context, "Audio konnte nicht geladen werden.")
                 return None
 
             # Convert to compatible format
-            processed_audio = await self._convert_audio(audio_bytes, attachment.content_type)
+            processed_audio = await deadline.run("ffmpeg", self._convert_audio(audio_bytes, attachment.content_type),
+                                                 reserve=reserve)
             if not processed_audio:
                 await self._send_audio_response(turn_context,
                                                 "Das Audio-Format konnte nicht verarbeitet werden.")
@@ -245,7 +264,13 @@ class RegistrationAudioBot(ActivityHandler):
                 await self._send_audio_response(turn_context, "Spracherkennung ist nicht verfügbar.")
                 return None
 
-            stt_result = self.speech_service.speech_to_text_from_bytes(processed_audio)
+            # The Speech SDK blocks, so keep it off the event loop; on expiry its connection is closed
+            cancellation = SpeechCancellation()
+            stt_result = await deadline.run(
+                "stt",
+                sync_to_async(self.speech_service.speech_to_text_from_bytes,
+                              thread_sensitive=False)(processed_audio, cancellation=cancellation),
+                reserve=reserve, on_cancel=cancellation.cancel)
             print(f"🎤 STT Result: {stt_result}")
 
             if stt_result.get('success'):
@@ -257,6 +282,8 @@ class RegistrationAudioBot(ActivityHandler):
                 await self._handle_stt_error(turn_context, error_msg)
                 return None
 
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"❌ Audio processing error: {e}")
             await self._send_audio_response(turn_context, "Fehler beim Verarbeiten der Sprache.")
@@ -265,17 +292,17 @@ class RegistrationAudioBot(ActivityHandler):
     async def _download_audio(self, attachment: Attachment) -> Optional[bytes]:
         """Download audio from attachment"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(attachment.content_url) as response:
-                    if response.status == 200:
-                        audio_bytes = await response.read()
-                        if len(audio_bytes) < 100:
-                            print(f"❌ Audio file too small: {len(audio_bytes)} bytes")
-                            return None
-                        return audio_bytes
-                    else:
-                        print(f"❌ HTTP error: {response.status}")
+            session = self.http_client.get_session()
+            async with session.get(attachment.content_url) as response:
+                if response.status == 200:
+                    audio_bytes = await response.read()
+                    if len(audio_bytes) < 100:
+                        print(f"❌ Audio file too small: {len(audio_bytes)} bytes")
                         return None
+                    return audio_bytes
+                else:
+                    print(f"❌ HTTP error: {response.status}")
+                    return None
         except Exception as e:
             print(f"❌ Audio download error: {e}")
             return None
@@ -305,14 +332,24 @@ class RegistrationAudioBot(ActivityHandler):
 
     # === CLU INTEGRATION ===
 
-    async def _extract_entity_with_clu(self, user_input: str, entity_type: str) -> Optional[str]:
-        """Extract specific entity using CLU service"""
+    async def _extract_entity_with_clu(self, turn_context: TurnContext, user_input: str,
+                                       entity_type: str) -> Optional[str]:
+        """Extract specific entity, locally if the input is unambiguous, otherwise with the CLU service"""
+        dialog_state = await self.dialog_state_accessor.get(turn_context, lambda: DialogState.GREETING)
+        extraction_policy.set_dialog_state(dialog_state)
+        local_entity = extraction_policy.parse_entity(entity_type, user_input)
+        if local_entity is not None:
+            extraction_policy.record_local()
+            TurnEntities.for_turn(turn_context).answered_locally(user_input)
+            print(f"⚡ {entity_type} lokal erkannt: '{local_entity}' (ohne CLU)")
+            return local_entity
+
         if not self.clu_service:
             print("⚠️ CLU service not available")
             return None
 
         try:
-            entities = await self.clu_service.get_entities(text=user_input)
+            entities = await TurnEntities.for_turn(turn_context).get(self.clu_service, user_input, entity_type)
             print(f"🔍 CLU entities for {entity_type}: {entities}")
 
             for entity in entities:
@@ -330,14 +367,23 @@ class RegistrationAudioBot(ActivityHandler):
             print(f"❌ CLU extraction error for {entity_type}: {e}")
             return None
 
-    async def _extract_confirmation_with_clu(self, user_input: str) -> Optional[str]:
-        """Extract confirmation response using CLU (yes/no)"""
+    async def _extract_confirmation_with_clu(self, turn_context: TurnContext, user_input: str) -> Optional[str]:
+        """Extract confirmation response (yes/no), locally for plain keyword answers, otherwise with CLU"""
+        dialog_state = await self.dialog_state_accessor.get(turn_context, lambda: DialogState.GREETING)
+        extraction_policy.set_dialog_state(dialog_state)
+        local_answer = extraction_policy.parse_confirmation(user_input)
+        if local_answer is not None:
+            extraction_policy.record_local()
+            print(f"⚡ Bestätigung lokal erkannt: '{local_answer}' (ohne CLU)")
+            return local_answer
+
         if not self.clu_service:
             print("⚠️ CLU service not available for confirmation")
             return None
 
         try:
-            entities = await self.clu_service.get_entities(text=user_input)
+            entities = await TurnEntities.for_turn(turn_context).get(self.clu_service, user_input,
+                                                                     'ConfirmationAnswer')
             print(f"🔍 CLU entities for confirmation: {entities}")
 
             # Look for ConfirmationAnswer entity
@@ -359,23 +405,39 @@ class RegistrationAudioBot(ActivityHandler):
 
     # === AUDIO OUTPUT ===
 
-    def _convert_markdown_to_speech(self, text: str) -> str:
-        """Konvertiert Markdown zu sprachfreundlichem Text"""
-        speech_text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)  # **bold** -> bold
-        speech_text = re.sub(r'\*([^*]+)\*', r'\1', speech_text)  # *italic* -> italic
-        speech_text = re.sub(r'•\s*', '', speech_text)  # Bullet points entfernen
-        speech_text = re.sub(r'\n+', ' ', speech_text)  # Zeilenumbrüche zu Leerzeichen
-        speech_text = re.sub(r'\s+', ' ', speech_text)  # Mehrfache Leerzeichen entfernen
-        return speech_text.strip()
+    async def on_turn(self, turn_context: TurnContext):
+        """Sammelt alle Antworten des Turns und sendet sie am Ende als eine Nachricht"""
+        try:
+            await super().on_turn(turn_context)
+        finally:
+            await self._flush_outbox(turn_context)
 
     async def _send_audio_response(self, turn_context: TurnContext, text: str):
         """
-        Sendet Audio-Attachment wenn möglich, sonst kompletten Text.
-        Versucht, Audio direkt als Attachment zu senden (limitiert auf 50 MB),
-        und fällt auf Text zurück, wenn Audio nicht gesendet werden kann.
+        Legt die Antwort in die Outbox des aktuellen Turns.
+        Alle Antworten eines Turns werden in _flush_outbox als eine Audio-Nachricht gesendet.
+        """
+        TurnOutbox.for_turn(turn_context).add(text)
+
+    async def _send_audio_and_text_response(self, turn_context: TurnContext, text: str):
+        """Antwort für Nachrichten, die auch ohne Sprachnachricht verständlich sein müssen"""
+        await self._send_audio_response(turn_context, text)
+
+    async def _flush_outbox(self, turn_context: TurnContext):
+        """Sendet die gesammelten Antworten des Turns"""
+        texts = TurnOutbox.for_turn(turn_context).drain()
+        if texts:
+            await self._deliver_audio_response(turn_context, texts)
+
+    async def _deliver_audio_response(self, turn_context: TurnContext, texts: List[str]):
+        """
+        Sendet alle Antworten eines Turns als ein Audio-Attachment wenn möglich, sonst als einen Text.
+        Jede Antwort wird einzeln synthetisiert und die WAV-Segmente werden ohne Neukodierung
+        aneinandergehängt (limitiert auf 50 MB). Fällt auf Text zurück, wenn Audio nicht gesendet werden kann.
         """
+        text = TurnOutbox.join(texts)
         try:
-            print(f" Versuche Audio für: '{text[:100]}{'...' if len(text) > 100 else ''}'")
+            print(f" Versuche Audio für {len(texts)} Antwort(en): '{text[:100]}{'...' if len(text) > 100 else ''}'")
 
             # Extrahieren der recipient_chat_id einmal aus der eingehenden Aktivität
             recipient_chat_id = turn_context.activity.from_.id if turn_context.activity.from_ else None
@@ -390,18 +452,38 @@ class RegistrationAudioBot(ActivityHandler):
                 await self._send_complete_text(turn_context, text)
                 return
 
-            # Text für Sprache optimieren
-            speech_text = self._convert_markdown_to_speech(text)
-
-            # TTS generieren
-            audio_bytes = self.speech_service.text_to_speech_bytes(speech_text)
+            # TTS bekommt nur das Restbudget des Turns, die Reserve bleibt für den Text-Fallback
+            deadline = TurnDeadline.current()
+            segments = []
+            for part in texts:
+                # Text für Sprache optimieren
+                speech_text = markdown_to_speech(part)
+
+                # Nur statische Prompts (ohne Nutzerdaten) kommen ohne Thread-Wechsel aus dem Audio-Cache
+                cacheable = is_static_prompt(speech_text)
+                segment = self.speech_service.cached_audio(speech_text) if cacheable else None
+                if segment is None:
+                    # TTS generieren (blockierender SDK-Aufruf, daher im Thread)
+                    cancellation = SpeechCancellation()
+                    segment = await deadline.run(
+                        "tts",
+                        sync_to_async(self.speech_service.text_to_speech_bytes,
+                                      thread_sensitive=False)(speech_text, cancellation=cancellation,
+                                                              cacheable=cacheable),
+                        reserve=BOT_TEXT_FALLBACK_RESERVE_SECONDS, on_cancel=cancellation.cancel)
+                if not segment:
+                    print("❌ TTS fehlgeschlagen - sende kompletten Text")
+                    await self._send_complete_text(turn_context, text)
+                    return
+                segments.append(segment)
 
-            if not audio_bytes or len(audio_bytes) == 0:
-                print("❌ TTS fehlgeschlagen - sende kompletten Text")
+            audio_bytes = segments[0] if len(segments) == 1 else FFmpegAudioConverter.concat_wav(segments)
+            if not audio_bytes:
+                print("❌ Audio-Segmente konnten nicht zusammengefügt werden - sende kompletten Text")
                 await self._send_complete_text(turn_context, text)
                 return
 
-            print(f"🎵 Audio generiert: {len(audio_bytes)} bytes")
+            print(f"🎵 Audio generiert: {len(audio_bytes)} bytes ({len(segments)} Segment(e))")
 
             # Direkter Versand an Telegram (limitiert auf 50 MB)
             success = await self._try_send_audio_attachment(turn_context, audio_bytes, recipient_chat_id)
@@ -414,6 +496,10 @@ class RegistrationAudioBot(ActivityHandler):
             # Fallback: Kompletten Text senden
             await self._send_complete_text(turn_context, text)
 
+        except DeadlineExceeded as e:
+            print(f"⏱️ {e} - sende kompletten Text")
+            await self._send_complete_text(turn_context, text)
+
         except Exception as e:
             print(f"❌ Audio-Response Fehler: {e}")
             await self._send_complete_text(turn_context, text)
@@ -467,7 +553,7 @@ class RegistrationAudioBot(ActivityHandler):
         """
         try:
             # Füge Audio-Symbol hinzu um zu zeigen dass es ein Audio-Bot ist
-            complete_message = self._convert_markdown_to_speech(text)
+            complete_message = markdown_to_speech(text)
 
             # Füge ein Hinweis-Emoji hinzu, da keine Sprachausgabe möglich war
             if turn_context.activity.channel_id == "telegram":
@@ -496,7 +582,7 @@ class RegistrationAudioBot(ActivityHandler):
         """Handle consent with CLU integration"""
 
         # Try CLU confirmation extraction first
-        clu_confirmation = await self._extract_confirmation_with_clu(user_input)
+        clu_confirmation = await self._extract_confirmation_with_clu(turn_context, user_input)
 
         consent_given = False
         consent_denied = False
@@ -523,6 +609,7 @@ class RegistrationAudioBot(ActivityHandler):
         elif consent_denied:
             await self._send_audio_response(turn_context, SpeechBotMessages.CONSENT_DENIED)
             await self.dialog_state_accessor.set(turn_context, DialogState.COMPLETED)
+            await self.slot_filling_accessor.delete(turn_context)
             await self.user_profile_accessor.set(turn_context, {
                 'consent_given': False,
                 'consent_timestamp': datetime.now().isoformat(),
@@ -539,7 +626,7 @@ class RegistrationAudioBot(ActivityHandler):
     async def _handle_gender_input(self, turn_context: TurnContext, user_profile, user_input):
         """Handle gender input with CLU"""
         # Try CLU extraction first
-        gender_entity = await self._extract_entity_with_clu(user_input, 'Gender')
+        gender_entity = await self._extract_entity_with_clu(turn_context, user_input, 'Gender')
 
         # Use CLU result or fallback to direct matching
         input_to_check = gender_entity.lower() if gender_entity else user_input.lower()
@@ -567,7 +654,7 @@ class RegistrationAudioBot(ActivityHandler):
     async def _handle_title_input(self, turn_context: TurnContext, user_profile, user_input):
         """Handle title input with CLU"""
         # Try CLU extraction
-        title_entity = await self._extract_entity_with_clu(user_input, 'titel')
+        title_entity = await self._extract_entity_with_clu(turn_context, user_input, 'titel')
 
         user_input_lower = (title_entity or user_input).strip().lower()
 
@@ -605,7 +692,7 @@ class RegistrationAudioBot(ActivityHandler):
     async def _handle_first_name_input(self, turn_context: TurnContext, user_profile, user_input):
         """Handle first name input with CLU"""
         # Try CLU extraction first
-        name_entity = await self._extract_entity_with_clu(user_input, 'Name')
+        name_entity = await self._extract_entity_with_clu(turn_context, user_input, 'Name')
 
         name_to_validate = name_entity if name_entity and DataValidator.validate_name_part(name_entity) else user_input
 
@@ -630,7 +717,7 @@ class RegistrationAudioBot(ActivityHandler):
     async def _handle_last_name_input(self, turn_context: TurnContext, user_profile, user_input):
         """Handle last name input with CLU"""
         # Try CLU extraction first
-        name_entity = await self._extract_entity_with_clu(user_input, 'Name')
+        name_entity = await self._extract_entity_with_clu(turn_context, user_input, 'Name')
 
         name_to_validate = name_entity if name_entity and DataValidator.validate_name_part(name_entity) else user_input
 
@@ -655,7 +742,7 @@ class RegistrationAudioBot(ActivityHandler):
     async def _handle_birthdate_input(self, turn_context: TurnContext, user_profile, user_input):
         """Handle birthdate input with CLU"""
         # Try CLU extraction first
-        date_entity = await self._extract_entity_with_clu(user_input, 'DateOfBirth')
+        date_entity = await self._extract_entity_with_clu(turn_context, user_input, 'DateOfBirth')
 
         # Try validation with CLU result first, then fallback to original input
         birthdate = None
@@ -693,7 +780,7 @@ class RegistrationAudioBot(ActivityHandler):
     async def _handle_email_input(self, turn_context: TurnContext, user_profile, user_input):
         """Handle email input with CLU"""
         # Try CLU extraction first
-        email_entity = await self._extract_entity_with_clu(user_input, 'email')
+        email_entity = await self._extract_entity_with_clu(turn_context, user_input, 'email')
 
         # Try validation with CLU result first, then fallback
         email_to_validate = email_entity if email_entity and DataValidator.validate_email(email_entity) else user_input
@@ -725,7 +812,7 @@ class RegistrationAudioBot(ActivityHandler):
     async def _handle_phone_input(self, turn_context: TurnContext, user_profile, user_input):
         """Handle phone input with CLU"""
         # Try CLU extraction first
-        phone_entity = await self._extract_entity_with_clu(user_input, 'PhoneNumber')
+        phone_entity = await self._extract_entity_with_clu(turn_context, user_input, 'PhoneNumber')
 
         phone_to_validate = phone_entity or user_input
         phone_number_obj = DataValidator.validate_phone(phone_to_validate)
@@ -752,7 +839,7 @@ class RegistrationAudioBot(ActivityHandler):
     async def _handle_street_input(self, turn_context: TurnContext, user_profile, user_input):
         """Handle street input with CLU"""
         # Try CLU extraction first
-        street_entity = await self._extract_entity_with_clu(user_input, 'StreetHousenumber')
+        street_entity = await self._extract_entity_with_clu(turn_context, user_input, 'StreetHousenumber')
 
         if street_entity:
             # Extract street name from StreetHousenumber entity
@@ -806,7 +893,7 @@ class RegistrationAudioBot(ActivityHandler):
     async def _handle_house_number_input(self, turn_context: TurnContext, user_profile, user_input):
         """Handle house number input with CLU"""
         # Try CLU extraction first
-        house_entity = await self._extract_entity_with_clu(user_input, 'houseNumber')
+        house_entity = await self._extract_entity_with_clu(turn_context, user_input, 'houseNumber')
 
         house_number = None
 
@@ -897,7 +984,7 @@ class RegistrationAudioBot(ActivityHandler):
     async def _handle_postal_input(self, turn_context: TurnContext, user_profile, user_input):
         """Handle postal code input with CLU"""
         # Try CLU extraction first
-        zip_entity = await self._extract_entity_with_clu(user_input, 'ZipCode')
+        zip_entity = await self._extract_entity_with_clu(turn_context, user_input, 'ZipCode')
 
         postal_to_validate = zip_entity or user_input
         validated_postal = DataValidator.validate_postal_code(postal_to_validate)
@@ -929,7 +1016,7 @@ class RegistrationAudioBot(ActivityHandler):
     async def _handle_city_input(self, turn_context: TurnContext, user_profile, user_input):
         """Handle city input with CLU"""
         # Try CLU extraction first
-        city_entity = await self._extract_entity_with_clu(user_input, 'City')
+        city_entity = await self._extract_entity_with_clu(turn_context, user_input, 'City')
 
         city_to_validate = city_entity or user_input
 
@@ -956,7 +1043,7 @@ class RegistrationAudioBot(ActivityHandler):
     async def _handle_country_input(self, turn_context: TurnContext, user_profile, user_input):
         """Handle country input with CLU"""
         # Try CLU extraction first
-        country_entity = await self._extract_entity_with_clu(user_input, 'countryName')
+        country_entity = await self._extract_entity_with_clu(turn_context, user_input, 'countryName')
 
         country_to_validate = country_entity or user_input
 
@@ -978,7 +1065,19 @@ class RegistrationAudioBot(ActivityHandler):
 
     async def _confirm_field(self, turn_context: TurnContext, field_name: str, value: str, confirmation_state: str):
         """Send field confirmation"""
-        confirmation_message = SpeechBotMessages.confirmation_prompt(field_name, value)
+        # other fields contained in the same answer are filled as well and confirmed together
+        user_profile = await self.user_profile_accessor.get(turn_context, lambda: {})
+        slot_state = await self.slot_filling_accessor.get(turn_context, lambda: {})
+        entities = await TurnEntities.for_turn(turn_context).all_entities(self.clu_service)
+        prefilled = await fill_slots(entities, user_profile, slot_state,
+                                     confirmation_state[len(DialogState.CONFIRM_PREFIX):],
+                                     self.customer_service.email_exists_in_db)
+        if prefilled:
+            await self.user_profile_accessor.set(turn_context, user_profile)
+            await self.slot_filling_accessor.set(turn_context, slot_state)
+            confirmation_message = SpeechBotMessages.confirmation_prompt_multiple([(field_name, value)] + prefilled)
+        else:
+            confirmation_message = SpeechBotMessages.confirmation_prompt(field_name, value)
         await self._send_audio_response(turn_context, confirmation_message)
         await self.dialog_state_accessor.set(turn_context, confirmation_state)
 
@@ -986,7 +1085,7 @@ class RegistrationAudioBot(ActivityHandler):
         """Handle confirmation responses with CLU integration"""
 
         # Try CLU confirmation extraction first
-        clu_confirmation = await self._extract_confirmation_with_clu(user_input)
+        clu_confirmation = await self._extract_confirmation_with_clu(turn_context, user_input)
 
         confirmed = False
         rejected = False
@@ -1006,9 +1105,13 @@ class RegistrationAudioBot(ActivityHandler):
         if confirmed:
             # Find next step in dialog flow
             found_next_step = False
-            for conf_state, next_ask_func, _ in self.dialog_flow:
+            for index, (conf_state, _, _) in enumerate(self.dialog_flow):
                 if dialog_state == conf_state:
-                    await next_ask_func(turn_context)
+                    # steps of fields the confirmed answer already filled are skipped
+                    slot_state = await self.slot_filling_accessor.get(turn_context, lambda: {})
+                    next_step = next_open_step(self.dialog_flow, slot_state, index)
+                    await self.slot_filling_accessor.set(turn_context, slot_state)
+                    await self.dialog_flow[next_step][1](turn_context)
                     found_next_step = True
                     break
 
@@ -1020,6 +1123,10 @@ class RegistrationAudioBot(ActivityHandler):
             found_correction_step = False
             for conf_state, _, correction_ask_func in self.dialog_flow:
                 if dialog_state == conf_state:
+                    slot_state = await self.slot_filling_accessor.get(turn_context, lambda: {})
+                    clear_prefilled(user_profile, slot_state)
+                    await self.user_profile_accessor.set(turn_context, user_profile)
+                    await self.slot_filling_accessor.set(turn_context, slot_state)
                     await self._send_audio_response(turn_context, SpeechBotMessages.CONFIRMATION_REJECTED)
                     await correction_ask_func(turn_context)
                     found_correction_step = True
@@ -1045,7 +1152,7 @@ class RegistrationAudioBot(ActivityHandler):
         """Handle final confirmation with CLU integration"""
 
         # Try CLU confirmation extraction first
-        clu_confirmation = await self._extract_confirmation_with_clu(user_input)
+        clu_confirmation = await self._extract_confirmation_with_clu(turn_context, user_input)
 
         save_data = False
         start_correction = False
@@ -1074,6 +1181,7 @@ class RegistrationAudioBot(ActivityHandler):
             if success:
                 await self._send_audio_response(turn_context, SpeechBotMessages.REGISTRATION_SUCCESS)
                 await self.dialog_state_accessor.set(turn_context, DialogState.COMPLETED)
+                await self.slot_filling_accessor.delete(turn_context)
                 await self.user_profile_accessor.set(turn_context, {
                     'registration_completed': True,
                     'completion_timestamp': datetime.now().isoformat()
@@ -1180,6 +1288,7 @@ class RegistrationAudioBot(ActivityHandler):
             if user_profile.get('registration_cancelled'):
                 await self._send_audio_response(turn_context, SpeechBotMessages.RESTART_NEW_REGISTRATION)
 
+                await self.slot_filling_accessor.delete(turn_context)
                 await self.user_profile_accessor.set(turn_context, {})
                 await self.dialog_state_accessor.set(turn_context, DialogState.GREETING)
                 await self._handle_greeting(turn_context, {})
@@ -1200,6 +1309,7 @@ class RegistrationAudioBot(ActivityHandler):
         if any(keyword in user_input_lower for keyword in FieldConfig.RESTART_KEYWORDS):
             await self._send_audio_response(turn_context, SpeechBotMessages.UNKNOWN_STATE_RESTART)
 
+            await self.slot_filling_accessor.delete(turn_context)
             await self.user_profile_accessor.set(turn_context, {})
             await self.dialog_state_accessor.set(turn_context, DialogState.GREETING)
             await self._handle_greeting(turn_context, {})
@@ -1212,6 +1322,7 @@ class RegistrationAudioBot(ActivityHandler):
         """Handle restart request"""
         await self._send_audio_response(turn_context, SpeechBotMessages.RESTART_MESSAGE)
 
+        await self.slot_filling_accessor.delete(turn_context)
         await self.user_profile_accessor.set(turn_context, {})
         await self.dialog_state_accessor.set(turn_context, DialogState.GREETING)
         await self._handle_greeting(turn_context, {})
@@ -1249,6 +1360,5 @@ class RegistrationAudioBot(ActivityHandler):
 
 
     async def _save_state(self, turn_context: TurnContext):
-        """Save bot state"""
-        await self.conversation_state.save_changes(turn_context)
-        await self.user_state.save_changes(turn_context)
\ No newline at end of file
+        """Save bot state (the user state is never loaded, so only the conversation state is written)"""
+        await self.conversation_state.save_changes(turn_context)
\ No newline at end of file
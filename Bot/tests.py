@@ -1,3 +1,491 @@
-from django.test import TestCase
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from unittest import mock
 
-# Create your tests here.
+import fakeredis
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from django.test import SimpleTestCase
+
+from Bot.affinity import AffinityRouter
+from Bot.azure_service.luis_service import AzureCLUService, CLUEntityCache
+from Bot.cache import SingleFlight
+from Bot.circuit_breaker import CircuitBreaker
+from Bot.extraction_policy import ExtractionPolicy, extraction_policy
+from Bot.http_client import SharedHttpClient
+from Bot.lifecycle import Lifecycle
+from Bot.local_entity_extractor import LocalEntityExtractor
+from Bot.slot_filling import CONFIRMED_PREFILLED_KEY, PREFILLED_FIELDS_KEY, clear_prefilled, fill_slots, next_open_step
+from Bot.registration_profile import profile_dict_to_wire, profile_wire_to_dict
+from Bot.storage.redis_storage import CONDITIONAL_WRITE_SCRIPT, RedisStorage
+from Bot.storage.serialization import dumps_state, loads_state
+from Bot.storage.write_behind import WriteBehindStorage, apply_change
+from Bot.text_messages import FieldConfig
+from Bot.turn_entities import TurnEntities
+
+
+def fake_redis_storage(**kwargs) -> RedisStorage:
+    # RedisStorage on an in-process server (fakeredis runs the Lua script with lupa)
+    storage = RedisStorage("redis://localhost:6379/0", **kwargs)
+    storage.client = fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer())
+    storage._conditional_write = storage.client.register_script(CONDITIONAL_WRITE_SCRIPT)
+    return storage
+
+
+class StateSerializationTests(SimpleTestCase):
+    PROFILE = {
+        "first_interaction": False, "consent_given": True,
+        "consent_timestamp": "2026-10-17T09:30:12.345678",
+        "gender": "male", "gender_display": "Herr", "title": "Dr.", "title_display": "Dr.",
+        "first_name": "Max", "last_name": "Müller",
+        "birth_date": "1990-05-15", "birth_date_display": "15.05.1990",
+        "email": "max@example.com", "telephone": "+4930123456", "telephone_display": "030 123456",
+        "street_name": "Hauptstraße", "house_number": "12", "house_number_addition": "a",
+        "postal_code": "10115", "city": "Berlin", "country_name": "Deutschland",
+        "registration_completed": True, "completion_timestamp": "2026-10-17T09:35:00",
+    }
+
+    def test_state_round_trip(self):
+        state = {
+            "DialogState": "ask_email",
+            "UserProfile": dict(self.PROFILE, future_field=[1, 2]),
+            "SlotFilling": {"prefilled_fields": ["email"]},
+        }
+        self.assertEqual(loads_state(dumps_state(state)), state)
+
+    def test_partial_states_round_trip(self):
+        for state in ({}, {"DialogState": "greeting"}, {"UserProfile": {}},
+                      {"UserProfile": {"first_interaction": True}}):
+            with self.subTest(state=state):
+                self.assertEqual(loads_state(dumps_state(state)), state)
+
+    def test_values_that_are_not_exactly_reversible_stay_strings(self):
+        profile = {"consent_timestamp": "2026-10-17T09:30:12+02:00", "birth_date": "15.05.1990",
+                   "completion_timestamp": "gestern"}
+        wire = profile_dict_to_wire(profile)
+
+        self.assertIn("2026-10-17T09:30:12+02:00", wire)
+        self.assertEqual(profile_wire_to_dict(wire), profile)
+
+    def test_dates_and_timestamps_are_encoded_as_integers(self):
+        wire = profile_dict_to_wire({"birth_date": "1990-05-15", "completion_timestamp": "2026-10-17T09:35:00"})
+
+        self.assertTrue(all(isinstance(value, int) for value in wire[1:] if value is not None))
+        self.assertIsNone(wire[0])
+
+    def test_json_payloads_are_still_read(self):
+        state = {"DialogState": "ask_city", "UserProfile": self.PROFILE}
+        self.assertEqual(loads_state(json.dumps(state).encode("utf-8")), state)
+
+    def test_newer_schema_version_is_rejected(self):
+        payload = bytearray(dumps_state({"DialogState": "greeting"}))
+        # first element of the msgpack array is the schema version (positive fixint)
+        payload[1] = 99
+        with self.assertRaises(ValueError):
+            loads_state(bytes(payload))
+
+class RedisStorageTests(SimpleTestCase):
+
+    def setUp(self):
+        self.storage = fake_redis_storage()
+
+    async def test_write_and_read_state(self):
+        await self.storage.write({"conv": {"DialogState": {"state": "greeting"}}})
+
+        items = await self.storage.read(["conv"])
+
+        self.assertEqual(items["conv"]["DialogState"], {"state": "greeting"})
+        self.assertEqual(items["conv"]["e_tag"], "1")
+
+    async def test_write_with_matching_etag(self):
+        await self.storage.write({"conv": {"DialogState": {"state": "greeting"}}})
+        item = (await self.storage.read(["conv"]))["conv"]
+        item["DialogState"] = {"state": "consent"}
+
+        await self.storage.write({"conv": item})
+
+        stored = (await self.storage.read(["conv"]))["conv"]
+        self.assertEqual(stored["DialogState"], {"state": "consent"})
+        self.assertEqual(stored["e_tag"], "2")
+        # the written item carries the new version, a second save in the same turn succeeds
+        self.assertEqual(item["e_tag"], "2")
+        await self.storage.write({"conv": item})
+
+    async def test_write_with_stale_etag_raises_key_error(self):
+        await self.storage.write({"conv": {"DialogState": {"state": "greeting"}}})
+        first = (await self.storage.read(["conv"]))["conv"]
+        second = (await self.storage.read(["conv"]))["conv"]
+        await self.storage.write({"conv": first})
+
+        second["DialogState"] = {"state": "stale"}
+        with self.assertRaises(KeyError):
+            await self.storage.write({"conv": second})
+
+        stored = (await self.storage.read(["conv"]))["conv"]
+        self.assertEqual(stored["DialogState"], {"state": "greeting"})
+        self.assertEqual(stored["e_tag"], "2")
+
+    async def test_star_etag_overwrites(self):
+        await self.storage.write({"conv": {"DialogState": {"state": "greeting"}}})
+        await self.storage.write({"conv": {"DialogState": {"state": "consent"}}})
+
+        await self.storage.write({"conv": {"DialogState": {"state": "forced"}, "e_tag": "*"}})
+
+        stored = (await self.storage.read(["conv"]))["conv"]
+        self.assertEqual(stored["DialogState"], {"state": "forced"})
+        self.assertEqual(stored["e_tag"], "3")
+
+    async def test_missing_etag_overwrites(self):
+        await self.storage.write({"conv": {"DialogState": {"state": "greeting"}}})
+
+        await self.storage.write({"conv": {"DialogState": {"state": "restart"}}})
+
+        stored = (await self.storage.read(["conv"]))["conv"]
+        self.assertEqual(stored["DialogState"], {"state": "restart"})
+        self.assertEqual(stored["e_tag"], "2")
+
+    async def test_ttl_expires_items(self):
+        storage = fake_redis_storage(ttl_seconds=1)
+        await storage.write({"conv": {"DialogState": {"state": "greeting"}}})
+        self.assertEqual(await storage.client.ttl("botstate:conv"), 1)
+
+        await asyncio.sleep(1.1)
+
+        self.assertEqual(await storage.read(["conv"]), {})
+
+    async def test_without_ttl_items_do_not_expire(self):
+        await self.storage.write({"conv": {"DialogState": {"state": "greeting"}}})
+
+        self.assertEqual(await self.storage.client.ttl("botstate:conv"), -1)
+
+    async def test_reads_several_keys_in_one_pipeline(self):
+        await self.storage.write({
+            "conv-a": {"DialogState": {"state": "greeting"}},
+            "conv-b": {"DialogState": {"state": "consent"}},
+        })
+
+        with mock.patch.object(self.storage.client, "pipeline", wraps=self.storage.client.pipeline) as pipeline, \
+                mock.patch.object(self.storage.client, "hmget") as direct_hmget:
+            items = await self.storage.read(["conv-a", "conv-b", "conv-missing"])
+
+        self.assertEqual(pipeline.call_count, 1)
+        direct_hmget.assert_not_called()
+        self.assertEqual(set(items), {"conv-a", "conv-b"})
+        self.assertEqual(items["conv-b"]["DialogState"], {"state": "consent"})
+
+    async def test_delete_removes_items(self):
+        await self.storage.write({"conv": {"DialogState": {"state": "greeting"}}})
+
+        await self.storage.delete(["conv"])
+
+        self.assertEqual(await self.storage.read(["conv"]), {})
+
+
+class AffinityForwardTests(SimpleTestCase):
+
+    @staticmethod
+    @asynccontextmanager
+    async def router(timeout: float = 15):
+        http_client = SharedHttpClient(timeout=timeout)
+        try:
+            yield AffinityRouter("http://node-a", ["http://node-a", "http://node-b"], http_client,
+                                 client_retry_after=7)
+        finally:
+            await http_client.close()
+
+    @staticmethod
+    @asynccontextmanager
+    async def owner(handler):
+        # bot process the conversation belongs to
+        app = web.Application()
+        app.router.add_post("/api/messages/", handler)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            yield str(server.make_url("")).rstrip("/")
+        finally:
+            await server.close()
+
+    async def test_relays_the_owner_response(self):
+        async def handler(request):
+            return web.json_response({"status": "accepted"}, headers={"Retry-After": "3"})
+
+        async with self.owner(handler) as owner, self.router() as router:
+            response = await router.forward(owner, b"{}", "Bearer token")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Retry-After"], "3")
+
+    async def test_connect_error_falls_back_to_local_processing(self):
+        async with self.router() as router:
+            response = await router.forward("http://127.0.0.1:9", b"{}", "")
+
+        self.assertIsNone(response)
+        self.assertEqual(router.stats()["down"], ["http://127.0.0.1:9"])
+
+    async def test_read_timeout_is_answered_with_503(self):
+        async def handler(request):
+            await asyncio.sleep(2)
+            return web.json_response({})
+
+        async with self.owner(handler) as owner, self.router(timeout=0.2) as router:
+            response = await router.forward(owner, b"{}", "")
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "7")
+        # the owner stays on the ring, the retried activity goes there again
+        self.assertEqual(router.stats()["down"], [])
+
+    async def test_disconnect_after_sending_is_answered_with_503(self):
+        async def handler(request):
+            await request.read()
+            request.transport.close()
+            await asyncio.sleep(1)
+
+        async with self.owner(handler) as owner, self.router() as router:
+            response = await router.forward(owner, b"{}", "")
+
+        self.assertEqual(response.status_code, 503)
+
+
+class ExtractionPolicyTests(SimpleTestCase):
+
+    def test_salutations_and_titles_are_no_names(self):
+        for answer in ("Frau", "Herr", "Hr.", "Fr", "Dr", "Dr.", "Prof", "nein"):
+            with self.subTest(answer=answer):
+                self.assertIsNone(extraction_policy.parse_entity("Name", answer))
+        self.assertEqual(extraction_policy.parse_entity("Name", "Müller."), "Müller")
+
+    def test_house_number_is_normalized(self):
+        self.assertEqual(extraction_policy.parse_entity("houseNumber", "007"), "7")
+        self.assertEqual(extraction_policy.parse_entity("houseNumber", "12."), "12")
+        self.assertIsNone(extraction_policy.parse_entity("houseNumber", "000"))
+        self.assertIsNone(extraction_policy.parse_entity("houseNumber", "12a"))
+
+    def test_negative_title_answers_mean_no_title(self):
+        for answer in ("nein", "Nee", "kein Titel", "ohne", "keine"):
+            with self.subTest(answer=answer):
+                self.assertIn(extraction_policy.parse_entity("titel", answer), FieldConfig.NO_TITLE_KEYWORDS)
+        self.assertEqual(extraction_policy.parse_entity("titel", "dr"), "Dr.")
+        self.assertIsNone(extraction_policy.parse_entity("titel", "Ja"))
+
+    async def test_only_clu_network_calls_are_counted(self):
+        policy = ExtractionPolicy()
+        clu_service = AzureCLUService.__new__(AzureCLUService)
+        clu_service.entity_cache = CLUEntityCache()
+        clu_service.in_flight = SingleFlight()
+        clu_service.circuit_breaker = CircuitBreaker("CLU")
+        clu_service.deployment_name = "test"
+        clu_service.prediction_endpoint = clu_service.prediction_key = clu_service.project_name = ""
+        post = mock.AsyncMock(return_value=(200, {"result": {"prediction": {"entities": [
+            {"category": "Name", "text": "Max"}]}}}))
+
+        with mock.patch("Bot.azure_service.luis_service.extraction_policy", policy), \
+                mock.patch.object(clu_service, "_post", post):
+            policy.set_dialog_state("ask_first_name")
+            await clu_service.get_entities("Ich heiße Max")
+            # cache hit
+            await clu_service.get_entities("ich heiße max.")
+            policy.record_local()
+
+        self.assertEqual(post.await_count, 1)
+        self.assertEqual(policy.stats()["per_state"], {"ask_first_name": {"local": 1, "clu": 1}})
+
+
+class CLUEntityCacheTests(SimpleTestCase):
+    def test_utterances_are_only_kept_as_hash(self):
+        cache = CLUEntityCache()
+        cache.set("test", "Ja.", [{"category": "ConfirmationAnswer", "text": "Ja", "extraInformation": []}])
+
+        self.assertEqual(cache.get("test", " JA ")[0]["text"], "JA")
+        self.assertNotIn("ja", CLUEntityCache.key("test", "Ja"))
+        self.assertEqual(CLUEntityCache.key("test", "ja!"), CLUEntityCache.key("test", "Ja"))
+
+    def test_personal_data_uses_the_short_ttl(self):
+        cache = CLUEntityCache(ttl_seconds=3600, pii_ttl_seconds=60)
+        cache.set("test", "Ich heiße Max", [{"category": "Name", "text": "Max"}])
+
+        self.assertEqual(cache.get("test", "ich heiße max"), [{"category": "Name", "text": "max"}])
+        self.assertEqual(cache.stats()["entries"], 0)
+        self.assertEqual(cache.stats()["pii"]["entries"], 1)
+        self.assertEqual(cache.stats()["pii"]["ttl_seconds"], 60)
+
+    def test_personal_data_is_not_cached_without_pii_ttl(self):
+        cache = CLUEntityCache(pii_ttl_seconds=0)
+        cache.set("test", "max@example.com", [{"category": "email", "text": "max@example.com"}])
+        cache.set("test", "nein", [{"category": "ConfirmationAnswer", "text": "nein"}])
+
+        self.assertIsNone(cache.get("test", "max@example.com"))
+        self.assertIsNotNone(cache.get("test", "nein"))
+        self.assertNotIn("pii", cache.stats())
+
+class SlotFillingTests(SimpleTestCase):
+
+    ENTITIES = [
+        {"category": "Name", "text": "Max"},
+        {"category": "Name", "text": "Mustermann"},
+        {"category": "DateOfBirth", "text": "01.02.1990"},
+    ]
+
+    async def test_bookkeeping_stays_out_of_the_profile(self):
+        user_profile, slot_state = {}, {}
+
+        prefilled = await fill_slots(self.ENTITIES, user_profile, slot_state, 'first_name')
+
+        self.assertEqual([name for name, _ in prefilled], ["Nachname", "Geburtsdatum"])
+        self.assertEqual(slot_state[PREFILLED_FIELDS_KEY], ['last_name', 'birthdate'])
+        self.assertNotIn(PREFILLED_FIELDS_KEY, user_profile)
+        self.assertEqual(user_profile['last_name'], "Mustermann")
+
+    async def test_rejected_confirmation_takes_the_prefilled_fields_back(self):
+        user_profile, slot_state = {'first_name': "Max"}, {}
+        await fill_slots(self.ENTITIES, user_profile, slot_state, 'first_name')
+
+        clear_prefilled(user_profile, slot_state)
+
+        self.assertEqual(user_profile, {'first_name': "Max"})
+        self.assertEqual(slot_state, {})
+
+    async def test_confirmed_prefilled_steps_are_skipped(self):
+        user_profile, slot_state = {}, {}
+        await fill_slots(self.ENTITIES, user_profile, slot_state, 'first_name')
+        dialog_flow = [("confirm_first_name",), ("confirm_last_name",), ("confirm_birthdate",), ("confirm_email",)]
+
+        self.assertEqual(next_open_step(dialog_flow, slot_state, 0), 2)
+        self.assertEqual(slot_state, {CONFIRMED_PREFILLED_KEY: ['last_name', 'birthdate']})
+
+    async def test_entities_of_a_local_answer_are_fetched_on_demand(self):
+        extractor = LocalEntityExtractor()
+        turn_entities = TurnEntities()
+
+        turn_entities.answered_locally("Müller")
+        self.assertEqual(await turn_entities.all_entities(extractor), [])
+
+        turn_entities.answered_locally("Max Mustermann, geboren am 1. Februar 1990")
+        entities = await turn_entities.all_entities(extractor)
+        self.assertIn({"category": "DateOfBirth", "text": "01.02.1990"}, entities)
+
+    def test_salutation_in_a_name_answer_is_no_gender(self):
+        categories = {entity["category"] for entity in LocalEntityExtractor().extract("Frau Dr. Schmidt")}
+        self.assertNotIn("Gender", categories)
+        self.assertIn({"category": "Gender", "text": "weiblich"}, LocalEntityExtractor().extract("Ich bin eine Frau"))
+
+
+class LocalEntityExtractorTests(SimpleTestCase):
+
+    def setUp(self):
+        self.extractor = LocalEntityExtractor()
+
+    def entities(self, text: str) -> list:
+        return [(entity["category"], entity.get("key") or entity["text"]) for entity in self.extractor.extract(text)]
+
+    def test_names_after_a_salutation(self):
+        self.assertEqual(self.entities("Herr Müller"), [("Name", "Müller")])
+        self.assertEqual(self.entities("Frau Dr. Neumann"), [("titel", "Dr."), ("Name", "Neumann")])
+        self.assertEqual(self.entities("Ich bin Herr Becker"), [("Name", "Becker")])
+
+    def test_introduced_names(self):
+        self.assertEqual(self.entities("Mein Vorname lautet Jonas"), [("Name", "Jonas")])
+        self.assertEqual(self.entities("Vorname Paul, Nachname Richter"), [("Name", "Paul"), ("Name", "Richter")])
+        self.assertEqual(self.entities("Hans-Peter"), [("Name", "Hans-Peter")])
+
+    def test_combined_answer(self):
+        self.assertEqual(self.entities("Max Mustermann, geboren am 1. Februar 1990"),
+                         [("DateOfBirth", "01.02.1990"), ("Name", "Max"), ("Name", "Mustermann")])
+
+    def test_negated_confirmations(self):
+        self.assertEqual(self.entities("Das stimmt nicht"), [("ConfirmationAnswer", "no")])
+        self.assertEqual(self.entities("Nicht korrekt"), [("ConfirmationAnswer", "no")])
+        self.assertEqual(self.entities("Ja, alles korrekt so"), [("ConfirmationAnswer", "yes")])
+        self.assertEqual(self.entities("Genau"), [("ConfirmationAnswer", "yes")])
+
+    def test_single_letters_inside_other_values_are_no_answer(self):
+        self.assertEqual(self.entities("Meine Mail ist j.schaefer@gmx.net"), [("email", "j.schaefer@gmx.net")])
+        self.assertEqual(self.entities("j"), [("ConfirmationAnswer", "yes")])
+
+    def test_house_numbers_with_suffix(self):
+        self.assertEqual(self.entities("Bahnhofstraße 12a"),
+                         [("StreetHousenumber", "Bahnhofstraße 12a"), ("houseNumber", "12a")])
+        self.assertEqual(self.entities("Lindenweg 3 b"), [("StreetHousenumber", "Lindenweg 3b"), ("houseNumber", "3b")])
+        self.assertEqual(self.entities("Hausnummer 112 B"), [("houseNumber", "112B")])
+        self.assertEqual(self.entities("45a"), [("houseNumber", "45a")])
+
+    def test_postal_code_is_not_a_house_number(self):
+        self.assertEqual(self.entities("50667 Köln"), [("ZipCode", "50667"), ("City", "Köln")])
+        self.assertEqual(self.entities("10115"), [("ZipCode", "10115")])
+
+    def test_phone_and_spoken_email(self):
+        self.assertEqual(self.entities("Sie erreichen mich unter 030/1234567"), [("PhoneNumber", "030/1234567")])
+        self.assertEqual(self.entities("tom punkt richter at gmail punkt com"), [("email", "tom.richter@gmail.com")])
+
+    def test_no_entities_in_questions(self):
+        self.assertEqual(self.entities("Wie bitte?"), [])
+
+
+class WriteBehindStorageTests(SimpleTestCase):
+
+    async def test_conflicting_flush_applies_the_changes_to_the_newer_version(self):
+        backend = fake_redis_storage()
+        await backend.write({"conv": {"UserProfile": {"first_name": "Max"}, "DialogState": "ask_last_name"}})
+        worker_a = WriteBehindStorage(backend, flush_interval=60)
+        worker_b = WriteBehindStorage(backend, flush_interval=60)
+
+        state_a = (await worker_a.read(["conv"]))["conv"]
+        state_b = (await worker_b.read(["conv"]))["conv"]
+        state_b["UserProfile"]["email"] = "max@example.com"
+        await worker_b.write({"conv": state_b})
+        await worker_b.flush()
+
+        state_a["UserProfile"]["last_name"] = "Mustermann"
+        state_a["DialogState"] = "confirm_last_name"
+        await worker_a.write({"conv": state_a})
+        await worker_a.flush()
+
+        stored = (await backend.read(["conv"]))["conv"]
+        self.assertEqual(stored["UserProfile"],
+                         {"first_name": "Max", "last_name": "Mustermann", "email": "max@example.com"})
+        self.assertEqual(stored["DialogState"], "confirm_last_name")
+        self.assertEqual(worker_a.stats()["conflicts"], 1)
+        self.assertEqual(worker_a.stats()["rebased"], 1)
+        # the cache of worker a continues from the merged version
+        cached = (await worker_a.read(["conv"]))["conv"]
+        self.assertEqual(cached["UserProfile"]["email"], "max@example.com")
+
+        cached["DialogState"] = "ask_birthdate"
+        await worker_a.write({"conv": cached})
+        await worker_a.flush()
+        self.assertEqual(worker_a.stats()["conflicts"], 1)
+
+    async def test_unchanged_state_is_not_written_again(self):
+        backend = fake_redis_storage()
+        await backend.write({"conv": {"DialogState": "greeting"}})
+        storage = WriteBehindStorage(backend, flush_interval=60)
+
+        state = (await storage.read(["conv"]))["conv"]
+        await storage.write({"conv": state})
+        await storage.flush()
+
+        self.assertEqual(storage.stats()["writes_skipped"], 1)
+        self.assertEqual(storage.stats()["backend_writes"], 0)
+
+    def test_apply_change_keeps_changes_of_both_sides(self):
+        base = {"UserProfile": {"a": 1, "b": 2}, "DialogState": "x"}
+        ours = {"UserProfile": {"a": 1, "b": 3}, "DialogState": "y"}
+        theirs = {"UserProfile": {"a": 5, "b": 2, "c": 1}, "DialogState": "x", "SlotFilling": {}}
+
+        self.assertEqual(apply_change(base, ours, theirs),
+                         {"UserProfile": {"a": 5, "b": 3, "c": 1}, "DialogState": "y", "SlotFilling": {}})
+
+
+class LifecycleTests(SimpleTestCase):
+    def test_drain_budget_counts_from_sigterm(self):
+        lifecycle = Lifecycle()
+        with mock.patch("Bot.lifecycle.time.monotonic", return_value=100.0):
+            lifecycle.start_draining()
+        # uvicorn's graceful wait already used 20 of the 25 seconds
+        with mock.patch("Bot.lifecycle.time.monotonic", return_value=120.0):
+            lifecycle.start_draining()
+            self.assertEqual(lifecycle.remaining(25), 5.0)
+        with mock.patch("Bot.lifecycle.time.monotonic", return_value=130.0):
+            self.assertEqual(lifecycle.remaining(25), 0.0)
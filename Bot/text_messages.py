@@ -108,6 +108,12 @@ class BotMessages:
     def confirmation_prompt(field_name: str, value: str) -> str:
         return f"{field_name}: **{value}**\n\nIst das korrekt? (ja/nein)"
 
+    @staticmethod
+    def confirmation_prompt_multiple(values) -> str:
+        # several fields taken from one answer, confirmed together
+        lines = "\n".join(f"{field_name}: **{value}**" for field_name, value in values)
+        return f"{lines}\n\nIst das korrekt? (ja/nein)"
+
     CONFIRMATION_REJECTED = "Okay, lassen Sie uns das korrigieren."
     CONFIRMATION_UNCLEAR = "Bitte antworten Sie mit 'ja' oder 'nein'."
 
@@ -295,6 +301,24 @@ class FieldConfig:
         'country': 'Land'
     }
 
+    # Profile keys written by each field, the first one holds the value.
+    # A field counts as filled once its value key is in the profile.
+    FIELD_PROFILE_KEYS = {
+        'gender': ('gender', 'gender_display'),
+        'title': ('title', 'title_display'),
+        'first_name': ('first_name',),
+        'last_name': ('last_name',),
+        'birthdate': ('birth_date', 'birth_date_display'),
+        'email': ('email',),
+        'phone': ('telephone', 'telephone_display'),
+        'street': ('street_name',),
+        'house_number': ('house_number',),
+        'house_addition': ('house_number_addition', 'house_addition_display'),
+        'postal': ('postal_code',),
+        'city': ('city',),
+        'country': ('country_name',),
+    }
+
     # Mapping for correction selection
     CORRECTION_MAPPING = {
         # Numbers
@@ -1,3 +1,18 @@
+import re
+
+from .text_messages import FieldConfig
+
+
+def markdown_to_speech(text: str) -> str:
+    # Converts the markdown of a message into the text that is spoken
+    speech_text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)  # **bold** -> bold
+    speech_text = re.sub(r'\*([^*]+)\*', r'\1', speech_text)  # *italic* -> italic
+    speech_text = re.sub(r'•\s*', '', speech_text)  # remove bullet points
+    speech_text = re.sub(r'\n+', ' ', speech_text)  # line breaks to spaces
+    speech_text = re.sub(r'\s+', ' ', speech_text)  # collapse whitespace
+    return speech_text.strip()
+
+
 class SpeechBotMessages:
     # Messages for the registration bot
 
@@ -51,6 +66,12 @@ class SpeechBotMessages:
     def confirmation_prompt(field_name: str, value: str) -> str:
         return f"{field_name}: **{value}**\n\nIst das korrekt? (ja/nein)"
 
+    @staticmethod
+    def confirmation_prompt_multiple(values) -> str:
+        # several fields taken from one answer, confirmed together
+        lines = "\n".join(f"{field_name}: **{value}**" for field_name, value in values)
+        return f"{lines}\n\nIst das korrekt? (ja/nein)"
+
     CONFIRMATION_REJECTED = "Okay, lassen Sie uns das korrigieren."
     CONFIRMATION_UNCLEAR = "Bitte antworten Sie mit 'ja' oder 'nein'."
 
@@ -160,3 +181,26 @@ class SpeechBotMessages:
         "**Korrekturhilfe:**\nZahl oder Feldname eingeben\nBeispiel: '6' oder 'email'\n"
         "'Zurück' - Übersicht\n'Neustart' - neu starten"
     )
+
+    @classmethod
+    def static_prompts(cls) -> list:
+        # All messages that do not depend on user input, pre-rendered as audio by build_prompt_audio
+        prompts = []
+        for name, value in vars(cls).items():
+            if name.startswith('_'):
+                continue
+            if isinstance(value, str):
+                prompts.append(value)
+            elif isinstance(value, dict):
+                prompts.extend(text for text in value.values() if isinstance(text, str))
+        prompts.extend(cls.correction_start(display) for display in FieldConfig.FIELD_DISPLAY_NAMES.values())
+        return list(dict.fromkeys(prompts))
+
+
+_STATIC_SPEECH_TEXTS = frozenset(markdown_to_speech(prompt) for prompt in SpeechBotMessages.static_prompts())
+
+
+def is_static_prompt(speech_text: str) -> bool:
+    # True if the (already converted) speech text is one of the static prompts. Only those are
+    # cached as audio, replies that contain user data are not.
+    return speech_text in _STATIC_SPEECH_TEXTS
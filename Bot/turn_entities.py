@@ -0,0 +1,80 @@
+from typing import Dict, List, Optional, Set
+
+from botbuilder.core import TurnContext
+
+from .azure_service.luis_service import AzureCLUService
+from .local_entity_extractor import LocalFirstEntityExtractor
+
+
+class TurnEntities:
+    # CLU entities of the utterances analysed in the current turn.
+    # Every extraction helper reads from here, so CLU runs at most once per utterance and turn
+    # no matter how many entity types a handler looks for (with the local-first extractor at most
+    # once per requested category the local result lacks). Handlers can read all entities of
+    # the turn via TurnEntities.for_turn(turn_context).entities without another call.
+    # The lists are shared, callers must not modify them.
+
+    TURN_STATE_KEY = "CLUEntities"
+
+    def __init__(self):
+        self._by_text: Dict[str, List[dict]] = {}
+        # categories already asked for per text, a category missing in the result is not asked again
+        self._requested: Dict[str, Set[Optional[str]]] = {}
+        self.utterance: Optional[str] = None
+
+    @classmethod
+    def for_turn(cls, turn_context: TurnContext) -> "TurnEntities":
+        # Returns the entities of the current turn, creating the container on first use
+        entities = turn_context.turn_state.get(cls.TURN_STATE_KEY)
+        if entities is None:
+            entities = cls()
+            turn_context.turn_state[cls.TURN_STATE_KEY] = entities
+        return entities
+
+    @property
+    def entities(self) -> List[dict]:
+        # entities of the last analysed utterance
+        return self._by_text.get(self.utterance, [])
+
+    async def get(self, clu_service: AzureCLUService, text: str, category: Optional[str] = None) -> List[dict]:
+        # category is the entity the caller needs, the local-first extractor asks CLU if it is missing
+        entities = self._by_text.get(text)
+        requested = self._requested.setdefault(text, set())
+        if entities is None or (category not in requested and not self._contains(entities, category)):
+            if category and isinstance(clu_service, LocalFirstEntityExtractor):
+                fetched = await clu_service.get_entities(text=text, categories=[category])
+            else:
+                fetched = await clu_service.get_entities(text=text)
+            entities = fetched if entities is None else entities + [entity for entity in fetched
+                                                                     if entity not in entities]
+            self._by_text[text] = entities
+        requested.add(category)
+        self.utterance = text
+        return entities
+
+    def answered_locally(self, text: str):
+        # the utterance was parsed without CLU, its other entities are only fetched if needed
+        self.utterance = text
+
+    async def all_entities(self, clu_service: Optional[AzureCLUService]) -> List[dict]:
+        # All entities of the last utterance (slot filling). An utterance answered by the local
+        # fast path has none cached yet; a single word cannot hold further fields, longer ones
+        # are analysed now.
+        text = self.utterance
+        if text is None or text in self._by_text:
+            return self.entities
+        if clu_service is None or len(text.split()) < 2:
+            return []
+        return await self.get(clu_service, text)
+
+    @staticmethod
+    def _contains(entities: List[dict], category: Optional[str]) -> bool:
+        return category is None or any(
+            (entity.get('category', '') or entity.get('name', '')) == category for entity in entities)
+
+    def find(self, category: str) -> Optional[dict]:
+        # first entity of the given category in the last analysed utterance
+        for entity in self.entities:
+            if (entity.get('category', '') or entity.get('name', '')) == category:
+                return entity
+        return None
@@ -0,0 +1,131 @@
+import asyncio
+import time
+import traceback
+from collections import deque
+from typing import Awaitable, Callable, Dict, Set
+
+
+class TurnScheduler:
+    # Runs bot turns on a bounded pool of worker slots.
+    # Turns of the same conversation are executed strictly one after another (in arrival order),
+    # turns of different conversations run in parallel as long as a worker slot is free.
+
+    def __init__(self, max_workers: int = 8, wait_window: int = 1000):
+        self.max_workers = max_workers
+        self._workers = asyncio.Semaphore(max_workers)
+
+        # conversation id -> lock / number of turns queued or running for that conversation
+        self._conversation_locks: Dict[str, asyncio.Lock] = {}
+        self._pending: Dict[str, int] = {}
+
+        # turns submitted for background processing (strong references, see submit())
+        self._background: Set[asyncio.Task] = set()
+
+        # set whenever no turn is queued or running (see wait_idle())
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+        # metrics
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._recent_waits = deque(maxlen=wait_window)
+
+    async def run(self, conversation_id: str, turn: Callable[[], Awaitable]):
+        # Waits for the conversation's previous turns and a free worker slot, then runs the turn
+        conversation_id = conversation_id or "unknown"
+
+        lock = self._conversation_locks.get(conversation_id)
+        if lock is None:
+            lock = self._conversation_locks[conversation_id] = asyncio.Lock()
+        self._pending[conversation_id] = self._pending.get(conversation_id, 0) + 1
+        self._idle.clear()
+
+        self._queued += 1
+        enqueued_at = time.monotonic()
+        started = False
+
+        try:
+            # asyncio.Lock wakes up waiters in FIFO order, which keeps the turns ordered
+            async with lock:
+                async with self._workers:
+                    started = True
+                    self._queued -= 1
+                    self._running += 1
+                    self._record_wait(time.monotonic() - enqueued_at)
+
+                    try:
+                        return await turn()
+                    except Exception:
+                        self._failed += 1
+                        raise
+                    finally:
+                        self._running -= 1
+                        self._completed += 1
+        finally:
+            if not started:
+                self._queued -= 1
+
+            # drop the lock once nobody is waiting for this conversation anymore
+            remaining = self._pending[conversation_id] - 1
+            if remaining:
+                self._pending[conversation_id] = remaining
+            else:
+                del self._pending[conversation_id]
+                del self._conversation_locks[conversation_id]
+                self._update_idle()
+
+    def submit(self, conversation_id: str, turn: Callable[[], Awaitable]) -> asyncio.Task:
+        # Schedules the turn in the background and returns immediately.
+        # The event loop only keeps weak references to tasks, so they are held here until done.
+        task = asyncio.create_task(self.run(conversation_id, turn))
+        self._background.add(task)
+        self._idle.clear()
+        task.add_done_callback(self._on_background_done)
+        return task
+
+    def _on_background_done(self, task: asyncio.Task):
+        self._background.discard(task)
+        self._update_idle()
+        if not task.cancelled() and task.exception() is not None:
+            print(f"❌ Background turn failed: {task.exception()}")
+            traceback.print_exception(task.exception())
+
+    def _update_idle(self):
+        if not self._pending and not self._background:
+            self._idle.set()
+
+    async def wait_idle(self, timeout: float) -> bool:
+        # Waits until no turn is queued or running, returns False if the timeout expired first
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            print(f"⚠️ {self._running} turn(s) still running, {self._queued} queued after {timeout:.1f}s drain timeout")
+            return False
+
+    def _record_wait(self, wait_seconds: float):
+        self._total_wait += wait_seconds
+        self._max_wait = max(self._max_wait, wait_seconds)
+        self._recent_waits.append(wait_seconds)
+
+    def stats(self) -> dict:
+        # Snapshot of queue depth and wait times, used to size the worker pool
+        recent = sorted(self._recent_waits)
+        started_turns = self._completed + self._running
+
+        return {
+            "max_workers": self.max_workers,
+            "running": self._running,
+            "queue_depth": self._queued,
+            "active_conversations": len(self._pending),
+            "background_turns": len(self._background),
+            "completed_turns": self._completed,
+            "failed_turns": self._failed,
+            "avg_wait_ms": round(self._total_wait / started_turns * 1000, 2) if started_turns else 0.0,
+            "p95_wait_ms": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000, 2) if recent else 0.0,
+            "max_wait_ms": round(self._max_wait * 1000, 2),
+        }
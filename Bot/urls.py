@@ -1,7 +1,7 @@
 from django.urls import path
 
 from .views import SuperuserLoginView, admin_dashboard, customer_stats, customer_stats_pdf, messages, webchat, \
-    get_directline_token
+    get_directline_token, bot_metrics
 
 urlpatterns = [
 
@@ -26,6 +26,9 @@ urlpatterns = [
     # bot Endpoint
     path('api/messages/', messages, name='bot_messages'),
 
+    # runtime metrics of the bot endpoint (superuser only)
+    path('api/messages/metrics/', bot_metrics, name='bot_metrics'),
+
 
 
 ]
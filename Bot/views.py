@@ -1,9 +1,7 @@
 import base64
 import io
-import json
-import asyncio
 import traceback
-import requests
+from collections import Counter
 
 from allauth.account.views import LoginView
 from django.contrib import messages
@@ -25,15 +23,30 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.http import JsonResponse
 from botbuilder.core import BotFrameworkAdapter, BotFrameworkAdapterSettings
-from botbuilder.schema import Activity
+from botbuilder.schema import ActivityTypes, DeliveryModes
 from .BotFactory import create_bot_instances
+from .turn_scheduler import TurnScheduler
+from .admission import AdmissionController
+from .activity_codec import decode_activity, json_response
+from .storage import state_storage_stats
+from .affinity import AffinityRouter, FORWARDED_HEADER
+from .lifecycle import lifecycle
+from .deadline import TurnDeadline
+from .bot_auth import BotAuthenticator
+from .azure_service.luis_service import clu_entity_cache, clu_in_flight, clu_circuit_breaker
+from .azure_service.speech_service import tts_audio_cache
+from .extraction_policy import extraction_policy
 from FCCSemesterAufgabe.settings import APP_ID, APP_PASSWORD, BOT_FRAMEWORK_BOT_ID, \
-    DIRECT_LINE_SECRET
+    DIRECT_LINE_SECRET, BOT_TURN_WORKERS, BOT_BACKGROUND_TURNS, BOT_TEXT_MAX_IN_FLIGHT, \
+    BOT_AUDIO_MAX_IN_FLIGHT, BOT_RETRY_AFTER_SECONDS, BOT_AFFINITY_NODES, BOT_NODE_URL, BOT_AFFINITY_VNODES, \
+    BOT_AFFINITY_RETRY_SECONDS, BOT_TURN_DEADLINE_SECONDS, ENTITY_EXTRACTION_MODE
 
 # BotFramework Adapter Setup
 try:
     adapter_settings = BotFrameworkAdapterSettings(APP_ID, APP_PASSWORD)
     adapter = BotFrameworkAdapter(adapter_settings)
+    # authenticates activities before their turn is scheduled
+    authenticator = BotAuthenticator(adapter_settings)
 except Exception as e:
     print(f"Adapter Setup Error: {e}")
     raise
@@ -44,35 +57,58 @@ try:
     tele_bot = bot_instances['tele_bot']
     web_bot = bot_instances['web_bot']
     conversation_state = bot_instances['conversation_state']
-    user_state = bot_instances['user_state']
+    http_client = bot_instances['http_client']
 except Exception as e:
     print(f"❌ Bot-Instanzen Error: {e}")
     raise
 
+# Orders turns per conversation and bounds how many turns run at once
+turn_scheduler = TurnScheduler(max_workers=BOT_TURN_WORKERS)
+# on shutdown the running turns are awaited before the state is flushed
+lifecycle.on_drain(turn_scheduler.wait_idle)
+
+# turns whose deadline expired, per stage that ran out of time
+deadline_expirations = Counter()
+
 # Mapping of channel names to bot instances
 CHANNEL_BOT_MAPPING = {
     "telegram": {
         "bot": tele_bot,
         "name": "Telegram Audio Bot",
-        "supports": ["audio"]
+        "supports": ["audio"],
+        "max_in_flight": BOT_AUDIO_MAX_IN_FLIGHT
     },
     "webchat": {
         "bot": web_bot,
         "name": "Webchat Text Bot",
-        "supports": ["text"]
+        "supports": ["text"],
+        "max_in_flight": BOT_TEXT_MAX_IN_FLIGHT
     },
     "emulator": {
         "bot": web_bot,
         "name": "Emulator Test Bot",
-        "supports": ["text"]
+        "supports": ["text"],
+        "max_in_flight": BOT_TEXT_MAX_IN_FLIGHT
     },
     "directline": {
         "bot": web_bot,
         "name": "DirectLine Web Bot",
-        "supports": ["text"]
+        "supports": ["text"],
+        "max_in_flight": BOT_TEXT_MAX_IN_FLIGHT
     }
 }
 
+# In-flight limit per channel, turns beyond it are rejected with 503 + Retry-After
+admission_controller = AdmissionController(
+    {channel: config["max_in_flight"] for channel, config in CHANNEL_BOT_MAPPING.items()},
+    retry_after=BOT_RETRY_AFTER_SECONDS
+)
+
+# Forwards activities to the bot process that owns the conversation (no-op with a single node)
+affinity_router = AffinityRouter(BOT_NODE_URL, BOT_AFFINITY_NODES, http_client,
+                                 vnodes=BOT_AFFINITY_VNODES, retry_after=BOT_AFFINITY_RETRY_SECONDS,
+                                 client_retry_after=BOT_RETRY_AFTER_SECONDS)
+
 
 # checks if the user is a admin
 def superuser_required(view_func):
@@ -229,6 +265,32 @@ def customer_stats_pdf(request, chart_type: str, statistics: Statistics, custome
             return HttpResponse("Ungültiger Chart-Typ", status=400)
 
 
+@superuser_required
+def bot_metrics(request):
+    # runtime metrics of the bot endpoint (queue depth, wait times, state storage)
+    return JsonResponse({
+        "turn_scheduler": turn_scheduler.stats(),
+        "admission": admission_controller.stats(),
+        "state_storage": state_storage_stats(),
+        "affinity": affinity_router.stats(),
+        "clu_cache": clu_entity_cache.stats(),
+        "clu_singleflight": clu_in_flight.stats(),
+        "clu_circuit": clu_circuit_breaker.stats(),
+        "local_extraction": extraction_policy.stats(),
+        "tts_cache": tts_audio_cache.stats(),
+        "entity_extraction": {
+            "mode": ENTITY_EXTRACTION_MODE,
+            **{name: bot.clu_service.stats() for name, bot in (("telegram", tele_bot), ("webchat", web_bot))
+               if hasattr(bot.clu_service, "stats")},
+        },
+        "draining": lifecycle.draining,
+        "turn_deadline": {
+            "budget_seconds": BOT_TURN_DEADLINE_SECONDS,
+            "expired_turns": dict(deadline_expirations),
+        },
+    })
+
+
 def webchat(request):
     # render webchat site
     return render(request, 'webchat.html', context={
@@ -236,92 +298,122 @@ def webchat(request):
     })
 
 
-def get_directline_token(request):
+async def get_directline_token(request):
     url = "https://directline.botframework.com/v3/directline/tokens/generate"
     headers = {
         "Authorization": f"Bearer {DIRECT_LINE_SECRET}"
     }
 
-    response = requests.post(url, headers=headers)
-    if response.status_code == 200:
-        return JsonResponse(response.json())
-    else:
-        return JsonResponse({"error": "Token konnte nicht generiert werden"}, status=500)
+    async with http_client.get_session().post(url, headers=headers) as response:
+        if response.status == 200:
+            return JsonResponse(await response.json())
+        else:
+            return JsonResponse({"error": "Token konnte nicht generiert werden"}, status=500)
+
+
+async def authenticate_activity(incoming, auth_header: str):
+    # Erstellt das Activity-Modell und prüft den Token des Connectors.
+    # Liefert (activity, identity, None) oder bei Fehlern (None, None, Fehler-Response)
+    try:
+        activity = incoming.activity
+    except Exception as e:
+        print(f"❌ Activity Creation Error: {e}")
+        traceback.print_exc()
+        return None, None, json_response({"error": "Ungültige Activity"}, status=400)
+
+    try:
+        identity = await authenticator.authenticate(activity, auth_header)
+    except PermissionError as e:
+        print(f"❌ Authentifizierung fehlgeschlagen: {e}")
+        return None, None, json_response({"error": "Nicht autorisiert"}, status=401)
+
+    return activity, identity, None
 
 
 @csrf_exempt
 @require_http_methods(["POST"])
-def messages(request):
+async def messages(request):
     print("\n" + "=" * 60)
     print("📨 MULTI-BOT MESSAGE ROUTING")
     print("=" * 60)
 
-    try:
-        # Request Info
-        print(f"📨 Method: {request.method}")
-        print(f"📨 Content-Type: {request.META.get('CONTENT_TYPE', 'nicht gesetzt')}")
-        print(f"📨 User-Agent: {request.META.get('HTTP_USER_AGENT', 'nicht gesetzt')}")
+    # Prozess fährt herunter: keine neuen Activities mehr annehmen, der Connector versucht es erneut
+    if lifecycle.draining:
+        print("🛑 Shutdown läuft - Activity abgelehnt")
+        return json_response(
+            {"error": "Bot wird neu gestartet, bitte später erneut versuchen"},
+            status=503,
+            headers={"Retry-After": str(BOT_RETRY_AFTER_SECONDS)}
+        )
+
+    # Zeitbudget des Turns läuft ab Eingang, Wartezeit in der Queue zählt mit
+    deadline = TurnDeadline(BOT_TURN_DEADLINE_SECONDS)
 
+    try:
         # Authorization Header
         auth_header = request.META.get("HTTP_AUTHORIZATION", "")
         print(f"🔐 Auth Header: {'vorhanden' if auth_header else 'fehlt'}")
 
-        # Body parsen
+        # Body einmalig parsen, geroutet wird direkt auf dem dict
         try:
-            body = json.loads(request.body.decode('utf-8'))
-            print("✅ JSON erfolgreich geladen")
-        except json.JSONDecodeError as e:
+            incoming = decode_activity(request.body)
+        except ValueError as e:
             print(f"❌ JSON Parse Error: {e}")
-            return JsonResponse({"error": "Ungültiges JSON"}, status=400)
-
-        # Activity Details
-        channel_id = body.get("channelId", "unknown").lower()
-        activity_type = body.get("type", "unknown")
-        from_user = body.get("from", {})
-        attachments = body.get("attachments", [])
-        text = body.get("text", "")
-
-        print(f"🔍 Channel: {channel_id}")
-        print(f"📊 Activity: {activity_type}")
-        print(f"👤 From: {from_user.get('name', 'Unknown')} (ID: {from_user.get('id', 'none')})")
-
-        if text:
-            print(f"💬 Text: '{text[:100]}{'...' if len(text) > 100 else ''}'")
-        if attachments:
-            print(f"📎 Attachments: {len(attachments)}")
-            for i, att in enumerate(attachments):
-                print(f"   {i + 1}. {att.get('contentType', 'unknown')} - {att.get('name', 'unnamed')}")
-
-        # Activity erstellen
-        try:
-            activity = Activity().deserialize(body)
-            print("✅ Activity erfolgreich erstellt")
-        except Exception as e:
-            print(f"❌ Activity Creation Error: {e}")
-            traceback.print_exc()
-            return JsonResponse({"error": "Ungültige Activity"}, status=400)
+            return json_response({"error": "Ungültiges JSON"}, status=400)
+
+        channel_id = incoming.channel_id
+        print(f"🔍 Activity: {incoming.summary()}")
+
+        # Activity-Modell und Identität, werden erst bei Bedarf erstellt
+        activity = identity = None
+
+        # Konversations-Affinität: alle Turns einer Konversation laufen auf demselben Knoten
+        if affinity_router.enabled and FORWARDED_HEADER not in request.headers:
+            owner = affinity_router.owner(incoming.conversation_id)
+            if owner != affinity_router.node_url:
+                # nur authentifizierte Activities weiterleiten
+                activity, identity, rejected = await authenticate_activity(incoming, auth_header)
+                if rejected is not None:
+                    return rejected
+
+                print(f"🔀 Konversation gehört zu {owner} - Activity wird weitergeleitet")
+                forwarded = await affinity_router.forward(owner, request.body, auth_header)
+                if forwarded is not None:
+                    return forwarded
+                print("🔄 Weiterleitung fehlgeschlagen - Activity wird lokal verarbeitet")
 
         # Bot-Auswahl basierend auf Channel
         if channel_id in CHANNEL_BOT_MAPPING:
+            channel_key = channel_id
             bot_config = CHANNEL_BOT_MAPPING[channel_id]
             selected_bot = bot_config["bot"]
             bot_name = bot_config["name"]
 
             print(f"🤖 Ausgewählter Bot: {bot_name}")
-            print(f"🎯 Unterstützt: {', '.join(bot_config['supports'])}")
         else:
             print(f"❌ Unbekannter Channel: {channel_id}")
             print(f"🔧 Verfügbare Channels: {', '.join(CHANNEL_BOT_MAPPING.keys())}")
 
             # Fallback zum ersten verfügbaren Bot
-            fallback_config = list(CHANNEL_BOT_MAPPING.values())[0]
+            channel_key, fallback_config = next(iter(CHANNEL_BOT_MAPPING.items()))
+            bot_config = fallback_config
             selected_bot = fallback_config["bot"]
             bot_name = f"{fallback_config['name']} (Fallback)"
 
             print(f"🔄 Fallback zu: {bot_name}")
 
+        # Admission Control: Budget des Channels erschöpft -> Last abwerfen
+        if not admission_controller.try_acquire(channel_key):
+            print(f"🚦 Zu viele laufende Turns für {channel_key} - Activity abgelehnt")
+            return json_response(
+                {"error": "Bot ausgelastet, bitte später erneut versuchen"},
+                status=503,
+                headers={"Retry-After": str(admission_controller.retry_after)}
+            )
+
         # Bot Logic
         async def bot_logic(turn_context):
+            token = deadline.activate()
             try:
                 print(f"🚀 {bot_name} startet...")
                 await selected_bot.on_turn(turn_context)
@@ -338,38 +430,60 @@ def messages(request):
                     await turn_context.send_activity(error_message)
                 except Exception as e2:
                     print(f"❌ Auch Error-Response fehlgeschlagen: {e2}")
+            finally:
+                TurnDeadline.deactivate(token)
+                if deadline.expired_stage:
+                    deadline_expirations[deadline.expired_stage] += 1
 
-        # Adapter Verarbeitung
-        print("🔄 Starte Bot Processing...")
-        task = adapter.process_activity(activity, auth_header, bot_logic)
-
-        # Event Loop Management (deine bewährte Lösung)
+        # gibt den Slot frei, außer ein Hintergrund-Turn übernimmt das
+        slot_handed_off = False
         try:
-            loop = asyncio.get_running_loop()
-            print("📍 Verwende bestehenden Event Loop")
-
-            import concurrent.futures
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future = executor.submit(asyncio.run, task)
-                future.result(timeout=30)  # 30s Timeout
-
-        except (RuntimeError, TimeoutError) as e:
-            print(f"📍 Event Loop Problem: {e}")
-            print("📍 Erstelle neuen Event Loop")
+            # Activity-Modell erst nach der Admission Control erstellen (außer die Weiterleitung hat es schon),
+            # Authentifizierung vor dem Scheduling, damit unautorisierte Requests weiterhin mit 401 abgelehnt werden
+            if identity is None:
+                activity, identity, rejected = await authenticate_activity(incoming, auth_header)
+                if rejected is not None:
+                    return rejected
+
+            # Turns derselben Konversation laufen nacheinander, andere parallel
+            def run_turn():
+                return adapter.process_activity_with_identity(activity, identity, bot_logic)
+
+            # Invoke- und expectReplies-Activities brauchen die Antwort des Bots im HTTP-Response
+            needs_inline_response = (
+                activity.type == ActivityTypes.invoke or activity.delivery_mode == DeliveryModes.expect_replies
+            )
 
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                loop.run_until_complete(task)
-            finally:
-                loop.close()
+            if BOT_BACKGROUND_TURNS and not needs_inline_response:
+                # Sofort bestätigen, der Bot antwortet über den Connector sobald der Turn fertig ist
+                task = turn_scheduler.submit(incoming.conversation_id, run_turn)
+                task.add_done_callback(lambda _: admission_controller.release(channel_key))
+                slot_handed_off = True
+                print("📬 Activity angenommen, Verarbeitung läuft im Hintergrund")
+                return json_response({
+                    "status": "accepted",
+                    "channel": channel_id,
+                    "bot": bot_name,
+                    "activity_type": incoming.type,
+                })
+
+            # Adapter Verarbeitung direkt auf dem Event Loop des ASGI-Servers
+            print("🔄 Starte Bot Processing...")
+            invoke_response = await turn_scheduler.run(incoming.conversation_id, run_turn)
+        finally:
+            if not slot_handed_off:
+                admission_controller.release(channel_key)
+
+        # Invoke-Activities erwarten den Body des Bots als Antwort
+        if invoke_response:
+            return json_response(invoke_response.body or {}, status=invoke_response.status)
 
         print("🎉 Multi-Bot Request erfolgreich verarbeitet")
-        return JsonResponse({
+        return json_response({
             "status": "success",
             "channel": channel_id,
             "bot": bot_name,
-            "activity_type": activity.type,
+            "activity_type": incoming.type,
             "supports": bot_config.get("supports", ["unknown"])
         })
 
@@ -378,7 +492,7 @@ def messages(request):
         print(f"💥 Error Type: {type(e).__name__}")
         traceback.print_exc()
 
-        return JsonResponse({
+        return json_response({
             "error": f"Multi-Bot Error: {e}",
             "type": type(e).__name__,
             "traceback": traceback.format_exc()
@@ -3,13 +3,87 @@ ASGI config for FCCSemesterAufgabe project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Django's ASGI handler does not implement the lifespan protocol, so lifespan events
+are handled here to open and close application-wide resources (e.g. the pooled HTTP client).
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
 import os
+import signal
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'FCCSemesterAufgabe.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# imported after the app registry is ready
+from Bot.http_client import http_client  # noqa: E402
+from Bot.storage import close_state_storage  # noqa: E402
+from Bot.lifecycle import lifecycle  # noqa: E402
+from FCCSemesterAufgabe.settings import BOT_STOP_GRACE_SECONDS, BOT_STATE_FLUSH_RESERVE_SECONDS  # noqa: E402
+
+
+def install_sigterm_handler():
+    # Rejects new activities as soon as SIGTERM arrives, while uvicorn still waits for open requests.
+    # uvicorn's own handler is chained so its shutdown sequence is unchanged.
+    try:
+        previous = signal.getsignal(signal.SIGTERM)
+    except ValueError:
+        return
+    if not callable(previous):
+        return
+
+    def handle_sigterm(signum, frame):
+        lifecycle.start_draining()
+        previous(signum, frame)
+
+    try:
+        signal.signal(signal.SIGTERM, handle_sigterm)
+    except ValueError:
+        # not running in the main thread
+        pass
+
+
+async def startup():
+    install_sigterm_handler()
+    await http_client.startup()
+
+
+async def shutdown():
+    # stop accepting activities, let running turns finish, then persist their state.
+    # uvicorn has already waited for open requests since SIGTERM, so the drain only gets what is
+    # left of the stop grace period after keeping the reserve for the flush.
+    drain_timeout = lifecycle.remaining(BOT_STOP_GRACE_SECONDS - BOT_STATE_FLUSH_RESERVE_SECONDS)
+    drained = await lifecycle.drain(drain_timeout)
+    print(f"Bot drain {'completed' if drained else 'timed out'}, flushing conversation state")
+    await close_state_storage()
+    await http_client.close()
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                await startup()
+            except Exception as e:
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            try:
+                await shutdown()
+            except Exception as e:
+                await send({"type": "lifespan.shutdown.failed", "message": str(e)})
+                return
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+    else:
+        await django_application(scope, receive, send)
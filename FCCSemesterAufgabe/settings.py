@@ -233,3 +233,103 @@ GRAPH_MODELS ={
     'graph_models': True,
      }
 
+
+# Bot runtime
+# Number of bot turns that may run at the same time. Turns of one conversation are
+# always processed one after another, different conversations share these worker slots.
+BOT_TURN_WORKERS = int(os.getenv("BOT_TURN_WORKERS", "8"))
+
+# If enabled, /api/messages/ answers the Bot Connector right after validating the activity
+# and the turn (STT -> CLU -> TTS -> reply) runs in the background.
+BOT_BACKGROUND_TURNS = os.getenv("BOT_BACKGROUND_TURNS", "false").lower() in ("1", "true", "yes")
+
+# Maximum number of in-flight turns per channel before /api/messages/ answers with 503.
+# Audio turns (ffmpeg + Speech SDK) are far more expensive, so they get a smaller budget.
+BOT_TEXT_MAX_IN_FLIGHT = int(os.getenv("BOT_TEXT_MAX_IN_FLIGHT", "64"))
+BOT_AUDIO_MAX_IN_FLIGHT = int(os.getenv("BOT_AUDIO_MAX_IN_FLIGHT", "8"))
+BOT_RETRY_AFTER_SECONDS = int(os.getenv("BOT_RETRY_AFTER_SECONDS", "5"))
+
+# Shared HTTP client pool (CLU, audio downloads, Direct Line tokens)
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "20"))
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "15"))
+
+# Conversation state storage
+# "memory" keeps the dialog state in the process (single worker only),
+# "redis" shares it between all uvicorn workers and replicas,
+# "database" stores it in the SQL database (shared and survives restarts).
+BOT_STATE_STORAGE = os.getenv("BOT_STATE_STORAGE", "memory").lower()
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+BOT_STATE_KEY_PREFIX = os.getenv("BOT_STATE_KEY_PREFIX", "fgcc:botstate:")
+# Abandoned conversations expire after this many idle seconds (0 = never; memory and redis)
+BOT_STATE_TTL_SECONDS = int(os.getenv("BOT_STATE_TTL_SECONDS", str(24 * 3600)))
+# memory backend: upper bound of stored conversations (least recently used ones are evicted)
+# and interval of the background sweep that releases expired conversations
+BOT_STATE_MAX_CONVERSATIONS = int(os.getenv("BOT_STATE_MAX_CONVERSATIONS", "50000"))
+BOT_STATE_SWEEP_INTERVAL = float(os.getenv("BOT_STATE_SWEEP_INTERVAL", "60"))
+
+# In-process write-behind cache in front of redis/database state storage (off by default).
+# Only changed conversations are written, at most once per flush interval. Flushes are conditional
+# on the eTag; enable it only with conversation affinity (BOT_AFFINITY_NODES) across several workers.
+BOT_STATE_WRITE_BEHIND = os.getenv("BOT_STATE_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+BOT_STATE_CACHE_SIZE = int(os.getenv("BOT_STATE_CACHE_SIZE", "10000"))
+BOT_STATE_FLUSH_INTERVAL = float(os.getenv("BOT_STATE_FLUSH_INTERVAL", "1.0"))
+
+# Conversation affinity between bot processes
+# Base URLs of all bot processes (e.g. "http://10.0.0.4:8000,http://10.0.0.5:8000") and the URL of
+# this process. Activities are forwarded to the process that owns the conversation on a consistent
+# hash ring; with fewer than two nodes every process handles its activities itself.
+BOT_AFFINITY_NODES = [node.strip().rstrip("/") for node in os.getenv("BOT_AFFINITY_NODES", "").split(",") if node.strip()]
+BOT_NODE_URL = os.getenv("BOT_NODE_URL", "").rstrip("/")
+BOT_AFFINITY_VNODES = int(os.getenv("BOT_AFFINITY_VNODES", "128"))
+# unreachable nodes are skipped for this many seconds
+BOT_AFFINITY_RETRY_SECONDS = float(os.getenv("BOT_AFFINITY_RETRY_SECONDS", "30"))
+
+# Graceful shutdown. Must not exceed the stop grace period of the container (docker --stop-timeout,
+# compose stop_grace_period, Kubernetes terminationGracePeriodSeconds), after which it is killed.
+# From SIGTERM on, uvicorn's --timeout-graceful-shutdown and the drain of the running bot turns
+# share BOT_STOP_GRACE_SECONDS minus BOT_STATE_FLUSH_RESERVE_SECONDS; the reserve is left for
+# flushing the write-behind conversation state. With BOT_STATE_STORAGE=memory the flush is a
+# no-op (the state is lost with the process anyway).
+BOT_STOP_GRACE_SECONDS = float(os.getenv("BOT_STOP_GRACE_SECONDS", "30"))
+BOT_STATE_FLUSH_RESERVE_SECONDS = float(os.getenv("BOT_STATE_FLUSH_RESERVE_SECONDS", "5"))
+
+
+# Time budget of one bot turn, counted from the arrival of the activity (0 = unbounded).
+# Download, ffmpeg, STT, CLU and TTS only get what is left of it and are cancelled on expiry;
+# the reserve is kept for sending the reply as text when audio does not fit anymore.
+BOT_TURN_DEADLINE_SECONDS = float(os.getenv("BOT_TURN_DEADLINE_SECONDS", "12"))
+BOT_TEXT_FALLBACK_RESERVE_SECONDS = float(os.getenv("BOT_TEXT_FALLBACK_RESERVE_SECONDS", "1.5"))
+
+# Cache of CLU entity results per normalized utterance ("ja", "nein", digits, titles repeat a lot).
+# Cleared automatically when the CLU deployment changes.
+CLU_CACHE_SIZE = int(os.getenv("CLU_CACHE_SIZE", "2000"))
+CLU_CACHE_TTL_SECONDS = float(os.getenv("CLU_CACHE_TTL_SECONDS", "3600"))
+# Results with personal data (name, email, phone, birth date, street) expire sooner; 0 = not cached
+CLU_CACHE_PII_TTL_SECONDS = float(os.getenv("CLU_CACHE_PII_TTL_SECONDS", "300"))
+
+# Circuit breaker of the CLU client: opens when at least half of the last calls failed
+# (timeout, 429, 5xx) and skips CLU for the open period. The per-call timeout follows the
+# observed p95 latency within the given bounds.
+CLU_BREAKER_WINDOW = int(os.getenv("CLU_BREAKER_WINDOW", "50"))
+CLU_BREAKER_MIN_CALLS = int(os.getenv("CLU_BREAKER_MIN_CALLS", "10"))
+CLU_BREAKER_FAILURE_RATE = float(os.getenv("CLU_BREAKER_FAILURE_RATE", "0.5"))
+CLU_BREAKER_OPEN_SECONDS = float(os.getenv("CLU_BREAKER_OPEN_SECONDS", "30"))
+CLU_TIMEOUT_MIN_SECONDS = float(os.getenv("CLU_TIMEOUT_MIN_SECONDS", "0.5"))
+CLU_TIMEOUT_MAX_SECONDS = float(os.getenv("CLU_TIMEOUT_MAX_SECONDS", "4"))
+
+# Entity extraction of the bots: "clu" (Azure CLU), "local" (in-process patterns, no remote call)
+# or "local_first" (in-process, CLU only for utterances the local extractor finds nothing in)
+ENTITY_EXTRACTION_MODE = os.getenv("ENTITY_EXTRACTION_MODE", "clu").lower()
+
+# Cache of synthesized static prompt audio (never replies with user data): LRU in memory and
+# optionally a directory shared by the bot processes (empty TTS_CACHE_DIR = memory only, the default).
+# The least recently used files are deleted above the size limit.
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "")
+TTS_CACHE_MEMORY_ENTRIES = int(os.getenv("TTS_CACHE_MEMORY_ENTRIES", "256"))
+TTS_CACHE_DISK_MAX_MB = float(os.getenv("TTS_CACHE_DISK_MAX_MB", "200"))
+
+# Pre-rendered audio of the static prompts (manage.py build_prompt_audio), memory mapped at start
+PROMPT_AUDIO_BUNDLE = os.getenv("PROMPT_AUDIO_BUNDLE", str(BASE_DIR / "prompt_audio.bundle"))